@@ -1,26 +1,161 @@
+import base64
+import binascii
+import bisect
+import cProfile
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import marshal
+import math
+import mmap
+import multiprocessing
 import os
+import pstats
+import queue
+import random
 import re
-from datetime import datetime, timedelta
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+import click
 from dotenv import load_dotenv
-from flask import Blueprint, Flask, jsonify, request
+from flask import (
+    Blueprint,
+    Flask,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    jsonify,
+    request,
+    request_finished,
+    request_started,
+    stream_with_context,
+)
+from flask.cli import AppGroup, with_appcontext
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager,
     create_access_token,
+    decode_token,
+    get_jwt,
     get_jwt_identity,
     jwt_required,
 )
+from flask_jwt_extended.config import config as jwt_config
+from flask_jwt_extended.exceptions import JWTExtendedException
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from jwt.exceptions import PyJWTError
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, QueuePool
+from werkzeug.http import quote_etag
 from werkzeug.security import check_password_hash, generate_password_hash
 
+import migrations
+import migrations.partitions
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional encoding
+    zstandard = None
+
 # Load environment variables
 load_dotenv()
 
-db = SQLAlchemy()
+
+class _RoutingSession(FlaskSession):
+    """Session that reads from the replica chosen for the request, if any.
+
+    Flushes always go to the primary; _init_replicas only picks a replica
+    for requests that do not write.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get("_db_replica")
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": _RoutingSession})
 jwt = JWTManager()
 
 
+# JSON encoding
+class _JSONProvider(DefaultJSONProvider):
+    """Stdlib JSON provider that writes dates as ISO 8601, like to_dict."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (date, datetime)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._encode_response(*args, **kwargs)
+        finally:
+            _record_timing("serialize", time.perf_counter() - started)
+
+    def _encode_response(self, *args, **kwargs):
+        return super().response(*args, **kwargs)
+
+
+class _OrjsonProvider(_JSONProvider):
+    """JSON provider backed by orjson, which encodes dates natively in C."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def _encode_response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default), mimetype=self.mimetype
+        )
+
+
+def _json_provider_class(name):
+    """Pick the JSON provider: "orjson", "stdlib" or "auto" (orjson if installed)."""
+    if name == "stdlib" or (name == "auto" and orjson is None):
+        return _JSONProvider
+    if orjson is None:
+        raise RuntimeError("JSON_PROVIDER=orjson needs the orjson package")
+    return _OrjsonProvider
+
+
 # Models
 class User(db.Model):
     __tablename__ = "users"
@@ -33,10 +168,10 @@ class User(db.Model):
     )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _password_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return _password_hasher().verify(self.password_hash, password)
 
     def to_dict(self):
         return {
@@ -46,10 +181,14 @@ class User(db.Model):
         }
 
 
+# On PostgreSQL the table is range-partitioned by date (migrations/0006) and
+# its primary key is (id, date); ids still come from one sequence
 class WorkEntry(db.Model):
     __tablename__ = "work_entries"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
     date = db.Column(db.Date, nullable=False)
     hours = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -58,6 +197,9 @@ class WorkEntry(db.Model):
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+    # Keyed on (id, date) like the PostgreSQL table, so flushed UPDATEs and
+    # DELETEs name the date and touch a single partition
+    __mapper_args__ = {"primary_key": [id, date]}
 
     def to_dict(self):
         return {
@@ -72,6 +214,249 @@ class WorkEntry(db.Model):
         }
 
 
+# Indexes matching the listing and statistics queries (see migrations/0003)
+db.Index(
+    "ix_work_entries_user_date_id",
+    WorkEntry.user_id,
+    WorkEntry.date.desc(),
+    WorkEntry.id.desc(),
+)
+db.Index(
+    "ix_work_entries_user_date_completed",
+    WorkEntry.user_id,
+    WorkEntry.date,
+    sqlite_where=WorkEntry.completed.is_(True),
+    postgresql_where=WorkEntry.completed.is_(True),
+)
+
+# Full-text index over descriptions (see migrations/0005), also built by
+# create_all(): an FTS5 table kept in sync by triggers, or a GIN index
+ENTRY_SEARCH_TABLE = db.table("work_entries_fts", db.column("rowid"))
+ENTRY_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS work_entries_fts USING fts5("
+        "description, user_id, content='work_entries', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_insert "
+        "AFTER INSERT ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts (rowid, description, user_id) "
+        "VALUES (new.id, new.description, new.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_delete "
+        "AFTER DELETE ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts "
+        "(work_entries_fts, rowid, description, user_id) "
+        "VALUES ('delete', old.id, old.description, old.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_update "
+        "AFTER UPDATE OF description ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts "
+        "(work_entries_fts, rowid, description, user_id) "
+        "VALUES ('delete', old.id, old.description, old.user_id); "
+        "INSERT INTO work_entries_fts (rowid, description, user_id) "
+        "VALUES (new.id, new.description, new.user_id); END",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_description_search "
+        "ON work_entries USING GIN (to_tsvector('simple', description))",
+    ],
+}
+
+
+def _listen_search_ddl(table):
+    for dialect_name, statements in ENTRY_SEARCH_DDL.items():
+        for statement in statements:
+            ddl = db.DDL(statement).execute_if(dialect=dialect_name)
+            db.event.listen(table, "after_create", ddl)
+    drop = db.DDL("DROP TABLE IF EXISTS work_entries_fts")
+    db.event.listen(table, "after_drop", drop.execute_if(dialect="sqlite"))
+
+
+_listen_search_ddl(WorkEntry.__table__)
+
+
+class DailyRollup(db.Model):
+    """Per-user, per-day totals kept in step with work_entries on every write."""
+
+    __tablename__ = "daily_rollups"
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    date = db.Column(db.Date, primary_key=True)
+    completed_hours = db.Column(db.Float, default=0, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    total_hours = db.Column(db.Float, default=0, nullable=False)
+    total_count = db.Column(db.Integer, default=0, nullable=False)
+
+
+# Password hashing
+class _PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+class _PasswordHasher:
+    """Hash and check passwords with a cap on how many run at once.
+
+    With ``workers`` set, the work runs in a process pool so CPU-bound
+    hashing never holds the GIL of the request-serving process.
+    """
+
+    def __init__(self, method, workers=0, max_concurrency=None, queue_timeout=10):
+        self.method = method
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(
+            max_concurrency or workers or os.cpu_count() or 1
+        )
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+        # Called with (operation, seconds queued, seconds hashing), if set
+        self.observer = None
+
+    def _get_executor(self):
+        # A pool inherited through fork() is unusable, so build one per process
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, operation, func, *args):
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise _PasswordHasherBusy()
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+            if self.observer is not None:
+                self.observer(
+                    operation, started - queued, time.perf_counter() - started
+                )
+
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run("verify", check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than ours."""
+        if self._method_prefix is None:
+            # Werkzeug fills in default parameters, so read them off a real hash
+            self._method_prefix = generate_password_hash("", self.method).split("$")[0]
+        return password_hash.split("$")[0] != self._method_prefix
+
+
+def _password_hasher():
+    """The current app's password hasher."""
+    return current_app.extensions["password_hasher"]
+
+
+# Identity cache
+class _UserIdentity:
+    """The parts of a User that authenticated requests need."""
+
+    __slots__ = ("id", "email", "created_at")
+
+    def __init__(self, id, email, created_at):
+        self.id = id
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            user.id,
+            user.email,
+            user.created_at.isoformat() if user.created_at else None,
+        )
+
+    def to_dict(self):
+        return {"id": self.id, "email": self.email, "created_at": self.created_at}
+
+
+def _identity_claims(user, config=None):
+    """Extra token claims that let requests resolve the user without a query."""
+    config = current_app.config if config is None else config
+    if not config["JWT_IDENTITY_CLAIMS"]:
+        return None
+    identity = _UserIdentity.from_user(user)
+    return {"email": identity.email, "created_at": identity.created_at}
+
+
+@jwt.decode_key_loader
+def _decode_key(jwt_header, jwt_data):
+    """Return the configured key, marking where token verification starts."""
+    timings = _request_timings()
+    if timings is not None:
+        timings["auth_started"] = time.perf_counter()
+    return jwt_config.decode_key
+
+
+def _stop_auth_timing():
+    timings = _request_timings()
+    if timings is not None and "auth_started" in timings:
+        timings["auth"] += time.perf_counter() - timings.pop("auth_started")
+
+
+@jwt.token_verification_loader
+def _verify_token(jwt_header, jwt_data):
+    """Accept every decoded token, timing decode through here as "auth"."""
+    _stop_auth_timing()
+    return True
+
+
+def _current_user_identity():
+    """Resolve the token's user for the views that need more than its id.
+
+    None means the user no longer exists.
+    """
+    timings = _request_timings()
+    if timings is not None:
+        timings["auth_started"] = time.perf_counter()
+    try:
+        return _resolve_user_identity(get_jwt())
+    finally:
+        _stop_auth_timing()
+
+
+def _resolve_user_identity(jwt_data):
+    """Resolve the token's user from its claims, the cache or the database."""
+    user_id = int(jwt_data[current_app.config["JWT_IDENTITY_CLAIM"]])
+    if current_app.config["JWT_IDENTITY_CLAIMS"] and "email" in jwt_data:
+        # The token is signed, so its claims are as good as a lookup
+        return _UserIdentity(user_id, jwt_data["email"], jwt_data.get("created_at"))
+
+    cache = current_app.extensions["identity_cache"]
+    identity = cache.get(user_id)
+    if identity is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        identity = _UserIdentity.from_user(user)
+        cache.set(user_id, identity)
+    return identity
+
+
+@db.event.listens_for(User, "after_update")
+@db.event.listens_for(User, "after_delete")
+def _invalidate_user_identity(mapper, connection, user):
+    """Drop a changed user from this process's identity cache."""
+    if not has_app_context():
+        # Written outside Flask, e.g. by the ASGI app
+        return
+    cache = current_app.extensions.get("identity_cache")
+    if cache is not None:
+        cache.delete(user.id)
+
+
 # Helper functions for auth blueprint
 def _validate_auth_data(data):
     """Validate authentication data with email format and password length."""
@@ -91,7 +476,9 @@ def _validate_auth_data(data):
 def _create_user_response(user):
     """Create user response with token."""
     access_token = create_access_token(
-        identity=str(user.id), expires_delta=timedelta(hours=24)
+        identity=str(user.id),
+        expires_delta=timedelta(hours=24),
+        additional_claims=_identity_claims(user),
     )
     return (
         jsonify(
@@ -108,7 +495,9 @@ def _create_user_response(user):
 def _create_login_response(user):
     """Create login response with token."""
     access_token = create_access_token(
-        identity=str(user.id), expires_delta=timedelta(hours=24)
+        identity=str(user.id),
+        expires_delta=timedelta(hours=24),
+        additional_claims=_identity_claims(user),
     )
     return (
         jsonify(
@@ -164,26 +553,47 @@ def _create_auth_blueprint():
         if not user or not user.check_password(password):
             return jsonify({"error": "Invalid email or password"}), 401
 
+        if _password_hasher().needs_rehash(user.password_hash):
+            # Upgrade the stored hash to the configured scheme
+            user.set_password(password)
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
         return _create_login_response(user)
 
     @auth_bp.route("/profile", methods=["GET"])
     @jwt_required()
     def profile():
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
-        if not user:
+        identity = _current_user_identity()
+        if identity is None:
             return jsonify({"error": "User not found"}), 404
-        return jsonify({"user": user.to_dict()}), 200
+        return jsonify({"user": identity.to_dict()}), 200
 
     return auth_bp
 
 
 # Helper functions for work entries blueprint
+# Fields of a serialized work entry, in WorkEntry.to_dict order
+ENTRY_FIELDS = (
+    "id",
+    "user_id",
+    "date",
+    "hours",
+    "description",
+    "completed",
+    "created_at",
+    "updated_at",
+)
+MAX_PER_PAGE = 100
+
+
 def _validate_date_format(date_str):
     """Validate date format."""
     try:
         return datetime.strptime(date_str, "%Y-%m-%d").date(), None
-    except ValueError:
+    except (TypeError, ValueError):
         return None, "Invalid date format. Use YYYY-MM-DD"
 
 
@@ -194,7 +604,7 @@ def _validate_hours(hours):
         if hours_val <= 0:
             return None, "Hours must be greater than 0"
         return hours_val, None
-    except ValueError:
+    except (TypeError, ValueError):
         return None, "Hours must be a valid number"
 
 
@@ -211,6 +621,54 @@ def _validate_work_entry_data(data):
     return True, None
 
 
+def _new_work_entry(user_id, data):
+    """Validate a create payload and build the (unsaved) work entry."""
+    is_valid, error = _validate_work_entry_data(data)
+    if not is_valid:
+        return None, error
+
+    date_val, error = _validate_date_format(data["date"])
+    if error:
+        return None, error
+
+    hours, error = _validate_hours(data["hours"])
+    if error:
+        return None, error
+
+    return (
+        WorkEntry(
+            user_id=user_id,
+            date=date_val,
+            hours=hours,
+            description=data["description"],
+            completed=bool(data.get("completed", False)),
+        ),
+        None,
+    )
+
+
+def _apply_entry_changes(work_entry, data):
+    """Validate an update payload and apply it to the work entry."""
+    if "date" in data:
+        date_val, error = _validate_date_format(data["date"])
+        if error:
+            return error
+        work_entry.date = date_val
+
+    if "hours" in data:
+        hours, error = _validate_hours(data["hours"])
+        if error:
+            return error
+        work_entry.hours = hours
+
+    if "description" in data:
+        work_entry.description = data["description"]
+
+    if "completed" in data:
+        work_entry.completed = bool(data["completed"])
+    return None
+
+
 def _apply_date_filters(query, start_date, end_date):
     """Apply date filters to query."""
     if start_date:
@@ -228,282 +686,3864 @@ def _apply_date_filters(query, start_date, end_date):
     return query, None
 
 
+def _parse_per_page(per_page):
+    """Validate a per_page argument into (per_page, error)."""
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        per_page = 0
+    if not 1 <= per_page <= MAX_PER_PAGE:
+        return None, f"per_page must be between 1 and {MAX_PER_PAGE}"
+    return per_page, None
+
+
 def _apply_pagination(query, page=1, per_page=10):
     """Apply pagination to query."""
+    per_page, error = _parse_per_page(per_page)
+    if error:
+        return query, None, None, error
     try:
         page = int(page)
-        per_page = int(per_page)
-    except ValueError:
-        page = 1
-        per_page = 10
+    except (TypeError, ValueError):
+        page = 0
+    if page < 1:
+        return query, None, None, "page must be a positive integer"
 
     offset = (page - 1) * per_page
-    return query.offset(offset).limit(per_page), page, per_page
+    return query.offset(offset).limit(per_page), page, per_page, None
 
 
-def _get_statistics(user_id):
-    """Get work statistics for a user."""
-    today = datetime.now().date()
-    week_ago = today - timedelta(days=7)
+def _parse_fields(fields):
+    """Parse a sparse fieldset like "id,date,hours" into entry fields."""
+    if not fields:
+        return ENTRY_FIELDS, None
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    for field in requested:
+        if field not in ENTRY_FIELDS:
+            return None, f"Unknown field: {field}"
+    return requested or ENTRY_FIELDS, None
 
-    # Today's hours (only completed entries)
-    today_hours = (
-        db.session.query(db.func.sum(WorkEntry.hours))
-        .filter(
-            WorkEntry.user_id == user_id,
-            WorkEntry.date == today,
-            WorkEntry.completed.is_(True),
-        )
-        .scalar()
-        or 0
-    )
 
-    # Last week hours (only completed entries)
-    last_week_hours = (
-        db.session.query(db.func.sum(WorkEntry.hours))
-        .filter(
-            WorkEntry.user_id == user_id,
-            WorkEntry.date >= week_ago,
-            WorkEntry.date <= today,
-            WorkEntry.completed.is_(True),
-        )
-        .scalar()
-        or 0
-    )
+def _entry_rows_query(user_id, fields):
+    """Select only the given fields, plus the date and id the cursor needs.
 
-    # Last week completed tasks (entries)
-    last_week_tasks = (
-        db.session.query(db.func.count(WorkEntry.id))
-        .filter(
-            WorkEntry.user_id == user_id,
-            WorkEntry.date >= week_ago,
-            WorkEntry.date <= today,
-            WorkEntry.completed.is_(True),
-        )
-        .scalar()
-        or 0
-    )
+    Rows come back as tuples starting with ``fields``, so
+    ``dict(zip(fields, row))`` drops the extra keyset columns.
+    """
+    return db.select(*_entry_columns(fields)).filter(WorkEntry.user_id == user_id)
 
-    return {
-        "today_hours": round(today_hours, 2),
-        "last_week_hours": round(last_week_hours, 2),
-        "last_week_tasks": last_week_tasks,
-    }
 
+def _entry_columns(fields):
+    """WorkEntry columns for ``fields``, followed by any missing date and id."""
+    columns = list(fields) + [f for f in ("date", "id") if f not in fields]
+    return [getattr(WorkEntry, f) for f in columns]
 
-def _create_work_entries_blueprint():
-    """Create and configure the work entries blueprint."""
-    work_entries_bp = Blueprint("entries", __name__)
 
-    @work_entries_bp.route("/", methods=["GET"])
-    @jwt_required()
-    def get_work_entries():
-        current_user_id = get_jwt_identity()
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
-        page = request.args.get("page", 1)
-        per_page = request.args.get("per_page", 10)
+def _encode_cursor(work_entry):
+    """Encode the keyset position of a work entry as an opaque cursor."""
+    payload = json.dumps([work_entry.date.isoformat(), work_entry.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
-        query = WorkEntry.query.filter_by(user_id=int(current_user_id))
-        query, error = _apply_date_filters(query, start_date, end_date)
-        if error:
-            return jsonify({"error": error}), 400
 
-        # Fix: order_by before pagination
-        query = query.order_by(WorkEntry.date.desc())
-        paginated_query, current_page, items_per_page = _apply_pagination(
-            query, page, per_page
-        )
-        work_entries = paginated_query.all()
+def _decode_cursor(cursor):
+    """Decode a cursor into a (date, id) keyset position."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, entry_id = json.loads(base64.urlsafe_b64decode(padded))
+        date_val = datetime.strptime(date_str, "%Y-%m-%d").date()
+        if not isinstance(entry_id, int):
+            raise ValueError
+        return (date_val, entry_id), None
+    except (binascii.Error, TypeError, ValueError):
+        return None, "Invalid cursor"
 
-        # Get total count for pagination metadata
-        total_count = query.count()
-        total_pages = (total_count + items_per_page - 1) // items_per_page
 
-        return (
-            jsonify(
-                {
-                    "work_entries": [entry.to_dict() for entry in work_entries],
-                    "pagination": {
-                        "page": current_page,
-                        "per_page": items_per_page,
-                        "total": total_count,
-                        "total_pages": total_pages,
-                        "has_next": current_page < total_pages,
-                        "has_prev": current_page > 1,
-                    },
-                }
-            ),
-            200,
+def _apply_cursor(query, cursor, per_page=10):
+    """Apply keyset pagination to a query ordered by date DESC, id DESC."""
+    per_page, error = _parse_per_page(per_page)
+    if error:
+        return query, None, error
+
+    if cursor:
+        position, error = _decode_cursor(cursor)
+        if error:
+            return query, per_page, error
+        query = query.filter(
+            db.tuple_(WorkEntry.date, WorkEntry.id) < db.tuple_(*position)
         )
 
-    @work_entries_bp.route("/<int:entry_id>", methods=["GET"])
-    @jwt_required()
-    def get_work_entry(entry_id):
-        current_user_id = get_jwt_identity()
-        work_entry = WorkEntry.query.filter_by(
-            id=entry_id, user_id=int(current_user_id)
-        ).first()
-        if not work_entry:
-            return jsonify({"error": "Work entry not found"}), 404
-        return jsonify({"work_entry": work_entry.to_dict()}), 200
+    # Fetch one extra row to find out whether there is a next page
+    return query.limit(per_page + 1), per_page, None
 
-    @work_entries_bp.route("/", methods=["POST"])
-    @jwt_required()
-    def create_work_entry():
-        current_user_id = get_jwt_identity()
-        data = request.get_json()
 
-        is_valid, error_msg = _validate_work_entry_data(data)
-        if not is_valid:
-            return jsonify({"error": error_msg}), 400
+def _plan_entries_listing(user_id, args):
+    """Build the queries for an entry listing from its request args.
 
-        date_val, error = _validate_date_format(data["date"])
-        if error:
-            return jsonify({"error": error}), 400
+    Nothing runs here, so the sync and async apps can execute the same plan.
+    """
+    fields, error = _parse_fields(args.get("fields"))
+    if error:
+        return None, error
 
-        hours, error = _validate_hours(data["hours"])
-        if error:
-            return jsonify({"error": error}), 400
+    query = _entry_rows_query(user_id, fields)
+    query, error = _apply_date_filters(
+        query, args.get("start_date"), args.get("end_date")
+    )
+    if error:
+        return None, error
 
-        work_entry = WorkEntry(
-            user_id=int(current_user_id),
-            date=date_val,
-            hours=hours,
-            description=data["description"],
-            completed=data.get("completed", False),
+    # id breaks ties between entries on the same date so pages are stable
+    ordered_query = query.order_by(WorkEntry.date.desc(), WorkEntry.id.desc())
+    include_total = args.get("include_total", "true").lower() != "false"
+    plan = {
+        "fields": fields,
+        "cursor": args.get("cursor"),
+        "count": (
+            db.select(db.func.count()).select_from(query.subquery())
+            if include_total
+            else None
+        ),
+    }
+
+    if plan["cursor"] is not None:
+        rows, per_page, error = _apply_cursor(
+            ordered_query, plan["cursor"], args.get("per_page", 10)
+        )
+        if error:
+            return None, error
+        plan.update(rows=rows, per_page=per_page)
+    else:
+        rows, page, per_page, error = _apply_pagination(
+            ordered_query, args.get("page", 1), args.get("per_page", 10)
         )
+        if error:
+            return None, error
+        if not include_total:
+            # One extra row tells whether there is a next page
+            rows = rows.limit(per_page + 1)
+        plan.update(rows=rows, page=page, per_page=per_page)
+    return plan, None
 
-        try:
-            db.session.add(work_entry)
-            db.session.commit()
-            return (
-                jsonify(
-                    {
-                        "message": "Work entry created successfully",
-                        "work_entry": work_entry.to_dict(),
-                    }
-                ),
-                201,
-            )
-        except Exception:
-            db.session.rollback()
-            return jsonify({"error": "Failed to create work entry"}), 500
 
-    @work_entries_bp.route("/<int:entry_id>", methods=["PUT"])
-    @jwt_required()
-    def update_work_entry(entry_id):
-        current_user_id = get_jwt_identity()
-        data = request.get_json()
+def _entries_listing_payload(plan, rows, total):
+    """Shape listing rows and the optional total into the JSON response."""
+    per_page = plan["per_page"]
+    if plan["cursor"] is not None:
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        pagination = {
+            "per_page": per_page,
+            "has_next": has_next,
+            "next_cursor": _encode_cursor(rows[-1]) if has_next else None,
+        }
+        if total is not None:
+            pagination["total"] = total
+    else:
+        page = plan["page"]
+        if total is not None:
+            total_pages = (total + per_page - 1) // per_page
+            has_next = page < total_pages
+        else:
+            total_pages = None
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+        pagination = {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_pages": total_pages,
+            "has_next": has_next,
+            "has_prev": page > 1,
+        }
 
-        work_entry = WorkEntry.query.filter_by(
-            id=entry_id, user_id=int(current_user_id)
-        ).first()
-        if not work_entry:
-            return jsonify({"error": "Work entry not found"}), 404
+    fields = plan["fields"]
+    return {
+        # Dates are formatted by the JSON provider, not per row
+        "work_entries": [dict(zip(fields, row)) for row in rows],
+        "pagination": pagination,
+    }
 
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
 
-        try:
-            if "date" in data:
-                date_val, error = _validate_date_format(data["date"])
-                if error:
-                    return jsonify({"error": error}), 400
-                work_entry.date = date_val
+# Entry search
+SEARCH_TS_CONFIG = "simple"
+SEARCH_MAX_TERMS = 16
 
-            if "hours" in data:
-                hours, error = _validate_hours(data["hours"])
-                if error:
-                    return jsonify({"error": error}), 400
-                work_entry.hours = hours
 
-            if "description" in data:
-                work_entry.description = data["description"]
+def _search_terms(q):
+    """Words of a search query; each one is matched as a prefix."""
+    return re.findall(r"\w+", q or "")[:SEARCH_MAX_TERMS]
 
-            if "completed" in data:
-                work_entry.completed = bool(data["completed"])
 
-            db.session.commit()
-            return (
-                jsonify(
-                    {
-                        "message": "Work entry updated successfully",
-                        "work_entry": work_entry.to_dict(),
-                    }
-                ),
-                200,
-            )
-        except Exception:
-            db.session.rollback()
-            return jsonify({"error": "Failed to update work entry"}), 500
+def _search_match(user_id, dialect_name, terms):
+    """(id, score, condition) matching a user's entries on every term prefix.
 
-    @work_entries_bp.route("/<int:entry_id>", methods=["DELETE"])
-    @jwt_required()
-    def delete_work_entry(entry_id):
-        current_user_id = get_jwt_identity()
-        work_entry = WorkEntry.query.filter_by(
-            id=entry_id, user_id=int(current_user_id)
-        ).first()
-        if not work_entry:
-            return jsonify({"error": "Work entry not found"}), 404
+    Higher scores rank first. On SQLite the user is part of the FTS5 match,
+    so matching and scoring read the text index alone.
+    """
+    if dialect_name == "postgresql":
+        config = db.literal_column(f"'{SEARCH_TS_CONFIG}'")
+        vector = db.func.to_tsvector(config, WorkEntry.description)
+        tsquery = db.func.to_tsquery(config, " & ".join(f"{t}:*" for t in terms))
+        match = db.and_(WorkEntry.user_id == user_id, vector.op("@@")(tsquery))
+        # ts_rank is a real; as a double it compares exactly with the cursor's
+        score = db.cast(db.func.ts_rank(vector, tsquery), db.Double)
+        return WorkEntry.id, score, match
 
-        try:
-            db.session.delete(work_entry)
-            db.session.commit()
-            return jsonify({"message": "Work entry deleted successfully"}), 200
-        except Exception:
-            db.session.rollback()
-            return jsonify({"error": "Failed to delete work entry"}), 500
+    fts = db.literal_column("work_entries_fts")
+    # Terms are word characters only, so quoting them is enough for FTS5
+    prefixes = " ".join(f'"{term}"*' for term in terms)
+    match = f'user_id : "{user_id}" AND description : ({prefixes})'
+    # user_id only filters, so it gets no weight in the ranking
+    score = -db.func.bm25(fts, 1.0, 0.0)
+    return ENTRY_SEARCH_TABLE.c.rowid, score, fts.op("MATCH")(match)
 
-    @work_entries_bp.route("/statistics", methods=["GET"])
-    @jwt_required()
-    def get_statistics():
-        current_user_id = get_jwt_identity()
-        stats = _get_statistics(int(current_user_id))
-        return jsonify(stats), 200
 
-    return work_entries_bp
+def _encode_search_cursor(score, entry_id):
+    payload = json.dumps([score, entry_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
 
-def create_app(test_config=None):
-    app = Flask(__name__)
+def _decode_search_cursor(cursor):
+    """Decode a cursor into a (score, id) keyset position."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, entry_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(score, (int, float)) or not isinstance(entry_id, int):
+            raise ValueError
+        return (score, entry_id), None
+    except (binascii.Error, TypeError, ValueError):
+        return None, "Invalid cursor"
 
-    # Use test config if passed in (for tests)
-    if test_config:
-        app.config.update(test_config)
-    else:
-        # Use DATABASE_URL from environment, fallback to SQLite for local/dev
-        app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-            "DATABASE_URL", "sqlite:///instance/app.db"
-        )
 
-    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "jwt-secret-key")
+def _plan_entries_search(user_id, dialect_name, args):
+    """Build the search query for a user's entries from its request args."""
+    terms = _search_terms(args.get("q"))
+    if not terms:
+        return None, "q must contain at least one word"
+    sort = args.get("sort", "rank")
+    if sort not in ("rank", "date"):
+        return None, "sort must be rank or date"
+    fields, error = _parse_fields(args.get("fields"))
+    if error:
+        return None, error
+    per_page, error = _parse_per_page(args.get("per_page", 10))
+    if error:
+        return None, error
 
-    db.init_app(app)
-    jwt.init_app(app)
+    entry_id, score, match = _search_match(user_id, dialect_name, terms)
+    start_date, end_date = args.get("start_date"), args.get("end_date")
+    cursor = args.get("cursor") or ""
+    if sort == "date":
+        # Newest first, like the listing; scoring a page of FTS5 hits by
+        # rowid re-runs the match per row, so date order goes unscored
+        if dialect_name != "postgresql":
+            match = WorkEntry.id.in_(db.select(entry_id).where(match))
+        query, error = _apply_date_filters(
+            _entry_rows_query(user_id, fields).filter(match), start_date, end_date
+        )
+        if error:
+            return None, error
+        rows, per_page, error = _apply_cursor(
+            query.order_by(WorkEntry.date.desc(), WorkEntry.id.desc()),
+            cursor,
+            per_page,
+        )
+        if error:
+            return None, error
+        return {
+            "fields": fields,
+            "sort": sort,
+            "rows": rows,
+            "per_page": per_page,
+        }, None
 
-    # Create instance dir if needed
-    try:
+    hits = db.select(entry_id.label("id"), score.label("score")).where(match)
+    if start_date or end_date:
+        if dialect_name != "postgresql":
+            hits = hits.join(WorkEntry, WorkEntry.id == entry_id)
+        hits, error = _apply_date_filters(hits, start_date, end_date)
+        if error:
+            return None, error
+    if cursor:
+        position, error = _decode_search_cursor(cursor)
+        if error:
+            return None, error
+        last_score, last_id = position
+        hits = hits.filter(
+            db.or_(
+                score < last_score,
+                db.and_(score == last_score, entry_id < last_id),
+            )
+        )
+    # One extra row tells whether there is a next page; only that page of
+    # hits is joined back for the requested fields
+    hits = hits.order_by(score.desc(), entry_id.desc()).limit(per_page + 1).subquery()
+    rows = (
+        db.select(*_entry_columns(fields), hits.c.score)
+        .join(hits, hits.c.id == WorkEntry.id)
+        .order_by(hits.c.score.desc(), WorkEntry.id.desc())
+    )
+    return {"fields": fields, "sort": sort, "rows": rows, "per_page": per_page}, None
+
+
+def _entries_search_payload(plan, rows):
+    """Shape search rows into the JSON response; ranked entries get a score."""
+    per_page = plan["per_page"]
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    ranked = plan["sort"] == "rank"
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        if ranked:
+            next_cursor = _encode_search_cursor(last.score, last.id)
+        else:
+            next_cursor = _encode_cursor(last)
+
+    fields = plan["fields"]
+    entries = []
+    for row in rows:
+        entry = dict(zip(fields, row))
+        if ranked:
+            entry["score"] = row.score
+        entries.append(entry)
+    return {
+        "work_entries": entries,
+        "pagination": {
+            "per_page": per_page,
+            "has_next": has_next,
+            "next_cursor": next_cursor,
+        },
+    }
+
+
+ROLLUP_COLUMNS = ("completed_hours", "completed_count", "total_hours", "total_count")
+
+
+def _rollup_delta(date_val, hours, completed, sign=1):
+    """Rollup change for adding (sign=1) or removing (sign=-1) one entry."""
+    return {
+        "date": date_val,
+        "completed_hours": sign * hours if completed else 0,
+        "completed_count": sign if completed else 0,
+        "total_hours": sign * hours,
+        "total_count": sign,
+    }
+
+
+def _merge_rollup_deltas(user_id, deltas):
+    """Sum rollup changes per day into rows keyed like daily_rollups."""
+    merged = {}
+    for delta in deltas:
+        day = merged.setdefault(
+            delta["date"],
+            {
+                "user_id": user_id,
+                "date": delta["date"],
+                **dict.fromkeys(ROLLUP_COLUMNS, 0),
+            },
+        )
+        for column in ROLLUP_COLUMNS:
+            day[column] += delta[column]
+    return list(merged.values())
+
+
+def _rollup_upsert(dialect_name):
+    """INSERT ... ON CONFLICT that adds rows onto daily_rollups, if supported."""
+    if dialect_name not in ("postgresql", "sqlite"):
+        return None
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    table = DailyRollup.__table__
+    stmt = dialect.insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date],
+        set_={
+            column: table.c[column] + stmt.excluded[column] for column in ROLLUP_COLUMNS
+        },
+    )
+
+
+def _rollup_cleanup(user_id, rows):
+    """DELETE for days the rows may have emptied, or None if none shrank."""
+    shrunk = [row["date"] for row in rows if row["total_count"] <= 0]
+    if not shrunk:
+        return None
+    table = DailyRollup.__table__
+    return table.delete().where(
+        table.c.user_id == user_id,
+        table.c.date.in_(shrunk),
+        table.c.total_count <= 0,
+    )
+
+
+def _apply_rollup_deltas(user_id, deltas):
+    """Apply rollup changes for one user, merged per day.
+
+    Runs in the caller's transaction so the rollups commit or roll back
+    together with the work entry changes.
+    """
+    rows = _merge_rollup_deltas(user_id, deltas)
+    if not rows:
+        return
+
+    table = DailyRollup.__table__
+    upsert = _rollup_upsert(db.session.get_bind().dialect.name)
+    if upsert is not None:
+        db.session.execute(upsert, rows)
+    else:
+        for row in rows:
+            result = db.session.execute(
+                table.update()
+                .where(table.c.user_id == user_id, table.c.date == row["date"])
+                .values(
+                    {column: table.c[column] + row[column] for column in ROLLUP_COLUMNS}
+                )
+            )
+            if result.rowcount == 0:
+                db.session.execute(table.insert().values(**row))
+
+    _mark_statistics_dirty(
+        db.session,
+        current_app.extensions.get("series_cache"),
+        user_id,
+        [row["date"] for row in rows],
+    )
+    cleanup = _rollup_cleanup(user_id, rows)
+    if cleanup is not None:
+        # Drop days that no longer have any entries
+        db.session.execute(cleanup)
+
+
+def _apply_rollup_delta(user_id, date_val, hours, completed, sign=1):
+    """Add (sign=1) or remove (sign=-1) one entry from its daily rollup."""
+    _apply_rollup_deltas(user_id, [_rollup_delta(date_val, hours, completed, sign)])
+
+
+def _compute_rollups(user_id=None):
+    """Recompute daily rollups from work_entries, keyed by (user_id, date)."""
+    completed_hours = db.case((WorkEntry.completed.is_(True), WorkEntry.hours), else_=0)
+    completed_count = db.case((WorkEntry.completed.is_(True), 1), else_=0)
+    query = db.session.query(
+        WorkEntry.user_id,
+        WorkEntry.date,
+        db.func.sum(completed_hours),
+        db.func.sum(completed_count),
+        db.func.sum(WorkEntry.hours),
+        db.func.count(WorkEntry.id),
+    ).group_by(WorkEntry.user_id, WorkEntry.date)
+    if user_id is not None:
+        query = query.filter(WorkEntry.user_id == user_id)
+
+    return {
+        (row[0], row[1]): {
+            "completed_hours": row[2] or 0,
+            "completed_count": row[3] or 0,
+            "total_hours": row[4] or 0,
+            "total_count": row[5],
+        }
+        for row in query
+    }
+
+
+def _find_rollup_drift(user_id=None):
+    """Compare stored rollups with recomputed ones and list the mismatches."""
+    expected = _compute_rollups(user_id)
+    query = DailyRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    stored = {
+        (rollup.user_id, rollup.date): {
+            "completed_hours": rollup.completed_hours,
+            "completed_count": rollup.completed_count,
+            "total_hours": rollup.total_hours,
+            "total_count": rollup.total_count,
+        }
+        for rollup in query
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None:
+            drift.append((key, want, have))
+            continue
+        # Hours are summed incrementally, so allow for float rounding
+        if (
+            want["completed_count"] != have["completed_count"]
+            or want["total_count"] != have["total_count"]
+            or abs(want["completed_hours"] - have["completed_hours"]) > 1e-6
+            or abs(want["total_hours"] - have["total_hours"]) > 1e-6
+        ):
+            drift.append((key, want, have))
+    return drift
+
+
+def _rebuild_rollups(user_id=None):
+    """Replace stored rollups with ones recomputed from work_entries."""
+    rollups = _compute_rollups(user_id)
+    delete = DailyRollup.__table__.delete()
+    if user_id is not None:
+        delete = delete.where(DailyRollup.user_id == user_id)
+    try:
+        db.session.execute(delete)
+        if rollups:
+            db.session.execute(
+                DailyRollup.__table__.insert(),
+                [
+                    {"user_id": key[0], "date": key[1], **values}
+                    for key, values in rollups.items()
+                ],
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    cache = current_app.extensions.get("series_cache")
+    if cache is not None:
+        cache.clear()
+    return len(rollups)
+
+
+def _statistics_query(user_id, today):
+    """Select the daily rollups the statistics are computed from."""
+    # At most eight daily rollup rows cover both "today" and "last week"
+    return db.select(DailyRollup).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.date >= today - timedelta(days=7),
+        DailyRollup.date <= today,
+    )
+
+
+def _summarize_statistics(rollups, today):
+    """Statistics payload from the rollups of the last eight days."""
+    today_hours = sum(r.completed_hours for r in rollups if r.date == today)
+    last_week_hours = sum(r.completed_hours for r in rollups)
+    last_week_tasks = sum(r.completed_count for r in rollups)
+
+    return {
+        "today_hours": round(today_hours, 2),
+        "last_week_hours": round(last_week_hours, 2),
+        "last_week_tasks": last_week_tasks,
+    }
+
+
+def _get_statistics(user_id):
+    """Get work statistics for a user."""
+    today = datetime.now().date()
+    rollups = db.session.scalars(_statistics_query(user_id, today)).all()
+    return _summarize_statistics(rollups, today)
+
+
+# Response cache
+class _LRUCache:
+    """Bounded in-process LRU cache with a TTL and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class _MemoryCacheStore:
+    """Per-process cache store; only suitable for a single worker."""
+
+    def __init__(self):
+        self._versions = {}
+        # Versions end up in ETags, so they must not repeat after a restart
+        self._initial_version = time.time_ns()
+        self._lock = threading.Lock()
+
+    def get_version(self, user_id):
+        return self._versions.get(user_id, self._initial_version)
+
+    def bump_version(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self.get_version(user_id) + 1
+
+    def get(self, key):
+        # Payloads already live in the in-process LRU
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+def _thread_sqlite_connection(local, path):
+    """One autocommit connection per thread, reopened after a fork."""
+    conn = getattr(local, "conn", None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+
+class _SQLiteCacheStore:
+    """Cache store in a local SQLite file shared by every worker process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_versions "
+                "(user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return _thread_sqlite_connection(self._local, self.path)
+
+    def get_version(self, user_id):
+        row = (
+            self._connect()
+            .execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,))
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def bump_version(self, user_id):
+        self._connect().execute(
+            "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
+
+    def get(self, key):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) "
+            "VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        self._sets += 1
+        if self._sets % 500 == 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),)
+            )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+
+class _ResponseCache:
+    """Per-user response cache keyed by the user's data version.
+
+    Writes bump the version instead of deleting keys, so stale entries are
+    never read again and simply age out of the LRU and the shared store.
+    """
+
+    def __init__(self, store, max_entries=1024, ttl=300):
+        self.store = store
+        self.local = _LRUCache(max_entries, ttl)
+        self.ttl = ttl
+        self.shared_hits = 0
+
+    def _key(self, user_id, endpoint, args):
+        version = self.store.get_version(user_id)
+        normalized = "&".join(f"{name}={value}" for name, value in sorted(args))
+        return f"{user_id}:{version}:{endpoint}:{normalized}"
+
+    def get(self, user_id, endpoint, args):
+        key = self._key(user_id, endpoint, args)
+        value = self.local.get(key)
+        if value is None:
+            value = self.store.get(key)
+            if value is not None:
+                self.shared_hits += 1
+                self.local.set(key, value)
+        return key, value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        self.store.set(key, value, self.ttl)
+
+    def bump_version(self, user_id):
+        self.store.bump_version(user_id)
+
+    def stats(self):
+        return {**self.local.stats(), "shared_hits": self.shared_hits}
+
+
+def _init_response_cache(app):
+    """Attach the response cache to the app when it is enabled."""
+    if not app.config["RESPONSE_CACHE_ENABLED"]:
+        return
+    if app.config["RESPONSE_CACHE_BACKEND"] == "sqlite":
+        path = app.config["RESPONSE_CACHE_PATH"] or os.path.join(
+            app.instance_path, "response_cache.sqlite3"
+        )
+        store = _SQLiteCacheStore(path)
+    else:
+        store = _MemoryCacheStore()
+    app.extensions["response_cache"] = _ResponseCache(
+        store,
+        max_entries=int(app.config["RESPONSE_CACHE_MAX_ENTRIES"]),
+        ttl=int(app.config["RESPONSE_CACHE_TTL"]),
+    )
+
+
+def _bump_user_data_version(user_id):
+    """Invalidate every cached response for a user after a write."""
+    cache = current_app.extensions.get("response_cache")
+    if cache is not None:
+        cache.bump_version(user_id)
+
+
+def _cached_per_user(vary_on_today=False):
+    """Cache a JSON view's 200 responses per user and data version."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get("response_cache")
+            if cache is None:
+                return view(*args, **kwargs)
+
+            key_args = list(request.args.items(multi=True)) + list(kwargs.items())
+            if vary_on_today:
+                # Relative statistics change at midnight without any write
+                key_args.append(("__today", datetime.now().date().isoformat()))
+            key, body = cache.get(int(get_jwt_identity()), request.endpoint, key_args)
+            if body is not None:
+                return current_app.response_class(body, mimetype="application/json")
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if (
+                response.status_code == 200
+                and not response.is_streamed
+                and not _reads_replica()
+            ):
+                cache.set(key, response.get_data(as_text=True))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Statistics series
+STATISTICS_BUCKETS = ("day", "week", "month")
+# Default range, in days back from the end date, per bucket size
+STATISTICS_DEFAULT_SPANS = {"day": 29, "week": 83, "month": 364}
+SERIES_CACHE_TTL = 10 * 365 * 24 * 3600
+
+
+def _bucket_start(bucket, day):
+    """First day of the day, ISO week or month containing ``day``."""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket_start(bucket, start):
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bucket_start_column(bucket, dialect_name):
+    """SQL expression for the bucket of DailyRollup.date, or None if unsupported."""
+    if bucket == "day":
+        return DailyRollup.date
+    if dialect_name == "postgresql":
+        return db.cast(db.func.date_trunc(bucket, DailyRollup.date), db.Date)
+    if dialect_name == "sqlite":
+        if bucket == "week":
+            # Back six days, then forward to a Monday: the week's Monday
+            return db.func.date(DailyRollup.date, "-6 days", "weekday 1")
+        return db.func.strftime("%Y-%m-01", DailyRollup.date)
+    return None
+
+
+def _today_in(timezone):
+    """Today's date in an IANA timezone, or the server's when it is None."""
+    if timezone is None:
+        return datetime.now().date()
+    return datetime.now(ZoneInfo(timezone)).date()
+
+
+def _plan_statistics_series(args):
+    """Validate series query args into (plan, error)."""
+    bucket = args.get("bucket", "day")
+    if bucket not in STATISTICS_BUCKETS:
+        return None, "bucket must be one of: day, week, month"
+    timezone = args.get("tz")
+    try:
+        today = _today_in(timezone)
+    except (ValueError, ZoneInfoNotFoundError):
+        return None, "Unknown timezone"
+
+    end = today
+    if args.get("end"):
+        end, error = _validate_date_format(args["end"])
+        if error:
+            return None, error
+    start = end - timedelta(days=STATISTICS_DEFAULT_SPANS[bucket])
+    if args.get("start"):
+        start, error = _validate_date_format(args["start"])
+        if error:
+            return None, error
+    if start > end:
+        return None, "start must not be after end"
+
+    # The range is widened to whole buckets so every bucket can be cached
+    starts = [_bucket_start(bucket, start)]
+    while _next_bucket_start(bucket, starts[-1]) <= end:
+        starts.append(_next_bucket_start(bucket, starts[-1]))
+        if len(starts) > current_app.config["STATISTICS_SERIES_MAX_BUCKETS"]:
+            return None, "Too many buckets; narrow the range or use a larger bucket"
+    return {"bucket": bucket, "starts": starts, "today": today}, None
+
+
+def _series_query(user_id, bucket, first, last):
+    """Totals per bucket for the rollups between two dates, in one GROUP BY."""
+    dialect_name = db.session.get_bind().dialect.name
+    column = _bucket_start_column(bucket, dialect_name)
+    if column is None:
+        # No bucket expression for this dialect: group by day and fold later
+        column = DailyRollup.date
+    column = column.label("bucket")
+    return (
+        db.select(
+            column,
+            *(
+                db.func.sum(DailyRollup.__table__.c[name]).label(name)
+                for name in ROLLUP_COLUMNS
+            ),
+        )
+        .where(
+            DailyRollup.user_id == user_id,
+            DailyRollup.date >= first,
+            DailyRollup.date <= last,
+        )
+        .group_by(column)
+    )
+
+
+def _series_totals(hours=0.0, completed_hours=0.0, tasks=0, completed_tasks=0):
+    return {
+        "hours": round(hours or 0.0, 2),
+        "completed_hours": round(completed_hours or 0.0, 2),
+        "tasks": int(tasks or 0),
+        "completed_tasks": int(completed_tasks or 0),
+    }
+
+
+def _compute_series(user_id, bucket, starts):
+    """Totals for the given bucket starts from one query over their date span."""
+    last = _next_bucket_start(bucket, starts[-1]) - timedelta(days=1)
+    totals = {start: Counter() for start in starts}
+    for row in db.session.execute(_series_query(user_id, bucket, starts[0], last)):
+        start = row.bucket
+        if isinstance(start, str):
+            start = date.fromisoformat(start)
+        start = _bucket_start(bucket, start)
+        if start in totals:
+            totals[start].update(
+                {
+                    "hours": row.total_hours or 0.0,
+                    "completed_hours": row.completed_hours or 0.0,
+                    "tasks": row.total_count or 0,
+                    "completed_tasks": row.completed_count or 0,
+                }
+            )
+    return {start: _series_totals(**values) for start, values in totals.items()}
+
+
+class _SeriesCache:
+    """Totals of past statistics buckets, kept until an entry inside changes.
+
+    A bucket that ended before today only changes through writes to entries
+    dated inside it, so it is cached without expiry and dropped by those.
+    """
+
+    def __init__(self, store, local=None):
+        # The store keeps versions, and payloads too unless they are local
+        self.store = store
+        self.local = local
+
+    def _key(self, epoch, user_id, bucket, start):
+        return f"series:{epoch}:{user_id}:{bucket}:{start.isoformat()}"
+
+    def _read(self, key):
+        return self.store.get(key) if self.local is None else self.local.get(key)
+
+    def _write(self, key, value):
+        if self.local is None:
+            self.store.set(key, value, SERIES_CACHE_TTL)
+        else:
+            self.local.set(key, value)
+
+    def _drop(self, key):
+        if self.local is None:
+            self.store.delete(key)
+        else:
+            self.local.delete(key)
+
+    def token(self, user_id):
+        """Versions to check before storing totals computed after this call."""
+        # Version 0 is a global epoch; user ids start at 1
+        return self.store.get_version(0), self.store.get_version(user_id)
+
+    def get(self, user_id, bucket, starts):
+        epoch = self.store.get_version(0)
+        found = {}
+        for start in starts:
+            value = self._read(self._key(epoch, user_id, bucket, start))
+            if value is not None:
+                found[start] = value
+        return found
+
+    def set(self, user_id, bucket, totals, token):
+        # A write that committed while these were computed may have missed them
+        if not totals or self.token(user_id) != token:
+            return
+        for start, value in totals.items():
+            self._write(self._key(token[0], user_id, bucket, start), value)
+
+    def invalidate(self, user_id, dates):
+        epoch = self.store.get_version(0)
+        for day in dates:
+            for bucket in STATISTICS_BUCKETS:
+                start = _bucket_start(bucket, day)
+                self._drop(self._key(epoch, user_id, bucket, start))
+        self.store.bump_version(user_id)
+
+    def clear(self):
+        self.store.bump_version(0)
+
+
+def _init_series_cache(app):
+    backend = app.config["STATISTICS_CACHE_BACKEND"]
+    if backend == "sqlite":
+        path = app.config["STATISTICS_CACHE_PATH"] or os.path.join(
+            app.instance_path, "statistics_cache.sqlite3"
+        )
+        cache = _SeriesCache(_SQLiteCacheStore(path))
+    elif backend == "memory":
+        local = _LRUCache(
+            max_entries=app.config["STATISTICS_CACHE_MAX_ENTRIES"],
+            ttl=SERIES_CACHE_TTL,
+        )
+        cache = _SeriesCache(_MemoryCacheStore(), local)
+    else:
+        return
+    app.extensions["series_cache"] = cache
+
+
+def _mark_statistics_dirty(session, cache, user_id, dates):
+    """Remember rollup dates changed in a transaction, to drop after commit."""
+    if cache is None:
+        return
+    _, dirty = session.info.setdefault("statistics_dirty", (cache, set()))
+    dirty.update((user_id, day) for day in dates)
+
+
+@db.event.listens_for(Session, "after_commit")
+def _invalidate_statistics_series(session):
+    if "statistics_dirty" not in session.info:
+        return
+    cache, dirty = session.info.pop("statistics_dirty")
+    by_user = {}
+    for user_id, day in dirty:
+        by_user.setdefault(user_id, set()).add(day)
+    for user_id, dates in by_user.items():
+        cache.invalidate(user_id, dates)
+
+
+@db.event.listens_for(Session, "after_rollback")
+def _forget_statistics_dirty(session):
+    session.info.pop("statistics_dirty", None)
+
+
+def _get_statistics_series(user_id, plan):
+    """Series payload: cached past buckets plus the recomputed recent ones."""
+    bucket, starts, today = plan["bucket"], plan["starts"], plan["today"]
+    cache = current_app.extensions.get("series_cache")
+    totals = cache.get(user_id, bucket, starts) if cache else {}
+    missing = [start for start in starts if start not in totals]
+    if missing:
+        token = cache.token(user_id) if cache else None
+        computed = _compute_series(user_id, bucket, missing)
+        totals.update(computed)
+        if cache and not _reads_replica():
+            # Only buckets that ended before today are final
+            past = {
+                start: value
+                for start, value in computed.items()
+                if _next_bucket_start(bucket, start) <= today
+            }
+            cache.set(user_id, bucket, past, token)
+
+    series = []
+    for start in starts:
+        end = _next_bucket_start(bucket, start) - timedelta(days=1)
+        series.append(
+            {"start": start.isoformat(), "end": end.isoformat(), **totals[start]}
+        )
+    return {
+        "bucket": bucket,
+        "start": starts[0].isoformat(),
+        "end": series[-1]["end"],
+        "today": today.isoformat(),
+        "series": series,
+    }
+
+
+# Conditional requests
+PRECONDITION_FAILED_ERROR = "Work entry was modified by another request"
+
+
+def _make_etag(*parts):
+    """Build a strong ETag value from everything a response depends on."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _entry_etag(entry_id, updated_at):
+    """ETag of a single work entry."""
+    return _make_etag("entry", entry_id, updated_at)
+
+
+def _work_entries_etag(user_id):
+    """ETag of an entry listing.
+
+    With the response cache on, the user's data version identifies the data,
+    unless the request reads a replica. Otherwise the ETag covers the rows of
+    the requested page and the total, so it never aggregates over every entry
+    of the user, and the view serves the rows read here.
+    """
+    args = sorted(request.args.items(multi=True))
+    cache = current_app.extensions.get("response_cache")
+    if cache is not None and not _reads_replica():
+        return _make_etag("entries", user_id, args, cache.store.get_version(user_id))
+
+    plan, error = _plan_entries_listing(user_id, request.args)
+    if error:
+        return None
+    # Extra trailing columns are dropped when the rows are serialized
+    rows = db.session.execute(plan["rows"].add_columns(WorkEntry.updated_at)).all()
+    total = db.session.scalar(plan["count"]) if plan["count"] is not None else None
+    g._entries_listing = plan, rows, total
+    return _make_etag("entries", user_id, args, [tuple(row) for row in rows], total)
+
+
+def _work_entry_etag(user_id, entry_id):
+    """ETag of one entry, read without loading the entry itself."""
+    row = (
+        db.session.query(WorkEntry.updated_at)
+        .filter_by(id=entry_id, user_id=user_id)
+        .first()
+    )
+    return _entry_etag(entry_id, row[0]) if row else None
+
+
+def _statistics_etag(user_id):
+    """ETag of the statistics: today plus the entries in the 8-day window."""
+    today = datetime.now().date()
+    row = (
+        db.session.query(db.func.max(WorkEntry.updated_at), db.func.count(WorkEntry.id))
+        .filter(
+            WorkEntry.user_id == user_id,
+            WorkEntry.date >= today - timedelta(days=7),
+            WorkEntry.date <= today,
+        )
+        .one()
+    )
+    return _make_etag("statistics", user_id, today, *row)
+
+
+def _etag_matches(etags, etag):
+    """Check an If-Match/If-None-Match header, ignoring content-coding suffixes."""
+    if etags.star_tag:
+        return True
+    return any(_strip_coding_suffix(tag) == etag for tag in etags.as_set())
+
+
+def _conditional_get(etag_func):
+    """Answer If-None-Match with 304 before the view loads or serializes rows."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_func(int(get_jwt_identity()), *args, **kwargs)
+            if etag is not None and _etag_matches(request.if_none_match, etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if etag is not None:
+                response.set_etag(etag)
+            # Let browsers keep the body but revalidate it on every use
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add("Authorization")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _claim_statement(work_entry, claimed_at):
+    """UPDATE that moves updated_at on only if nobody else changed the entry."""
+    return (
+        db.update(WorkEntry)
+        .where(WorkEntry.id == work_entry.id, WorkEntry.date == work_entry.date)
+        .where(WorkEntry.updated_at == work_entry.updated_at)
+        .values(updated_at=claimed_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _claim_entry_version(work_entry, if_match):
+    """Check the request's If-Match against an entry and claim its version.
+
+    The UPDATE only matches while updated_at is unchanged, so of two writers
+    holding the same ETag exactly one wins and the other gets a 412.
+    """
+    if not if_match:
+        return True
+    if not _etag_matches(if_match, _entry_etag(work_entry.id, work_entry.updated_at)):
+        return False
+
+    claimed_at = datetime.utcnow()
+    claimed = db.session.execute(_claim_statement(work_entry, claimed_at)).rowcount
+    if not claimed:
+        return False
+    work_entry.updated_at = claimed_at
+    return True
+
+
+# Response compression
+COMPRESSIBLE_MIMETYPES = frozenset(
+    ("application/json", "application/x-ndjson", "text/csv", "text/html", "text/plain")
+)
+
+
+class _Compressor:
+    """Incremental encoder with a common compress/flush/finish interface."""
+
+    def __init__(self, compress, flush, finish):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+def _gzip_compressor(level):
+    encoder = zlib.compressobj(
+        min(max(level, 1), 9), zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    return _Compressor(
+        encoder.compress,
+        lambda: encoder.flush(zlib.Z_SYNC_FLUSH),
+        encoder.flush,
+    )
+
+
+def _brotli_compressor(level):
+    encoder = brotli.Compressor(quality=min(max(level, 0), 11))
+    return _Compressor(encoder.process, encoder.flush, encoder.finish)
+
+
+def _zstd_compressor(level):
+    encoder = zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compressobj()
+    return _Compressor(
+        encoder.compress,
+        lambda: encoder.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        encoder.flush,
+    )
+
+
+def _available_encodings():
+    """Content codings this process can produce, by name."""
+    encodings = {"gzip": _gzip_compressor}
+    if brotli is not None:
+        encodings["br"] = _brotli_compressor
+    if zstandard is not None:
+        encodings["zstd"] = _zstd_compressor
+    return encodings
+
+
+def _strip_coding_suffix(etag):
+    """Map the ETag of a compressed representation back to the plain one."""
+    base, _, coding = etag.rpartition("-")
+    return base if base and coding in ("gzip", "br", "zstd") else etag
+
+
+def _compress_stream(chunks, compressor):
+    """Compress a streamed body chunk by chunk, flushing after each one."""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _compress_response(response):
+    """Encode a response body with the best coding the client accepts."""
+    config = current_app.config
+    if response.status_code == 304:
+        return _vary_not_modified(response)
+    if (
+        response.status_code != 200
+        or request.method == "HEAD"
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or "no-transform" in response.cache_control
+    ):
+        return response
+
+    # The body depends on Accept-Encoding from here on, compressed or not
+    response.vary.add("Accept-Encoding")
+    if (
+        not response.is_streamed
+        and (response.calculate_content_length() or 0) < config["COMPRESSION_MIN_SIZE"]
+    ):
+        return response
+
+    encodings = current_app.extensions["compression"]
+    coding = request.accept_encodings.best_match(encodings)
+    if coding is None:
+        return response
+    compressor = encodings[coding](config["COMPRESSION_LEVEL"])
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(
+            compressor.compress(response.get_data()) + compressor.finish()
+        )
+    response.headers["Content-Encoding"] = coding
+
+    # A compressed body is a different representation, so it needs its own ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{coding}", weak=weak)
+    return response
+
+
+def _vary_not_modified(response):
+    """Give a 304 the Vary and ETag headers its 200 would have carried."""
+    etag, weak = response.get_etag()
+    if etag is None:
+        return response
+    response.vary.add("Accept-Encoding")
+    # The client revalidated a compressed copy if it sent the suffixed ETag
+    coding = request.accept_encodings.best_match(current_app.extensions["compression"])
+    if coding is not None and request.if_none_match.contains_raw(
+        quote_etag(f"{etag}-{coding}", weak)
+    ):
+        response.set_etag(f"{etag}-{coding}", weak=weak)
+    return response
+
+
+def _init_compression(app):
+    """Register response compression for the codings enabled in config."""
+    if not app.config["COMPRESSION_ENABLED"]:
+        return
+    available = _available_encodings()
+    preferred = [
+        coding.strip()
+        for coding in app.config["COMPRESSION_ENCODINGS"].split(",")
+        if coding.strip() in available
+    ]
+    # Ordered by server preference; best_match keeps it for equal q-values
+    app.extensions["compression"] = {coding: available[coding] for coding in preferred}
+    if preferred:
+        app.after_request(_compress_response)
+
+
+# Request instrumentation
+def _request_timings():
+    """Timings of the current request, or None when it is not instrumented."""
+    if not has_request_context():
+        return None
+    return g.get("_timings")
+
+
+def _record_timing(name, elapsed):
+    """Add elapsed seconds to one of the current request's timings."""
+    timings = _request_timings()
+    if timings is not None:
+        timings[name] += elapsed
+
+
+def _request_route():
+    """The matched route of the current request, for log lines."""
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        return f"{request.method} {rule}"
+    return "-"
+
+
+def _instrument_engine(app, engine):
+    """Time every statement and log the ones over SLOW_QUERY_MS.
+
+    Bound parameters (emails, password hashes) are only logged with
+    SLOW_QUERY_LOG_PARAMETERS.
+    """
+    slow_query_seconds = app.config["SLOW_QUERY_MS"] / 1000
+    log_parameters = app.config["SLOW_QUERY_LOG_PARAMETERS"]
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        timings = _request_timings()
+        if timings is not None:
+            timings["db"] += elapsed
+            timings["queries"] += 1
+            timings["statements"][statement] += 1
+        if elapsed < slow_query_seconds:
+            return
+        message = "Slow query (%.1f ms) on %s: %s"
+        args = [elapsed * 1000, _request_route(), statement]
+        if log_parameters:
+            message += "; parameters: %r"
+            args.append(parameters)
+        app.logger.warning(message, *args)
+
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.execution_context is None:
+            return
+        started = context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+    db.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db.event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    db.event.listen(engine, "handle_error", handle_error)
+
+
+def _start_request_timings(sender, **extra):
+    g._timings = {
+        "started": time.perf_counter(),
+        "db": 0.0,
+        "queries": 0,
+        "statements": Counter(),
+        "auth": 0.0,
+        "serialize": 0.0,
+    }
+
+
+def _finish_request_timings(sender, response, **extra):
+    """Add the Server-Timing header and flag repeated statements."""
+    timings = g.pop("_timings", None)
+    if timings is None:
+        return
+    total = time.perf_counter() - timings["started"]
+    response.headers["Server-Timing"] = ", ".join(
+        (
+            f'db;dur={timings["db"] * 1000:.2f};desc="{timings["queries"]} queries"',
+            f"serialize;dur={timings['serialize'] * 1000:.2f}",
+            f"auth;dur={timings['auth'] * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        )
+    )
+
+    threshold = sender.config["N_PLUS_ONE_THRESHOLD"]
+    for statement, count in timings["statements"].items():
+        if count > threshold:
+            sender.logger.warning(
+                "Possible N+1 on %s: %d runs of %s",
+                _request_route(),
+                count,
+                statement,
+            )
+
+
+def _init_instrumentation(app):
+    """Hook engine events and request signals when instrumentation is on."""
+    if not app.config["INSTRUMENTATION_ENABLED"]:
+        return
+    with app.app_context():
+        for engine in [db.engine, *app.extensions.get("db_replicas", ())]:
+            _instrument_engine(app, engine)
+    request_started.connect(_start_request_timings, app)
+    request_finished.connect(_finish_request_timings, app)
+
+
+# Metrics
+METRIC_FAMILIES = {
+    "http_requests_total": (
+        "counter",
+        "Requests by endpoint, method and status code.",
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Request latency by endpoint and method.",
+    ),
+    "http_requests_in_progress": ("gauge", "Requests currently being served."),
+    "db_pool_connections": ("gauge", "Database connections by state."),
+    "db_pool_size": ("gauge", "Configured connection pool size."),
+    "password_hash_duration_seconds": (
+        "histogram",
+        "Time spent hashing or verifying a password.",
+    ),
+    "password_hash_queue_seconds": (
+        "histogram",
+        "Time spent waiting for a password hashing slot.",
+    ),
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_FILE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=4096)
+def _metric_key(name, labels):
+    """Stable string key for a sample; labels is a tuple of (name, value)."""
+    return json.dumps([name, labels])
+
+
+def _is_gauge(key):
+    """Whether a stored sample key belongs to a gauge family."""
+    return METRIC_FAMILIES.get(json.loads(key)[0], ("",))[0] == "gauge"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_metric_entries(data, used):
+    """Yield (key, value offset, value) from a metrics file's contents."""
+    offset = 8
+    while offset < used:
+        length = struct.unpack_from("I", data, offset)[0]
+        padded = length + (-(length + 4) % 8)
+        key_start = offset + 4
+        key = struct.unpack_from(f"{length}s", data, key_start)[0].decode()
+        position = key_start + padded
+        yield key, position, struct.unpack_from("d", data, position)[0]
+        offset = position + 8
+
+
+class _MetricsStore:
+    """Metric values of this process, in memory or in a shared directory.
+
+    With a directory every process writes its own memory-mapped file, so a
+    scrape served by any gunicorn worker can add up all of them.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._values = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._map = None
+        self._used = 0
+        self._positions = {}
+
+    def _open(self):
+        # One file per process; a store inherited through fork() opens its own
+        path = os.path.join(self.directory, f"metrics_{os.getpid()}.db")
+        with open(path, "a+b") as handle:
+            if os.fstat(handle.fileno()).st_size == 0:
+                handle.truncate(METRICS_FILE_SIZE)
+            self._map = mmap.mmap(handle.fileno(), 0)
+        self._pid = os.getpid()
+        self._used = struct.unpack_from("Q", self._map, 0)[0] or 8
+        self._positions = {
+            key: position
+            for key, position, _ in _read_metric_entries(self._map, self._used)
+        }
+        # The file may be left by an exited process that had the same PID;
+        # its counters still count, but its gauges describe nothing here
+        for key, position in self._positions.items():
+            if _is_gauge(key):
+                struct.pack_into("d", self._map, position, 0.0)
+
+    def _position(self, key):
+        if self._pid != os.getpid():
+            self._open()
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode()
+            padded = len(encoded) + (-(len(encoded) + 4) % 8)
+            size = 4 + padded + 8
+            if self._used + size > len(self._map):
+                self._map.resize(max(len(self._map) * 2, self._used + size))
+            struct.pack_into(
+                f"I{padded}sd", self._map, self._used, len(encoded), encoded, 0.0
+            )
+            position = self._used + 4 + padded
+            self._used += size
+            # Readers only see the entry once it is completely written
+            struct.pack_into("Q", self._map, 0, self._used)
+            self._positions[key] = position
+        return position
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            if self.directory is None:
+                self._values[key] = self._values.get(key, 0.0) + amount
+                return
+            position = self._position(key)
+            value = struct.unpack_from("d", self._map, position)[0]
+            struct.pack_into("d", self._map, position, value + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            if self.directory is None:
+                self._values[key] = value
+                return
+            struct.pack_into("d", self._map, self._position(key), value)
+
+    def snapshots(self):
+        """(pid, {key: value}) for every process that recorded metrics."""
+        if self.directory is None:
+            with self._lock:
+                return [(os.getpid(), dict(self._values))]
+        snapshots = []
+        for name in os.listdir(self.directory):
+            match = re.fullmatch(r"metrics_(\d+)\.db", name)
+            if not match:
+                continue
+            with open(os.path.join(self.directory, name), "rb") as handle:
+                data = handle.read()
+            if len(data) < 8:
+                continue
+            used = min(struct.unpack_from("Q", data, 0)[0], len(data))
+            values = {key: value for key, _, value in _read_metric_entries(data, used)}
+            snapshots.append((int(match.group(1)), values))
+        return snapshots
+
+
+class _Metrics:
+    """Counters, gauges and histograms recorded into a _MetricsStore."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def inc(self, name, labels=(), amount=1.0):
+        self.store.inc(_metric_key(name, labels), amount)
+
+    def set(self, name, labels, value):
+        self.store.set(_metric_key(name, labels), value)
+
+    def observe(self, name, labels, value):
+        # Buckets are stored per bound and made cumulative when rendered
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        bound = str(LATENCY_BUCKETS[index]) if index < len(LATENCY_BUCKETS) else "+Inf"
+        self.store.inc(_metric_key(f"{name}_bucket", labels + (("le", bound),)))
+        self.store.inc(_metric_key(f"{name}_sum", labels), value)
+        self.store.inc(_metric_key(f"{name}_count", labels))
+
+    def render(self):
+        """Samples of all processes in the Prometheus text format."""
+        totals = {}
+        for pid, values in self.store.snapshots():
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for key, value in values.items():
+                if not alive and _is_gauge(key):
+                    # Gauges of exited workers no longer describe anything
+                    continue
+                name, labels = json.loads(key)
+                sample = (name, tuple(tuple(pair) for pair in labels))
+                totals[sample] = totals.get(sample, 0.0) + value
+
+        lines = []
+        for family, (kind, help_text) in METRIC_FAMILIES.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            if kind == "histogram":
+                lines.extend(_render_histogram(family, totals))
+                continue
+            for (name, labels), value in sorted(totals.items()):
+                if name == family:
+                    lines.append(f"{name}{_render_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _render_histogram(family, totals):
+    """Cumulative bucket, sum and count lines of one histogram."""
+    series = {}
+    for (name, labels), value in totals.items():
+        if name == f"{family}_bucket":
+            bound = dict(labels)["le"]
+            rest = tuple(pair for pair in labels if pair[0] != "le")
+            series.setdefault(rest, {})[bound] = value
+        elif name == f"{family}_count":
+            series.setdefault(labels, {})
+    lines = []
+    for labels in sorted(series):
+        cumulative = 0.0
+        for bound in [str(bucket) for bucket in LATENCY_BUCKETS] + ["+Inf"]:
+            cumulative += series[labels].get(bound, 0.0)
+            bucket_labels = _render_labels(labels + (("le", bound),))
+            lines.append(f"{family}_bucket{bucket_labels} {cumulative}")
+        for suffix in ("sum", "count"):
+            value = totals.get((f"{family}_{suffix}", labels), 0.0)
+            lines.append(f"{family}_{suffix}{_render_labels(labels)} {value}")
+    return lines
+
+
+def _request_labels():
+    return (("endpoint", request.endpoint or "none"), ("method", request.method))
+
+
+def _instrument_pool(metrics, engine):
+    """Keep open and checked-out connection gauges from pool events."""
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        metrics.set("db_pool_size", (), pool.size())
+
+    def track(state, amount):
+        labels = (("state", state),)
+        return lambda *args: metrics.inc("db_pool_connections", labels, amount)
+
+    db.event.listen(pool, "connect", track("open", 1))
+    db.event.listen(pool, "close", track("open", -1))
+    db.event.listen(pool, "close_detached", track("open", -1))
+    db.event.listen(pool, "checkout", track("checked_out", 1))
+    db.event.listen(pool, "checkin", track("checked_out", -1))
+
+
+def _init_metrics(app):
+    """Record request, pool and password hashing metrics for /metrics."""
+    directory = app.config["METRICS_MULTIPROC_DIR"]
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    metrics = _Metrics(_MetricsStore(directory))
+    app.extensions["metrics"] = metrics
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        metrics.inc("http_requests_in_progress", _request_labels())
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "_metrics_started" in g:
+            labels = _request_labels()
+            elapsed = time.perf_counter() - g._metrics_started
+            metrics.observe("http_request_duration_seconds", labels, elapsed)
+            status = (("status", str(response.status_code)),)
+            metrics.inc("http_requests_total", labels + status)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error=None):
+        if "_metrics_started" in g:
+            metrics.inc("http_requests_in_progress", _request_labels(), -1)
+
+    def observe_password_hash(operation, queued, elapsed):
+        labels = (("operation", operation),)
+        metrics.observe("password_hash_queue_seconds", labels, queued)
+        metrics.observe("password_hash_duration_seconds", labels, elapsed)
+
+    app.extensions["password_hasher"].observer = observe_password_hash
+
+    with app.app_context():
+        _instrument_pool(metrics, db.engine)
+
+
+# Profiling
+PROFILE_SECRET_HEADER = "X-Profile-Secret"
+PROFILE_MODES = ("1", "text", "pstats", "collapsed")
+
+
+def _collapse_stack(frame):
+    """One sampled stack as a collapsed-stack line, outermost frame first."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+        frames.append(f"{name}{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def _render_collapsed(stacks):
+    """Stacks in the format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class _StackSampler:
+    """Sample one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+class _ProfileStore:
+    """Sampled stacks of 1-in-N requests, merged per endpoint."""
+
+    def __init__(self, max_stacks=1000):
+        self.max_stacks = max_stacks
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, stacks):
+        with self._lock:
+            profile = self._profiles.setdefault(
+                endpoint, {"requests": 0, "stacks": Counter()}
+            )
+            profile["requests"] += 1
+            profile["stacks"].update(stacks)
+            if len(profile["stacks"]) > self.max_stacks:
+                # Keep the hot paths; rare stacks barely show in a flame graph
+                profile["stacks"] = Counter(
+                    dict(profile["stacks"].most_common(self.max_stacks))
+                )
+
+    def summary(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": profile["requests"],
+                    "samples": sum(profile["stacks"].values()),
+                }
+                for endpoint, profile in self._profiles.items()
+            }
+
+    def stacks(self, endpoint):
+        with self._lock:
+            profile = self._profiles.get(endpoint)
+            return Counter(profile["stacks"]) if profile else None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+def _profile_authorized():
+    """Whether the request carries the configured profiling secret."""
+    secret = current_app.config["PROFILING_SECRET"]
+    supplied = request.headers.get(PROFILE_SECRET_HEADER, "")
+    return bool(secret) and hmac.compare_digest(supplied.encode(), secret.encode())
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, _StackSampler):
+        return profiler.stop()
+    profiler.disable()
+    return profiler
+
+
+def _profile_response(mode, profiler):
+    """The profile of one request as a downloadable artifact."""
+    if mode == "collapsed":
+        return current_app.response_class(
+            _render_collapsed(profiler.stacks), mimetype="text/plain"
+        )
+    stats = pstats.Stats(profiler)
+    if mode == "pstats":
+        response = current_app.response_class(
+            marshal.dumps(stats.stats), mimetype="application/octet-stream"
+        )
+        response.headers["Content-Disposition"] = "attachment; filename=request.pstats"
+        return response
+    report = io.StringIO()
+    stats.stream = report
+    stats.sort_stats("cumulative").print_stats(50)
+    return current_app.response_class(report.getvalue(), mimetype="text/plain")
+
+
+def _create_profiling_blueprint():
+    """Admin routes for the per-endpoint profiles of sampled requests."""
+    bp = Blueprint("profiling", __name__)
+
+    @bp.before_request
+    def require_secret():
+        if not _profile_authorized():
+            return jsonify({"error": "Invalid profiling secret"}), 403
+
+    @bp.route("/", methods=["GET"])
+    def list_profiles():
+        store = current_app.extensions["profiles"]
+        return jsonify({"profiles": store.summary()}), 200
+
+    @bp.route("/", methods=["DELETE"])
+    def clear_profiles():
+        current_app.extensions["profiles"].clear()
+        return "", 204
+
+    @bp.route("/<endpoint>", methods=["GET"])
+    def get_profile(endpoint):
+        stacks = current_app.extensions["profiles"].stacks(endpoint)
+        if stacks is None:
+            return jsonify({"error": "No samples for this endpoint"}), 404
+        return current_app.response_class(
+            _render_collapsed(stacks), mimetype="text/plain"
+        )
+
+    return bp
+
+
+def _init_profiling(app):
+    """Profile ?__profile=... requests and a 1-in-N sample of all requests."""
+    if not app.config["PROFILING_ENABLED"]:
+        return
+    store = _ProfileStore(max_stacks=app.config["PROFILE_MAX_STACKS"])
+    app.extensions["profiles"] = store
+    sample_rate = app.config["PROFILE_SAMPLE_RATE"]
+    interval = app.config["PROFILE_SAMPLE_INTERVAL_MS"] / 1000
+    request_numbers = itertools.count(1)
+
+    @app.before_request
+    def start_profiling():
+        mode = request.args.get("__profile")
+        if mode is not None:
+            if not _profile_authorized():
+                return jsonify({"error": "Invalid profiling secret"}), 403
+            if mode not in PROFILE_MODES:
+                return jsonify({"error": "Invalid __profile mode"}), 400
+            if mode == "collapsed":
+                profiler = _StackSampler(threading.get_ident(), interval).start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            g._profile = (mode, profiler)
+        elif sample_rate and request.blueprint != "profiling":
+            if next(request_numbers) % sample_rate:
+                return None
+            sampler = _StackSampler(threading.get_ident(), interval).start()
+            g._profile = ("sample", sampler)
+
+    @app.after_request
+    def finish_profiling(response):
+        if "_profile" not in g:
+            return response
+        mode, profiler = g.pop("_profile")
+        _stop_profiler(profiler)
+        if mode == "sample":
+            store.add(request.endpoint or "none", profiler.stacks)
+            return response
+        artifact = _profile_response(mode, profiler)
+        artifact.headers["X-Profiled-Status"] = str(response.status_code)
+        return artifact
+
+    @app.teardown_request
+    def stop_profiling(error=None):
+        # Requests that failed before after_request still stop their profiler
+        if "_profile" in g:
+            _stop_profiler(g.pop("_profile")[1])
+
+    app.register_blueprint(_create_profiling_blueprint(), url_prefix="/admin/profiles")
+
+
+# Admission control
+# Highest priority first: waiting reads go ahead of writes and auth work
+ADMISSION_CLASSES = ("read", "write", "auth")
+EXPENSIVE_AUTH_ENDPOINTS = ("auth.login", "auth.register")
+
+
+def _parse_rate(value):
+    """'10/60' as (burst, period seconds): 10 requests, refilled over 60s."""
+    count, _, seconds = str(value).partition("/")
+    return int(count), float(seconds or 1)
+
+
+def _parse_class_settings(value, parse=float):
+    """'auth=4,read=32' (or a dict) as {class: parsed value}."""
+    if isinstance(value, dict):
+        return {name: parse(setting) for name, setting in value.items()}
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, setting = item.partition("=")
+        settings[name.strip()] = parse(setting.strip())
+    return settings
+
+
+def _admission_class():
+    """The endpoint class a request is admitted under, or None if unlimited."""
+    if request.method == "OPTIONS":
+        return None
+    if request.endpoint in EXPENSIVE_AUTH_ENDPOINTS:
+        return "auth"
+    if request.blueprint in ("auth", "entries"):
+        return "read" if request.method in ("GET", "HEAD") else "write"
+    return None
+
+
+def _client_key():
+    """The user of a valid access token, otherwise the client address."""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        try:
+            token = decode_token(authorization.split(" ", 1)[1])
+            return f"user:{token[current_app.config['JWT_IDENTITY_CLAIM']]}"
+        except (JWTExtendedException, PyJWTError):
+            pass
+    return f"ip:{request.remote_addr}"
+
+
+class _MemoryTokenBuckets:
+    """Token buckets of this process, least recently used evicted first."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, period):
+        """Take a token; return 0 if there was one, else seconds until one."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * burst / period)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) * period / burst
+
+
+class _SQLiteTokenBuckets:
+    """Token buckets in a local SQLite file shared by every worker process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, "
+                "tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return _thread_sqlite_connection(self._local, self.path)
+
+    def take(self, key, burst, period):
+        """Take a token; return 0 if there was one, else seconds until one."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = burst if row is None else row[0] + (now - row[1]) * burst / period
+            tokens = min(burst, tokens)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets "
+                "(key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) * period / burst),
+            )
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                # A full bucket is the same as no row at all
+                conn.execute("DELETE FROM token_buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return 0.0 if allowed else (1 - tokens) * period / burst
+
+
+class _AdmissionController:
+    """Concurrency limits per endpoint class with a bounded priority queue.
+
+    A request waits for a slot for at most its class's queue budget, and is
+    shed at once when the expected wait already exceeds it. Waiting requests
+    of a higher priority class are admitted before lower ones.
+    """
+
+    def __init__(self, limits, budgets, capacity=None):
+        self.limits = limits
+        self.budgets = budgets
+        self.capacity = capacity or float("inf")
+        self._active = Counter()
+        self._waiting = Counter()
+        self._service_times = {}
+        self._condition = threading.Condition()
+
+    def _has_slot(self, admission_class):
+        limit = self.limits.get(admission_class, float("inf"))
+        return (
+            self._active[admission_class] < limit
+            and sum(self._active.values()) < self.capacity
+        )
+
+    def _can_run(self, admission_class):
+        if not self._has_slot(admission_class):
+            return False
+        priority = ADMISSION_CLASSES.index(admission_class)
+        higher = ADMISSION_CLASSES[:priority]
+        return not any(
+            self._waiting[other] and self._has_slot(other) for other in higher
+        )
+
+    def _expected_wait(self, admission_class):
+        service_time = self._service_times.get(admission_class, 0.0)
+        limit = min(self.limits.get(admission_class, self.capacity), self.capacity)
+        return service_time * (self._waiting[admission_class] + 1) / limit
+
+    def acquire(self, admission_class):
+        """Wait for a slot; return None once admitted, else seconds to retry."""
+        budget = self.budgets.get(admission_class, 1.0)
+        with self._condition:
+            if not self._can_run(admission_class):
+                expected = self._expected_wait(admission_class)
+                if expected > budget:
+                    return expected
+                deadline = time.monotonic() + budget
+                self._waiting[admission_class] += 1
+                try:
+                    while not self._can_run(admission_class):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return max(self._expected_wait(admission_class), budget)
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting[admission_class] -= 1
+                    # Lower priority waiters may have been held back by this one
+                    self._condition.notify_all()
+            self._active[admission_class] += 1
+        return None
+
+    def release(self, admission_class, elapsed):
+        with self._condition:
+            self._active[admission_class] -= 1
+            previous = self._service_times.get(admission_class, elapsed)
+            self._service_times[admission_class] = 0.8 * previous + 0.2 * elapsed
+            self._condition.notify_all()
+
+
+def _shed_response(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def _init_admission(app):
+    """Shed auth and entries requests past their rate and concurrency limits."""
+    if not app.config["ADMISSION_ENABLED"]:
+        return
+    limits = _parse_class_settings(app.config["ADMISSION_CONCURRENCY"], int)
+    budgets = {
+        name: budget / 1000
+        for name, budget in _parse_class_settings(
+            app.config["ADMISSION_QUEUE_BUDGET_MS"]
+        ).items()
+    }
+    rates = _parse_class_settings(app.config["ADMISSION_RATE_LIMITS"], _parse_rate)
+    controller = _AdmissionController(
+        limits, budgets, app.config["ADMISSION_MAX_CONCURRENCY"]
+    )
+    if app.config["ADMISSION_STORE"] == "sqlite":
+        path = app.config["ADMISSION_STORE_PATH"] or os.path.join(
+            app.instance_path, "rate_limits.sqlite3"
+        )
+        buckets = _SQLiteTokenBuckets(path)
+    else:
+        buckets = _MemoryTokenBuckets()
+    app.extensions["admission"] = controller
+
+    @app.before_request
+    def admit_request():
+        admission_class = _admission_class()
+        if admission_class is None:
+            return None
+        if admission_class in rates:
+            key = f"{admission_class}:{_client_key()}"
+            retry_after = buckets.take(key, *rates[admission_class])
+            if retry_after:
+                return _shed_response(429, "Too many requests", retry_after)
+        retry_after = controller.acquire(admission_class)
+        if retry_after is not None:
+            return _shed_response(503, "Server is busy, please retry", retry_after)
+        g._admission = (admission_class, time.perf_counter())
+
+    @app.teardown_request
+    def release_admission(error=None):
+        if "_admission" in g:
+            admission_class, started = g.pop("_admission")
+            controller.release(admission_class, time.perf_counter() - started)
+
+
+# Bulk operations
+BULK_CONFLICT_ERROR = "Work entries were changed by another request"
+
+
+def _validate_bulk_operation(operation):
+    """Validate one bulk operation with the single-entry rules."""
+    if not isinstance(operation, dict):
+        return None, "Operation must be an object"
+
+    op = operation.get("op")
+    data = operation.get("data")
+    if op == "create":
+        is_valid, error = _validate_work_entry_data(data)
+        if not is_valid:
+            return None, error
+        date_val, error = _validate_date_format(data["date"])
+        if error:
+            return None, error
+        hours, error = _validate_hours(data["hours"])
+        if error:
+            return None, error
+        values = {
+            "date": date_val,
+            "hours": hours,
+            "description": data["description"],
+            "completed": bool(data.get("completed", False)),
+        }
+        return {"op": op, "values": values}, None
+
+    if op not in ("update", "delete"):
+        return None, "Op must be one of create, update, delete"
+
+    entry_id = operation.get("id")
+    if not isinstance(entry_id, int) or isinstance(entry_id, bool):
+        return None, "Id is required"
+    if op == "delete":
+        return {"op": op, "id": entry_id}, None
+
+    if not data:
+        return None, "No data provided"
+    values = {}
+    if "date" in data:
+        values["date"], error = _validate_date_format(data["date"])
+        if error:
+            return None, error
+    if "hours" in data:
+        values["hours"], error = _validate_hours(data["hours"])
+        if error:
+            return None, error
+    if "description" in data:
+        values["description"] = data["description"]
+    if "completed" in data:
+        values["completed"] = bool(data["completed"])
+    return {"op": op, "id": entry_id, "values": values}, None
+
+
+def _validate_bulk_operations(user_id, operations):
+    """Validate a batch and check ownership with a single SELECT.
+
+    Returns the validated operations, the current rows they touch and a
+    per-item error list (None where the operation is valid).
+    """
+    validated = []
+    errors = []
+    for operation in operations:
+        normalized, error = _validate_bulk_operation(operation)
+        validated.append(normalized)
+        errors.append(error)
+
+    ids = {op["id"] for op in validated if op and op["op"] != "create"}
+    existing = {}
+    if ids:
+        rows = db.session.query(
+            WorkEntry.id,
+            WorkEntry.date,
+            WorkEntry.hours,
+            WorkEntry.description,
+            WorkEntry.completed,
+        ).filter(WorkEntry.user_id == user_id, WorkEntry.id.in_(ids))
+        existing = {row.id: row._asdict() for row in rows}
+
+    seen = set()
+    for index, op in enumerate(validated):
+        if not op or op["op"] == "create":
+            continue
+        if op["id"] not in existing:
+            errors[index] = "Work entry not found"
+        elif op["id"] in seen:
+            errors[index] = "Work entry appears in more than one operation"
+        seen.add(op["id"])
+
+    return validated, existing, errors
+
+
+def _apply_bulk_operations(user_id, operations, existing):
+    """Apply validated operations with one executemany per kind.
+
+    Returns the ids of created entries in operation order and an error when
+    an entry changed since it was validated. The caller owns the transaction
+    and must roll it back on error.
+    """
+    table = WorkEntry.__table__
+    now = datetime.utcnow()
+    creates = [op["values"] for op in operations if op["op"] == "create"]
+    updates = [op for op in operations if op["op"] == "update"]
+    deletes = [op["id"] for op in operations if op["op"] == "delete"]
+    rollup_deltas = []
+
+    created_ids = []
+    if creates:
+        result = db.session.execute(
+            db.insert(WorkEntry).returning(WorkEntry.id, sort_by_parameter_order=True),
+            [{"user_id": user_id, **values} for values in creates],
+        )
+        created_ids = list(result.scalars())
+        rollup_deltas.extend(
+            _rollup_delta(v["date"], v["hours"], v["completed"]) for v in creates
+        )
+
+    if updates:
+        params = []
+        for op in updates:
+            old = existing[op["id"]]
+            new = {**old, **op["values"]}
+            params.append(
+                {
+                    "_id": op["id"],
+                    "_old_date": old["date"],
+                    "date": new["date"],
+                    "hours": new["hours"],
+                    "description": new["description"],
+                    "completed": new["completed"],
+                    "updated_at": now,
+                }
+            )
+            rollup_deltas.append(
+                _rollup_delta(old["date"], old["hours"], old["completed"], sign=-1)
+            )
+            rollup_deltas.append(
+                _rollup_delta(new["date"], new["hours"], new["completed"])
+            )
+        # The old date pins the row (and its partition) to what was validated
+        result = db.session.execute(
+            table.update().where(
+                table.c.id == db.bindparam("_id"),
+                table.c.user_id == user_id,
+                table.c.date == db.bindparam("_old_date"),
+            ),
+            params,
+        )
+        if _rows_changed(result, len(params)):
+            return None, BULK_CONFLICT_ERROR
+
+    if deletes:
+        result = db.session.execute(
+            table.delete().where(table.c.user_id == user_id, table.c.id.in_(deletes))
+        )
+        if _rows_changed(result, len(deletes)):
+            return None, BULK_CONFLICT_ERROR
+        for entry_id in deletes:
+            old = existing[entry_id]
+            rollup_deltas.append(
+                _rollup_delta(old["date"], old["hours"], old["completed"], sign=-1)
+            )
+
+    _apply_rollup_deltas(user_id, rollup_deltas)
+    return created_ids, None
+
+
+def _rows_changed(result, expected):
+    """Whether a write matched fewer rows than the operations it ran."""
+    if not db.session.get_bind().dialect.supports_sane_multi_rowcount:
+        return False
+    return result.rowcount != expected
+
+
+# Export
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _export_query(user_id, start_date, end_date):
+    """Build the column-only export query, streamed in EXPORT_CHUNK_ROWS."""
+    query = db.select(*(getattr(WorkEntry, column) for column in ENTRY_FIELDS))
+    query = query.filter(WorkEntry.user_id == user_id)
+    query, error = _apply_date_filters(query, start_date, end_date)
+    if error:
+        return None, error
+    # yield_per also switches PostgreSQL to a server-side cursor
+    query = query.order_by(WorkEntry.date.desc(), WorkEntry.id.desc())
+    return query.execution_options(yield_per=EXPORT_CHUNK_ROWS), None
+
+
+def _export_values(row):
+    """Format an export row the way WorkEntry.to_dict does."""
+    return [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in row
+    ]
+
+
+def _generate_csv_export(query):
+    """Yield CSV text in chunks, starting with the header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ENTRY_FIELDS)
+    yield buffer.getvalue()
+
+    for rows in db.session.execute(query).partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_export_values(row) for row in rows)
+        yield buffer.getvalue()
+
+
+def _generate_ndjson_export(query):
+    """Yield one JSON object per line, a chunk at a time."""
+    for rows in db.session.execute(query).partitions():
+        yield "".join(
+            current_app.json.dumps(dict(zip(ENTRY_FIELDS, row))) + "\n" for row in rows
+        )
+
+
+# Import
+IMPORT_COLUMNS = (
+    "user_id",
+    "date",
+    "hours",
+    "description",
+    "completed",
+    "created_at",
+    "updated_at",
+)
+MAX_REPORTED_REJECTIONS = 100
+
+
+def _parse_csv_upload(stream):
+    """Yield (line_number, data, error) for each CSV record."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        completed = (row.get("completed") or "").strip().lower()
+        row["completed"] = completed in ("1", "true", "t", "yes", "y")
+        yield reader.line_num, row, None
+
+
+def _parse_ndjson_upload(stream):
+    """Yield (line_number, data, error) for each NDJSON line."""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+            continue
+        if isinstance(data, dict):
+            yield line_number, data, None
+        else:
+            yield line_number, None, "Each line must be a JSON object"
+
+
+def _copy_rows(table_name, columns, rows):
+    """Insert value tuples with PostgreSQL COPY on the session's connection."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            [
+                value.isoformat() if isinstance(value, (date, datetime)) else value
+                for value in row
+            ]
+        )
+    buffer.seek(0)
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _copy_work_entries(rows):
+    """Insert work entry dicts with PostgreSQL COPY."""
+    _copy_rows(
+        "work_entries",
+        IMPORT_COLUMNS,
+        ([row[column] for column in IMPORT_COLUMNS] for row in rows),
+    )
+
+
+def _insert_import_chunk(user_id, rows):
+    """Insert one validated chunk and its rollups in a single transaction."""
+    try:
+        if db.session.get_bind().dialect.name == "postgresql":
+            _copy_work_entries(rows)
+        else:
+            db.session.execute(WorkEntry.__table__.insert(), rows)
+        _apply_rollup_deltas(
+            user_id,
+            [_rollup_delta(r["date"], r["hours"], r["completed"]) for r in rows],
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    _bump_user_data_version(user_id)
+
+
+def _import_work_entries(user_id, records, chunk_size=5000, progress=None):
+    """Validate parsed records like create_work_entry and insert them in chunks.
+
+    Each chunk commits on its own, so a failure part-way keeps earlier
+    chunks. ``progress`` is called with the running report after each chunk.
+    """
+    report = {"imported": 0, "rejected_count": 0, "rejected": []}
+    started = time.perf_counter()
+    chunk = []
+
+    def flush():
+        _insert_import_chunk(user_id, chunk)
+        report["imported"] += len(chunk)
+        chunk.clear()
+        if progress:
+            progress(report)
+
+    for line_number, data, error in records:
+        if error is None:
+            operation, error = _validate_bulk_operation({"op": "create", "data": data})
+        if error:
+            report["rejected_count"] += 1
+            if len(report["rejected"]) < MAX_REPORTED_REJECTIONS:
+                report["rejected"].append({"line": line_number, "error": error})
+            continue
+
+        now = datetime.utcnow()
+        chunk.append(
+            {
+                "user_id": user_id,
+                "created_at": now,
+                "updated_at": now,
+                **operation["values"],
+            }
+        )
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["imported"] / elapsed) if elapsed else 0
+    return report
+
+
+class _UploadReader(io.RawIOBase):
+    """Readable raw stream over any object with ``read``.
+
+    Werkzeug spools uploads to a SpooledTemporaryFile, which has no
+    ``readable()`` before Python 3.11, so io.TextIOWrapper rejects it.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _open_upload(stream, upload_format):
+    """Wrap a binary upload stream in the parser for its format."""
+    text = io.TextIOWrapper(
+        io.BufferedReader(_UploadReader(stream)), encoding="utf-8", newline=""
+    )
+    if upload_format == "ndjson":
+        return _parse_ndjson_upload(text)
+    return _parse_csv_upload(text)
+
+
+# Seeding
+SEED_DESCRIPTIONS = (
+    "Code review",
+    "Sprint planning",
+    "Bug fixing",
+    "Feature development",
+    "Customer support call",
+    "Writing documentation",
+    "Team standup and follow-ups",
+    "Refactoring legacy module",
+    "Deployment and release checks",
+    "Pairing session on the reporting dashboard",
+    "Investigating a production incident and writing the postmortem",
+    "Design review for the next quarter's roadmap",
+)
+SEED_HOURS = (0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0)
+SEED_HOUR_WEIGHTS = (8, 14, 10, 14, 12, 10, 5, 3)
+ROLLUP_TABLE_COLUMNS = ("user_id", "date") + ROLLUP_COLUMNS
+
+
+def _seed_email(prefix, index):
+    return f"{prefix}-{index}@example.com"
+
+
+def _db_value(column, value):
+    """Convert a value the way the column type would before it hits the driver."""
+    dialect = db.session.get_bind().dialect
+    process = column.type.dialect_impl(dialect).bind_processor(dialect)
+    return process(value) if process else value
+
+
+def _insert_rows(table, columns, rows):
+    """Insert value tuples, already in driver format, in one executemany.
+
+    Skips SQLAlchemy's per-row parameter processing, which costs more than
+    the insert itself at seeding volumes.
+    """
+    dialect = db.session.get_bind().dialect
+    if dialect.name == "postgresql":
+        _copy_rows(table.name, columns, rows)
+        return
+    placeholder = "?" if dialect.paramstyle == "qmark" else "%s"
+    db.session.connection().exec_driver_sql(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join([placeholder] * len(columns))})",
+        rows,
+    )
+
+
+def _insert_seed_chunk(entries, rollups):
+    """Insert generated entries and their daily rollups in one transaction."""
+    try:
+        _insert_rows(WorkEntry.__table__, IMPORT_COLUMNS, entries)
+        _insert_rows(DailyRollup.__table__, ROLLUP_TABLE_COLUMNS, rollups)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _seed_database(
+    users,
+    days,
+    entries_per_day=1.5,
+    heavy_share=0.05,
+    spread=0.5,
+    weekend_factor=0.3,
+    seed=0,
+    end_date=None,
+    email_prefix="seed-user",
+    password="password123",
+    chunk_size=50000,
+    progress=None,
+):
+    """Generate users and years of daily work entries, deterministically.
+
+    Each user logs ``entries_per_day`` on average, scaled by a per-user
+    lognormal factor (``spread``) and by ``weekend_factor`` on weekends;
+    ``heavy_share`` of users log five times as much. Rows go in with bulk
+    inserts (COPY on PostgreSQL) together with their daily rollups, and
+    every user shares one precomputed password hash.
+    """
+    if User.query.filter_by(email=_seed_email(email_prefix, 0)).first():
+        raise ValueError(f"Users with prefix {email_prefix!r} already exist")
+
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    table = WorkEntry.__table__
+    # One (date, timestamp, is weekend) per day, oldest first, in driver format
+    calendar = []
+    for offset in range(days - 1, -1, -1):
+        day = end_date - timedelta(days=offset)
+        stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=17)
+        calendar.append(
+            (
+                _db_value(table.c.date, day),
+                _db_value(table.c.created_at, stamp),
+                day.weekday() >= 5,
+            )
+        )
+
+    password_hash = _password_hasher().hash(password)
+    created_at = datetime.combine(end_date, datetime.min.time()) - timedelta(days)
+    for start in range(0, users, chunk_size):
+        db.session.execute(
+            User.__table__.insert(),
+            [
+                {
+                    "email": _seed_email(email_prefix, index),
+                    "password_hash": password_hash,
+                    "created_at": created_at,
+                }
+                for index in range(start, min(start + chunk_size, users))
+            ],
+        )
+    db.session.commit()
+    user_ids = [
+        row[0]
+        for row in db.session.query(User.id)
+        .filter(User.email.like(f"{email_prefix}-%@example.com"))
+        .order_by(User.id)
+    ]
+
+    report = {"users": len(user_ids), "entries": 0}
+    entries = []
+    rollups = []
+    for user_id in user_ids:
+        # Mean-one lognormal, so entries_per_day stays the overall average
+        rate = entries_per_day * rng.lognormvariate(-(spread**2) / 2, spread)
+        if rng.random() < heavy_share:
+            rate *= 5
+        completion_rate = rng.uniform(0.5, 0.95)
+        for day, stamp, weekend in calendar:
+            day_rate = rate * weekend_factor if weekend else rate
+            count = int(day_rate) + (rng.random() < day_rate % 1)
+            if not count:
+                continue
+            completed_hours = completed_count = 0
+            hours = rng.choices(SEED_HOURS, weights=SEED_HOUR_WEIGHTS, k=count)
+            for entry_hours in hours:
+                completed = rng.random() < completion_rate
+                if completed:
+                    completed_hours += entry_hours
+                    completed_count += 1
+                entries.append(
+                    (
+                        user_id,
+                        day,
+                        entry_hours,
+                        rng.choice(SEED_DESCRIPTIONS),
+                        completed,
+                        stamp,
+                        stamp,
+                    )
+                )
+            rollups.append(
+                (user_id, day, completed_hours, completed_count, sum(hours), count)
+            )
+        if len(entries) >= chunk_size:
+            _insert_seed_chunk(entries, rollups)
+            report["entries"] += len(entries)
+            entries, rollups = [], []
+            if progress:
+                progress(report)
+    if entries:
+        _insert_seed_chunk(entries, rollups)
+        report["entries"] += len(entries)
+    return report
+
+
+# Entry writes and group commit
+def _create_entry(user_id, data):
+    """Stage a new entry; return (payload, status, headers), uncommitted."""
+    work_entry, error = _new_work_entry(user_id, data)
+    if error:
+        return {"error": error}, 400, {}
+    db.session.add(work_entry)
+    _apply_rollup_delta(
+        work_entry.user_id, work_entry.date, work_entry.hours, work_entry.completed
+    )
+    # Flushing assigns the id, so the response can be built before the commit
+    db.session.flush()
+    return (
+        {
+            "message": "Work entry created successfully",
+            "work_entry": work_entry.to_dict(),
+        },
+        201,
+        {"ETag": quote_etag(_entry_etag(work_entry.id, work_entry.updated_at))},
+    )
+
+
+def _update_entry(user_id, entry_id, data, if_match):
+    """Stage changes to an entry; return (payload, status, headers), uncommitted."""
+    work_entry = WorkEntry.query.filter_by(id=entry_id, user_id=user_id).first()
+    if not work_entry:
+        return {"error": "Work entry not found"}, 404, {}
+    if not data:
+        return {"error": "No data provided"}, 400, {}
+
+    old_rollup_key = (work_entry.date, work_entry.hours, work_entry.completed)
+    if not _claim_entry_version(work_entry, if_match):
+        return {"error": PRECONDITION_FAILED_ERROR}, 412, {}
+    error = _apply_entry_changes(work_entry, data)
+    if error:
+        return {"error": error}, 400, {}
+
+    new_rollup_key = (work_entry.date, work_entry.hours, work_entry.completed)
+    if new_rollup_key != old_rollup_key:
+        # Moves the entry between days and/or completed buckets
+        _apply_rollup_delta(work_entry.user_id, *old_rollup_key, sign=-1)
+        _apply_rollup_delta(work_entry.user_id, *new_rollup_key)
+    db.session.flush()
+    return (
+        {
+            "message": "Work entry updated successfully",
+            "work_entry": work_entry.to_dict(),
+        },
+        200,
+        {"ETag": quote_etag(_entry_etag(work_entry.id, work_entry.updated_at))},
+    )
+
+
+GROUP_COMMIT_UNKNOWN_ERROR = (
+    "Timed out waiting for the write to commit; it may still be applied"
+)
+
+
+class _GroupCommitBusy(Exception):
+    """Raised when a queued write was withdrawn before any batch ran it."""
+
+
+class _GroupCommitter:
+    """Commits entry writes from concurrent requests in shared transactions.
+
+    A background thread takes the first queued write, waits up to
+    ``window`` seconds for more (at most ``max_batch``) and runs each in a
+    savepoint of one transaction. A write that fails or answers with an
+    error only rolls back its own savepoint, and the batch pays for a single
+    commit. If that commit fails, the writes are retried one at a time.
+    A write's ``on_commit`` runs in this thread once it is committed, so it
+    runs even if the request stopped waiting.
+    """
+
+    def __init__(self, app, window, max_batch, timeout):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, write, on_commit=None):
+        """Run ``write`` in the next batch; return its result or raise its error.
+
+        Raises _GroupCommitBusy when the write was withdrawn unapplied, and
+        FutureTimeoutError when it may or may not have been committed.
+        """
+        with self._lock:
+            # Started on first use, so each forked worker gets its own thread
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit", daemon=True
+                )
+                self._thread.start()
+        future = Future()
+        self._queue.put((write, future, on_commit))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A write still queued is withdrawn, so it never runs after the
+            # request gave up; one already in a batch is waited for once more
+            if future.cancel():
+                raise _GroupCommitBusy() from None
+            return future.result(timeout=self.timeout)
+
+    def _next_batch(self):
+        """Queued writes for one batch, leaving out withdrawn ones."""
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch:
+            if deadline is None:
+                item = self._queue.get()
+            else:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+                deadline = deadline or time.monotonic() + self.window
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                try:
+                    self._commit(batch)
+                except Exception as error:
+                    # No database connection, say; every write must still answer
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                finally:
+                    db.session.close()
+
+    def _commit(self, batch):
+        connection = db.session.connection()
+        if connection.dialect.name == "sqlite":
+            # pysqlite does not BEGIN before a SAVEPOINT, and releasing the
+            # outermost savepoint would then commit it on its own
+            connection.exec_driver_sql("BEGIN")
+        outcomes = []
+        for write, future, on_commit in batch:
+            savepoint = db.session.begin_nested()
+            try:
+                result = write()
+            except Exception as error:
+                savepoint.rollback()
+                outcomes.append((future, None, error, None))
+                continue
+            if result[1] >= 400:
+                savepoint.rollback()
+                on_commit = None
+            else:
+                savepoint.commit()
+            outcomes.append((future, result, None, on_commit))
+        try:
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            if len(batch) > 1:
+                self._retry_one_by_one(batch)
+                return
+            outcomes = [(future, None, error, None) for future, *_ in outcomes]
+        for future, result, error, on_commit in outcomes:
+            if error is None:
+                if on_commit is not None:
+                    on_commit()
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _retry_one_by_one(self, batch):
+        """Commit each write of a failed batch on its own."""
+        for item in batch:
+            db.session.close()
+            try:
+                self._commit([item])
+            except Exception as error:
+                # Only this write fails; the rest still get their own try
+                db.session.rollback()
+                if not item[1].done():
+                    item[1].set_exception(error)
+
+
+def _init_group_commit(app):
+    if app.config["GROUP_COMMIT_ENABLED"]:
+        app.extensions["group_commit"] = _GroupCommitter(
+            app,
+            app.config["GROUP_COMMIT_WINDOW_MS"] / 1000,
+            app.config["GROUP_COMMIT_MAX_BATCH"],
+            app.config["GROUP_COMMIT_TIMEOUT"],
+        )
+
+
+def _commit_entry_write(user_id, write, failure_message):
+    """Run and commit an entry write, alone or batched with concurrent ones."""
+    committer = current_app.extensions.get("group_commit")
+    try:
+        if committer is not None:
+            # Give the connection of the request's earlier reads back to the
+            # pool, where the committer thread may be waiting for one
+            db.session.close()
+            # The committer bumps the version right after the commit, even
+            # once this request has stopped waiting
+            payload, status, headers = committer.submit(
+                write, functools.partial(_bump_user_data_version, user_id)
+            )
+            return jsonify(payload), status, headers
+        payload, status, headers = write()
+        if status < 400:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except _GroupCommitBusy:
+        response = jsonify({"error": "Server is busy, please retry"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+    except FutureTimeoutError:
+        return jsonify({"error": GROUP_COMMIT_UNKNOWN_ERROR}), 504
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": failure_message}), 500
+    if status < 400:
+        _bump_user_data_version(user_id)
+    return jsonify(payload), status, headers
+
+
+def _create_work_entries_blueprint():
+    """Create and configure the work entries blueprint."""
+    work_entries_bp = Blueprint("entries", __name__)
+
+    @work_entries_bp.route("/", methods=["GET"])
+    @jwt_required()
+    @_conditional_get(_work_entries_etag)
+    @_cached_per_user()
+    def get_work_entries():
+        listing = g.pop("_entries_listing", None)
+        if listing is not None:
+            return jsonify(_entries_listing_payload(*listing)), 200
+
+        current_user_id = get_jwt_identity()
+        plan, error = _plan_entries_listing(int(current_user_id), request.args)
+        if error:
+            return jsonify({"error": error}), 400
+
+        rows = db.session.execute(plan["rows"]).all()
+        total = db.session.scalar(plan["count"]) if plan["count"] is not None else None
+        return jsonify(_entries_listing_payload(plan, rows, total)), 200
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["GET"])
+    @jwt_required()
+    @_conditional_get(_work_entry_etag)
+    @_cached_per_user()
+    def get_work_entry(entry_id):
+        current_user_id = get_jwt_identity()
+        work_entry = WorkEntry.query.filter_by(
+            id=entry_id, user_id=int(current_user_id)
+        ).first()
+        if not work_entry:
+            return jsonify({"error": "Work entry not found"}), 404
+        return jsonify({"work_entry": work_entry.to_dict()}), 200
+
+    @work_entries_bp.route("/", methods=["POST"])
+    @jwt_required()
+    def create_work_entry():
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json()
+        return _commit_entry_write(
+            current_user_id,
+            lambda: _create_entry(current_user_id, data),
+            "Failed to create work entry",
+        )
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["PUT"])
+    @jwt_required()
+    def update_work_entry(entry_id):
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json()
+        if_match = request.if_match
+        return _commit_entry_write(
+            current_user_id,
+            lambda: _update_entry(current_user_id, entry_id, data, if_match),
+            "Failed to update work entry",
+        )
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["DELETE"])
+    @jwt_required()
+    def delete_work_entry(entry_id):
+        current_user_id = get_jwt_identity()
+        work_entry = WorkEntry.query.filter_by(
+            id=entry_id, user_id=int(current_user_id)
+        ).first()
+        if not work_entry:
+            return jsonify({"error": "Work entry not found"}), 404
+
+        try:
+            if not _claim_entry_version(work_entry, request.if_match):
+                db.session.rollback()
+                return jsonify({"error": PRECONDITION_FAILED_ERROR}), 412
+
+            db.session.delete(work_entry)
+            _apply_rollup_delta(
+                work_entry.user_id,
+                work_entry.date,
+                work_entry.hours,
+                work_entry.completed,
+                sign=-1,
+            )
+            db.session.commit()
+            _bump_user_data_version(int(current_user_id))
+            return jsonify({"message": "Work entry deleted successfully"}), 200
+        except Exception:
+            db.session.rollback()
+            return jsonify({"error": "Failed to delete work entry"}), 500
+
+    @work_entries_bp.route("/bulk", methods=["POST"])
+    @jwt_required()
+    def bulk_work_entries():
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json()
+        operations = data.get("operations") if isinstance(data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "Operations are required"}), 400
+
+        max_operations = current_app.config["BULK_MAX_OPERATIONS"]
+        if len(operations) > max_operations:
+            return (
+                jsonify({"error": f"At most {max_operations} operations per request"}),
+                413,
+            )
+
+        atomic = data.get("atomic", True)
+        if not isinstance(atomic, bool):
+            return jsonify({"error": "Atomic must be a boolean"}), 400
+
+        validated, existing, errors = _validate_bulk_operations(
+            current_user_id, operations
+        )
+        results = [
+            {"index": index, "op": op["op"] if op else None}
+            for index, op in enumerate(validated)
+        ]
+        failed = False
+        for result, error in zip(results, errors):
+            if error:
+                result.update({"status": "error", "error": error})
+                failed = True
+
+        if failed and atomic:
+            # Nothing is applied unless every operation is valid
+            for result in results:
+                result.setdefault("status", "skipped")
+            return jsonify({"applied": 0, "results": results}), 400
+
+        to_apply = [op for op, error in zip(validated, errors) if not error]
+        try:
+            created_ids, error = _apply_bulk_operations(
+                current_user_id, to_apply, existing
+            )
+            if error:
+                db.session.rollback()
+                return jsonify({"error": error}), 409
+            created_ids = iter(created_ids)
+            db.session.commit()
+            _bump_user_data_version(current_user_id)
+        except Exception:
+            db.session.rollback()
+            return jsonify({"error": "Failed to apply bulk operations"}), 500
+
+        for result, op, error in zip(results, validated, errors):
+            if error:
+                continue
+            if op["op"] == "create":
+                result.update({"status": "created", "id": next(created_ids)})
+            else:
+                result.update({"status": f"{op['op']}d", "id": op["id"]})
+        return jsonify({"applied": len(to_apply), "results": results}), 200
+
+    @work_entries_bp.route("/export", methods=["GET"])
+    @jwt_required()
+    def export_work_entries():
+        current_user_id = get_jwt_identity()
+        export_format = request.args.get("format", "csv")
+        if export_format not in ("csv", "ndjson"):
+            return jsonify({"error": "Format must be csv or ndjson"}), 400
+
+        query, error = _export_query(
+            int(current_user_id),
+            request.args.get("start_date"),
+            request.args.get("end_date"),
+        )
+        if error:
+            return jsonify({"error": error}), 400
+
+        if export_format == "csv":
+            generate, mimetype = _generate_csv_export, "text/csv"
+        else:
+            generate, mimetype = _generate_ndjson_export, "application/x-ndjson"
+        return current_app.response_class(
+            stream_with_context(generate(query)),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": (
+                    f"attachment; filename=work_entries.{export_format}"
+                )
+            },
+        )
+
+    @work_entries_bp.route("/import", methods=["POST"])
+    @jwt_required()
+    def import_work_entries():
+        current_user_id = get_jwt_identity()
+        upload = request.files.get("file")
+        upload_format = request.args.get("format")
+        if upload_format is None:
+            name = upload.filename if upload else ""
+            ndjson = name.endswith(".ndjson") or "ndjson" in request.mimetype
+            upload_format = "ndjson" if ndjson else "csv"
+        if upload_format not in ("csv", "ndjson"):
+            return jsonify({"error": "Format must be csv or ndjson"}), 400
+
+        stream = upload.stream if upload else request.stream
+        # COPY on PostgreSQL raises the driver's errors unwrapped
+        database_errors = (
+            SQLAlchemyError,
+            db.session.get_bind().dialect.loaded_dbapi.Error,
+        )
+        try:
+            report = _import_work_entries(
+                int(current_user_id),
+                _open_upload(stream, upload_format),
+                chunk_size=current_app.config["IMPORT_CHUNK_ROWS"],
+            )
+        except UnicodeDecodeError:
+            return jsonify({"error": "Upload must be UTF-8 encoded"}), 400
+        except csv.Error as error:
+            return jsonify({"error": f"Invalid CSV: {error}"}), 400
+        except database_errors:
+            return jsonify({"error": "Failed to import work entries"}), 500
+        return jsonify(report), 200
+
+    @work_entries_bp.route("/statistics", methods=["GET"])
+    @jwt_required()
+    @_conditional_get(_statistics_etag)
+    @_cached_per_user(vary_on_today=True)
+    def get_statistics():
+        current_user_id = get_jwt_identity()
+        stats = _get_statistics(int(current_user_id))
+        return jsonify(stats), 200
+
+    @work_entries_bp.route("/search", methods=["GET"])
+    @jwt_required()
+    def search_work_entries():
+        current_user_id = get_jwt_identity()
+        dialect_name = db.session.get_bind().dialect.name
+        plan, error = _plan_entries_search(
+            int(current_user_id), dialect_name, request.args
+        )
+        if error:
+            return jsonify({"error": error}), 400
+        rows = db.session.execute(plan["rows"]).all()
+        return jsonify(_entries_search_payload(plan, rows)), 200
+
+    @work_entries_bp.route("/statistics/series", methods=["GET"])
+    @jwt_required()
+    def get_statistics_series():
+        current_user_id = get_jwt_identity()
+        plan, error = _plan_statistics_series(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        return jsonify(_get_statistics_series(int(current_user_id), plan)), 200
+
+    return work_entries_bp
+
+
+def _create_rollups_cli():
+    """Create the `flask rollups` command group."""
+    rollups_cli = AppGroup("rollups", help="Maintain the daily_rollups table.")
+
+    @rollups_cli.command("rebuild")
+    @click.option("--user-id", type=int, help="Only rebuild this user's rollups.")
+    def rebuild(user_id):
+        """Recompute daily rollups from work_entries."""
+        count = _rebuild_rollups(user_id)
+        click.echo(f"Rebuilt {count} daily rollup rows")
+
+    @rollups_cli.command("verify")
+    @click.option("--user-id", type=int, help="Only verify this user's rollups.")
+    def verify(user_id):
+        """Report rollups that drifted from work_entries."""
+        drift = _find_rollup_drift(user_id)
+        for (drift_user_id, date_val), expected, stored in drift:
+            click.echo(
+                f"user {drift_user_id} {date_val.isoformat()}: "
+                f"expected {expected}, stored {stored}"
+            )
+        if drift:
+            raise click.ClickException(f"{len(drift)} daily rollup rows drifted")
+        click.echo("Daily rollups match work_entries")
+
+    return rollups_cli
+
+
+def _create_import_cli():
+    """Create the `flask import-entries` command."""
+
+    @click.command("import-entries")
+    @click.argument("path", type=click.File("rb"))
+    @click.option("--email", required=True, help="Owner of the imported entries.")
+    @click.option(
+        "--format",
+        "upload_format",
+        type=click.Choice(["csv", "ndjson"]),
+        help="Defaults to the file extension, then csv.",
+    )
+    @click.option("--chunk-size", type=int, help="Rows per insert/transaction.")
+    @with_appcontext
+    def import_entries(path, email, upload_format, chunk_size):
+        """Import work entries for a user from a CSV or NDJSON file."""
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.ClickException(f"No user with email {email}")
+        if upload_format is None:
+            upload_format = "ndjson" if path.name.endswith(".ndjson") else "csv"
+
+        started = time.perf_counter()
+
+        def progress(report):
+            elapsed = time.perf_counter() - started
+            click.echo(
+                f"{report['imported']} rows imported, "
+                f"{report['rejected_count']} rejected "
+                f"({report['imported'] / elapsed:.0f} rows/s)"
+            )
+
+        report = _import_work_entries(
+            user.id,
+            _open_upload(path, upload_format),
+            chunk_size=chunk_size or current_app.config["IMPORT_CHUNK_ROWS"],
+            progress=progress,
+        )
+        for rejection in report["rejected"]:
+            click.echo(f"line {rejection['line']}: {rejection['error']}", err=True)
+        if report["rejected_count"] > len(report["rejected"]):
+            click.echo(
+                f"... {report['rejected_count'] - len(report['rejected'])} more",
+                err=True,
+            )
+        click.echo(
+            f"Imported {report['imported']} rows in {report['elapsed_seconds']}s "
+            f"({report['rows_per_second']} rows/s), "
+            f"rejected {report['rejected_count']}"
+        )
+
+    return import_entries
+
+
+def _create_seed_cli():
+    """Create the `flask seed` command."""
+
+    @click.command("seed")
+    @click.option("--users", type=int, default=1000, show_default=True)
+    @click.option(
+        "--days", type=int, default=730, show_default=True, help="Days of history."
+    )
+    @click.option("--entries-per-day", type=float, default=1.5, show_default=True)
+    @click.option(
+        "--heavy-share",
+        type=float,
+        default=0.05,
+        show_default=True,
+        help="Share of users logging five times as much.",
+    )
+    @click.option(
+        "--spread",
+        type=float,
+        default=0.5,
+        show_default=True,
+        help="Per-user variation of the daily rate (0 = none).",
+    )
+    @click.option("--weekend-factor", type=float, default=0.3, show_default=True)
+    @click.option("--seed", type=int, default=0, show_default=True)
+    @click.option(
+        "--end-date",
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        help="Last day with entries; defaults to today. Fix it to reproduce data.",
+    )
+    @click.option("--email-prefix", default="seed-user", show_default=True)
+    @click.option("--password", default="password123", show_default=True)
+    @click.option("--chunk-size", type=int, default=50000, show_default=True)
+    @with_appcontext
+    def seed(
+        users,
+        days,
+        entries_per_day,
+        heavy_share,
+        spread,
+        weekend_factor,
+        seed,
+        end_date,
+        email_prefix,
+        password,
+        chunk_size,
+    ):
+        """Generate synthetic users and work entries for scale testing."""
+        started = time.perf_counter()
+
+        def progress(report):
+            elapsed = time.perf_counter() - started
+            click.echo(
+                f"{report['entries']} entries inserted "
+                f"({report['entries'] / elapsed:.0f} rows/s)"
+            )
+
+        try:
+            report = _seed_database(
+                users,
+                days,
+                entries_per_day=entries_per_day,
+                heavy_share=heavy_share,
+                spread=spread,
+                weekend_factor=weekend_factor,
+                seed=seed,
+                end_date=end_date.date() if end_date else None,
+                email_prefix=email_prefix,
+                password=password,
+                chunk_size=chunk_size,
+                progress=progress,
+            )
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        elapsed = time.perf_counter() - started
+        click.echo(
+            f"Seeded {report['users']} users and {report['entries']} entries "
+            f"in {elapsed:.1f}s ({report['entries'] / elapsed:.0f} rows/s)"
+        )
+
+    return seed
+
+
+def _explain(statement):
+    """Return the database's plan for a statement, one line per row."""
+    dialect = db.engine.dialect
+    sql = str(
+        statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    )
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    rows = db.session.execute(db.text(prefix + sql)).all()
+    if dialect.name == "sqlite":
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def _partition_pruning_plan(user_id, today):
+    """Plan of a listing page filtered to this month, and the partitions read."""
+    query, _ = _apply_date_filters(
+        db.select(WorkEntry).where(WorkEntry.user_id == user_id),
+        today.replace(day=1).isoformat(),
+        today.isoformat(),
+    )
+    lines = _explain(
+        query.order_by(WorkEntry.date.desc(), WorkEntry.id.desc()).limit(11)
+    )
+    scanned = set()
+    for line in lines:
+        scanned.update(re.findall(r" on (work_entries_\w+)", line))
+    return lines, scanned
+
+
+def _create_db_cli():
+    """Create the `flask db` command group."""
+    db_cli = AppGroup("db", help="Manage the database schema.")
+
+    @db_cli.command("upgrade")
+    @click.option("--target", type=int, help="Stop after this migration version.")
+    def upgrade(target):
+        """Apply pending schema migrations."""
+        count = migrations.upgrade(db.engine, target=target, log=click.echo)
+        click.echo(f"{count} migrations applied")
+        migrations.partitions.maintain(db.engine, log=click.echo)
+
+    @db_cli.command("status")
+    def status():
+        """List migrations and whether they are applied."""
+        for version, name, applied in migrations.status(db.engine):
+            click.echo(f"[{'x' if applied else ' '}] {version:04d}_{name}")
+
+    @db_cli.command("explain")
+    @click.option("--user-id", type=int, default=1, show_default=True)
+    def explain(user_id):
+        """Print query plans for the listing, search and statistics queries."""
+        today = datetime.now().date()
+        week_ago = today - timedelta(days=7)
+        entries = db.select(WorkEntry).where(WorkEntry.user_id == user_id)
+        newest_first = (WorkEntry.date.desc(), WorkEntry.id.desc())
+        queries = {
+            "entries page": entries.order_by(*newest_first).limit(11),
+            "entries cursor page": entries.where(
+                db.tuple_(WorkEntry.date, WorkEntry.id) < db.tuple_(today, 1000)
+            )
+            .order_by(*newest_first)
+            .limit(11),
+            "entries date range": entries.where(
+                WorkEntry.date >= week_ago, WorkEntry.date <= today
+            )
+            .order_by(*newest_first)
+            .limit(11),
+            "entries count": db.select(db.func.count(WorkEntry.id)).where(
+                WorkEntry.user_id == user_id
+            ),
+            "entries etag": db.select(WorkEntry.id, WorkEntry.updated_at)
+            .where(WorkEntry.user_id == user_id)
+            .order_by(*newest_first)
+            .limit(11),
+            "statistics": db.select(DailyRollup).where(
+                DailyRollup.user_id == user_id,
+                DailyRollup.date >= week_ago,
+                DailyRollup.date <= today,
+            ),
+            "statistics etag": db.select(
+                db.func.max(WorkEntry.updated_at), db.func.count(WorkEntry.id)
+            ).where(
+                WorkEntry.user_id == user_id,
+                WorkEntry.date >= week_ago,
+                WorkEntry.date <= today,
+            ),
+            "completed hours": db.select(db.func.sum(WorkEntry.hours)).where(
+                WorkEntry.user_id == user_id,
+                WorkEntry.date >= week_ago,
+                WorkEntry.completed.is_(True),
+            ),
+        }
+        dialect_name = db.engine.dialect.name
+        for sort in ("rank", "date"):
+            plan, _ = _plan_entries_search(
+                user_id, dialect_name, {"q": "ticket", "sort": sort}
+            )
+            queries[f"search by {sort}"] = plan["rows"]
+        for name, statement in queries.items():
+            click.echo(f"-- {name}")
+            for line in _explain(statement):
+                click.echo(f"   {line}")
+
+    @db_cli.command("partitions")
+    @click.option(
+        "--ahead", type=int, help="Partitions to create past the current one."
+    )
+    @click.option("--verify", is_flag=True, help="Check that date filters prune.")
+    @click.option("--user-id", type=int, default=1, show_default=True)
+    def partitions(ahead, verify, user_id):
+        """Create upcoming work_entries partitions; run daily or monthly."""
+        created = migrations.partitions.maintain(db.engine, ahead=ahead, log=click.echo)
+        if created is None:
+            click.echo("work_entries is not partitioned")
+            return
+        with db.engine.connect() as conn:
+            names = migrations.partitions.partition_names(conn)
+        click.echo(f"{len(names)} partitions: {', '.join(names)}")
+        if not verify:
+            return
+        lines, scanned = _partition_pruning_plan(user_id, datetime.now().date())
+        for line in lines:
+            click.echo(f"   {line}")
+        click.echo(f"Scanned {len(scanned)} of {len(names)} partitions")
+        if len(scanned) >= len(names):
+            raise click.ClickException("The date filters did not prune partitions")
+
+    return db_cli
+
+
+# Read replicas
+REPLICA_PIN_HEADER = "X-Read-Primary-Until"
+REPLICA_BLUEPRINTS = ("auth", "entries")
+
+
+def _replica_urls(urls):
+    """Replica URLs from a list or a comma-separated string."""
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(",")]
+    return [url for url in urls if url]
+
+
+def _reads_replica():
+    """Whether this request reads from a replica, which may lag the primary.
+
+    Data versions move when the primary commits, so nothing read from a
+    replica may be cached or tagged under the current version.
+    """
+    return has_request_context() and g.get("_db_replica") is not None
+
+
+def _pinned_to_primary(window):
+    """Whether the request carries a pin from a write in the last window."""
+    try:
+        until = float(request.headers.get(REPLICA_PIN_HEADER, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    # A pin further out than one window was not handed out by this API
+    return now < until <= now + window
+
+
+def _init_replicas(app):
+    """Send reads of the auth and entries APIs to replicas, writers' to the primary.
+
+    A successful write answers with a pin header; clients send it back on
+    later requests, which read from the primary until it expires.
+    """
+    urls = _replica_urls(app.config["SQLALCHEMY_REPLICA_URIS"])
+    if not urls:
+        return
+    # Engines of our own: a bind key would stay in db.metadatas for every app
+    replicas = [
+        create_engine(
+            url, **_engine_options({**app.config, "SQLALCHEMY_DATABASE_URI": url})
+        )
+        for url in urls
+    ]
+    app.extensions["db_replicas"] = replicas
+    window = app.config["REPLICA_PIN_SECONDS"]
+
+    @app.before_request
+    def choose_replica():
+        if request.blueprint not in REPLICA_BLUEPRINTS:
+            return
+        if request.method in ("GET", "HEAD") and not _pinned_to_primary(window):
+            g._db_replica = random.choice(replicas)
+
+    @app.after_request
+    def pin_writer_to_primary(response):
+        if (
+            request.blueprint in REPLICA_BLUEPRINTS
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and response.status_code < 400
+        ):
+            response.headers[REPLICA_PIN_HEADER] = f"{time.time() + window:.3f}"
+        return response
+
+
+def _engine_options(config):
+    """Build SQLAlchemy engine options from the DB_POOL_* settings."""
+    if config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # SQLite gets Flask-SQLAlchemy's defaults; sizing knobs do not apply
+        return {}
+    if config["DB_POOL_PROFILE"] == "pgbouncer":
+        # PgBouncer in transaction mode does the pooling; holding our own
+        # server connections would pin them and defeat it
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+
+def _pool_status(engine):
+    """Connection counts for the engine's pool."""
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            }
+        )
+    return status
+
+
+def _ping_database():
+    """Run SELECT 1 and return (ok, elapsed milliseconds)."""
+    started = time.perf_counter()
+    try:
+        db.session.execute(db.text("SELECT 1"))
+        ok = True
+    except Exception:
+        db.session.rollback()
+        ok = False
+    return ok, round((time.perf_counter() - started) * 1000, 2)
+
+
+def _env_flag(name, default="false"):
+    """Read a true/false environment variable."""
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+# Frontend dev servers allowed to call the API
+CORS_ORIGINS = [
+    "http://localhost:5173",
+    "http://127.0.0.1:5173",
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+]
+
+
+def _apply_config_defaults(config):
+    """Fill in settings from the environment; values already set win."""
+    # Flask starts with SECRET_KEY = None, so only a real value counts as set
+    config["SECRET_KEY"] = config.get("SECRET_KEY") or os.getenv(
+        "SECRET_KEY", "dev-secret-key"
+    )
+    config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
+    config.setdefault("JWT_SECRET_KEY", os.getenv("JWT_SECRET_KEY", "jwt-secret-key"))
+
+    config.setdefault("JSON_PROVIDER", os.getenv("JSON_PROVIDER", "auto"))
+
+    # Connection pool; profile "pgbouncer" leaves pooling to PgBouncer
+    config.setdefault("DB_POOL_PROFILE", os.getenv("DB_POOL_PROFILE", "default"))
+    config.setdefault("DB_POOL_SIZE", int(os.getenv("DB_POOL_SIZE", 5)))
+    config.setdefault("DB_MAX_OVERFLOW", int(os.getenv("DB_MAX_OVERFLOW", 10)))
+    config.setdefault("DB_POOL_TIMEOUT", int(os.getenv("DB_POOL_TIMEOUT", 30)))
+    config.setdefault("DB_POOL_RECYCLE", int(os.getenv("DB_POOL_RECYCLE", 1800)))
+    config.setdefault("DB_POOL_PRE_PING", _env_flag("DB_POOL_PRE_PING", "true"))
+    config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", _engine_options(config))
+
+    # Read replicas, and how long a writer's reads stay on the primary
+    config.setdefault("SQLALCHEMY_REPLICA_URIS", os.getenv("DATABASE_REPLICA_URLS", ""))
+    config.setdefault(
+        "REPLICA_PIN_SECONDS", float(os.getenv("REPLICA_PIN_SECONDS", 10))
+    )
+
+    config.setdefault("BULK_MAX_OPERATIONS", int(os.getenv("BULK_MAX_OPERATIONS", 500)))
+
+    config.setdefault("IMPORT_CHUNK_ROWS", int(os.getenv("IMPORT_CHUNK_ROWS", 5000)))
+
+    # Identity cache for authenticated requests
+    config.setdefault(
+        "IDENTITY_CACHE_MAX_ENTRIES", int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 4096))
+    )
+    config.setdefault("IDENTITY_CACHE_TTL", int(os.getenv("IDENTITY_CACHE_TTL", 60)))
+    config.setdefault("JWT_IDENTITY_CLAIMS", _env_flag("JWT_IDENTITY_CLAIMS", "false"))
+
+    # Password hashing scheme and how much of it may run at once
+    config.setdefault(
+        "PASSWORD_HASH_METHOD",
+        os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"),
+    )
+    config.setdefault(
+        "PASSWORD_HASH_WORKERS", int(os.getenv("PASSWORD_HASH_WORKERS", 0))
+    )
+    config.setdefault(
+        "PASSWORD_HASH_MAX_CONCURRENCY",
+        int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", 0)) or None,
+    )
+    config.setdefault(
+        "PASSWORD_HASH_QUEUE_TIMEOUT",
+        float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 10)),
+    )
+
+    # Per-user response cache for the entries GET endpoints
+    config.setdefault(
+        "RESPONSE_CACHE_ENABLED", _env_flag("RESPONSE_CACHE_ENABLED", "false")
+    )
+    config.setdefault(
+        "RESPONSE_CACHE_BACKEND", os.getenv("RESPONSE_CACHE_BACKEND", "sqlite")
+    )
+    config.setdefault("RESPONSE_CACHE_PATH", os.getenv("RESPONSE_CACHE_PATH"))
+    config.setdefault(
+        "RESPONSE_CACHE_MAX_ENTRIES", int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+    )
+    config.setdefault("RESPONSE_CACHE_TTL", int(os.getenv("RESPONSE_CACHE_TTL", 300)))
+
+    # Negotiated Content-Encoding for JSON, CSV and NDJSON responses
+    config.setdefault("COMPRESSION_ENABLED", _env_flag("COMPRESSION_ENABLED", "true"))
+    config.setdefault(
+        "COMPRESSION_ENCODINGS", os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+    )
+    config.setdefault(
+        "COMPRESSION_MIN_SIZE", int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+    )
+    config.setdefault("COMPRESSION_LEVEL", int(os.getenv("COMPRESSION_LEVEL", 6)))
+
+    # Opt-in per-request query counts, Server-Timing and slow-query log
+    config.setdefault(
+        "INSTRUMENTATION_ENABLED", _env_flag("INSTRUMENTATION_ENABLED", "false")
+    )
+    config.setdefault("SLOW_QUERY_MS", float(os.getenv("SLOW_QUERY_MS", 100)))
+    config.setdefault(
+        "SLOW_QUERY_LOG_PARAMETERS", _env_flag("SLOW_QUERY_LOG_PARAMETERS", "false")
+    )
+    config.setdefault(
+        "N_PLUS_ONE_THRESHOLD", int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+    )
+
+    # Prometheus /metrics; with a directory, gunicorn workers share them
+    config.setdefault("METRICS_ENABLED", _env_flag("METRICS_ENABLED", "false"))
+    config.setdefault(
+        "METRICS_MULTIPROC_DIR",
+        os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR"),
+    )
+
+    # Opt-in profiling of single requests and of a 1-in-N request sample
+    config.setdefault("PROFILING_ENABLED", _env_flag("PROFILING_ENABLED", "false"))
+    config.setdefault("PROFILING_SECRET", os.getenv("PROFILING_SECRET"))
+    config.setdefault("PROFILE_SAMPLE_RATE", int(os.getenv("PROFILE_SAMPLE_RATE", 0)))
+    config.setdefault(
+        "PROFILE_SAMPLE_INTERVAL_MS", float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 1))
+    )
+    config.setdefault("PROFILE_MAX_STACKS", int(os.getenv("PROFILE_MAX_STACKS", 1000)))
+
+    # Permanent cache of past statistics series buckets: none, memory or sqlite
+    config.setdefault(
+        "STATISTICS_CACHE_BACKEND", os.getenv("STATISTICS_CACHE_BACKEND", "none")
+    )
+    config.setdefault("STATISTICS_CACHE_PATH", os.getenv("STATISTICS_CACHE_PATH"))
+    config.setdefault(
+        "STATISTICS_CACHE_MAX_ENTRIES",
+        int(os.getenv("STATISTICS_CACHE_MAX_ENTRIES", 10000)),
+    )
+    config.setdefault(
+        "STATISTICS_SERIES_MAX_BUCKETS",
+        int(os.getenv("STATISTICS_SERIES_MAX_BUCKETS", 366)),
+    )
+
+    # Opt-in load shedding: per-class concurrency, queue budgets, rate limits
+    config.setdefault("ADMISSION_ENABLED", _env_flag("ADMISSION_ENABLED", "false"))
+    config.setdefault(
+        "ADMISSION_CONCURRENCY",
+        os.getenv("ADMISSION_CONCURRENCY", "read=32,write=16,auth=4"),
+    )
+    config.setdefault(
+        "ADMISSION_MAX_CONCURRENCY", int(os.getenv("ADMISSION_MAX_CONCURRENCY", 32))
+    )
+    config.setdefault(
+        "ADMISSION_QUEUE_BUDGET_MS",
+        os.getenv("ADMISSION_QUEUE_BUDGET_MS", "read=2000,write=1000,auth=250"),
+    )
+    config.setdefault(
+        "ADMISSION_RATE_LIMITS", os.getenv("ADMISSION_RATE_LIMITS", "auth=20/60")
+    )
+    config.setdefault("ADMISSION_STORE", os.getenv("ADMISSION_STORE", "memory"))
+    config.setdefault("ADMISSION_STORE_PATH", os.getenv("ADMISSION_STORE_PATH"))
+
+    # Opt-in group commit of concurrent entry creates and updates
+    config.setdefault(
+        "GROUP_COMMIT_ENABLED", _env_flag("GROUP_COMMIT_ENABLED", "false")
+    )
+    config.setdefault(
+        "GROUP_COMMIT_WINDOW_MS", float(os.getenv("GROUP_COMMIT_WINDOW_MS", 2))
+    )
+    config.setdefault(
+        "GROUP_COMMIT_MAX_BATCH", int(os.getenv("GROUP_COMMIT_MAX_BATCH", 64))
+    )
+    config.setdefault(
+        "GROUP_COMMIT_TIMEOUT", float(os.getenv("GROUP_COMMIT_TIMEOUT", 30))
+    )
+
+
+def create_app(test_config=None):
+    app = Flask(__name__)
+
+    # Use test config if passed in (for tests)
+    if test_config:
+        app.config.update(test_config)
+    else:
+        # Use DATABASE_URL from environment, fallback to SQLite for local/dev
+        app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+            "DATABASE_URL", "sqlite:///instance/app.db"
+        )
+
+    _apply_config_defaults(app.config)
+    app.json = _json_provider_class(app.config["JSON_PROVIDER"])(app)
+
+    db.init_app(app)
+    jwt.init_app(app)
+
+    # Create instance dir if needed
+    try:
         os.makedirs(app.instance_path, exist_ok=True)
     except Exception:
         pass
 
+    app.extensions["password_hasher"] = _PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_concurrency=app.config["PASSWORD_HASH_MAX_CONCURRENCY"],
+        queue_timeout=app.config["PASSWORD_HASH_QUEUE_TIMEOUT"],
+    )
+    app.extensions["identity_cache"] = _LRUCache(
+        max_entries=app.config["IDENTITY_CACHE_MAX_ENTRIES"],
+        ttl=app.config["IDENTITY_CACHE_TTL"],
+    )
+    _init_replicas(app)
+    _init_response_cache(app)
+    _init_series_cache(app)
+    _init_compression(app)
+    _init_instrumentation(app)
+    if app.config["METRICS_ENABLED"]:
+        _init_metrics(app)
+    _init_admission(app)
+    _init_profiling(app)
+    _init_group_commit(app)
+
+    @app.errorhandler(_PasswordHasherBusy)
+    def password_hasher_busy(error):
+        response = jsonify({"error": "Server is busy, please retry"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
     # Robust Flask-CORS only setup (no manual preflight handler)
-    origins = [
-        "http://localhost:5173",
-        "http://127.0.0.1:5173",
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-    ]
     CORS(
         app,
-        origins=origins,
+        origins=CORS_ORIGINS,
         supports_credentials=True,
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["Content-Type", "Authorization"],
+        allow_headers=["Content-Type", "Authorization", REPLICA_PIN_HEADER],
+        expose_headers=[REPLICA_PIN_HEADER],
         max_age=86400,
     )
 
@@ -511,16 +4551,45 @@ def create_app(test_config=None):
     app.register_blueprint(_create_auth_blueprint(), url_prefix="/api/auth")
     app.register_blueprint(_create_work_entries_blueprint(), url_prefix="/api/entries")
 
+    app.cli.add_command(_create_db_cli())
+    app.cli.add_command(_create_rollups_cli())
+    app.cli.add_command(_create_import_cli())
+    app.cli.add_command(_create_seed_cli())
+
+    # Liveness: the process is up and serving requests
+    @app.route("/livez", methods=["GET"])
+    def livez():
+        return jsonify({"status": "ok"}), 200
+
+    # Readiness: the database answers and the pool has connections to give
+    @app.route("/readyz", methods=["GET"])
+    def readyz():
+        db_ok, latency_ms = _ping_database()
+        payload = {
+            "status": "ok" if db_ok else "error",
+            "db": {"status": "ok" if db_ok else "error", "latency_ms": latency_ms},
+            "pool": _pool_status(db.engine),
+        }
+        return jsonify(payload), 200 if db_ok else 503
+
+    # Prometheus scrape target, summed over every worker process
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        if "metrics" not in app.extensions:
+            return jsonify({"error": "Metrics are disabled"}), 404
+        return app.response_class(
+            app.extensions["metrics"].render(), mimetype="text/plain; version=0.0.4"
+        )
+
     # Health check endpoint
     @app.route("/health", methods=["GET"])
     def health():
-        try:
-            # Try a simple DB query
-            db.session.execute("SELECT 1")
-            db_status = "ok"
-        except Exception:
-            db_status = "error"
-        return jsonify({"status": "ok", "db": db_status}), 200
+        db_ok, _ = _ping_database()
+        payload = {"status": "ok", "db": "ok" if db_ok else "error"}
+        cache = app.extensions.get("response_cache")
+        if cache is not None:
+            payload["cache"] = cache.stats()
+        return jsonify(payload), 200
 
     # Bloomteq Easter Egg
     @app.route("/bloom")
@@ -530,13 +4599,11 @@ def create_app(test_config=None):
             200,
         )
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-
     return app
 
 
 if __name__ == "__main__":
     app = create_app()
+    with app.app_context():
+        migrations.upgrade(db.engine)
     app.run(debug=True)
@@ -0,0 +1,557 @@
+"""
+ASGI deployment of the auth and entries APIs on SQLAlchemy's asyncio extension.
+
+Serve it with:  hypercorn "asgi:create_asgi_app()"
+
+Models, validation and query building come from app.py, so both modes return
+the same JSON. The endpoints in FLASK_ONLY_ENDPOINTS and the CLI stay on the
+Flask app, and so do conditional GETs (ETag and If-None-Match), response cache
+lookups, compression, replica routing, group commit, admission control,
+metrics and instrumentation. If-Match on PUT and DELETE is supported, and with
+the response cache enabled writes bump the user's data version in its store.
+"""
+
+import asyncio
+import functools
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from dotenv import load_dotenv
+from quart import Blueprint, Quart, current_app, g, jsonify, request
+from quart_cors import cors
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.http import quote_etag
+
+from app import (
+    CORS_ORIGINS,
+    PRECONDITION_FAILED_ERROR,
+    User,
+    WorkEntry,
+    _apply_config_defaults,
+    _apply_entry_changes,
+    _claim_statement,
+    _entries_listing_payload,
+    _entry_etag,
+    _etag_matches,
+    _identity_claims,
+    _init_response_cache,
+    _init_series_cache,
+    _json_provider_class,
+    _LRUCache,
+    _mark_statistics_dirty,
+    _merge_rollup_deltas,
+    _new_work_entry,
+    _PasswordHasher,
+    _PasswordHasherBusy,
+    _plan_entries_listing,
+    _rollup_cleanup,
+    _rollup_delta,
+    _rollup_upsert,
+    _statistics_query,
+    _summarize_statistics,
+    _UserIdentity,
+    _validate_auth_data,
+)
+
+load_dotenv()
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+# Endpoints of the Flask app that have no counterpart here
+FLASK_ONLY_ENDPOINTS = frozenset(
+    {
+        "entries.bulk_work_entries",
+        "entries.export_work_entries",
+        "entries.import_work_entries",
+        "entries.search_work_entries",
+        "entries.get_statistics_series",
+        "health",
+        "metrics",
+        "bloomteq_easter_egg",
+    }
+)
+
+
+def _async_database_url(uri, instance_path):
+    """Point a DATABASE_URL at the asyncio driver for its backend."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"The ASGI app does not support {backend} databases")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if (
+        backend == "sqlite"
+        and url.database
+        and url.database != ":memory:"
+        and not os.path.isabs(url.database)
+    ):
+        # Relative SQLite paths live in the instance folder, as in Flask-SQLAlchemy
+        url = url.set(database=os.path.join(instance_path, url.database))
+    return url
+
+
+def _session():
+    """A new async session on the current app's engine."""
+    return current_app.extensions["async_session"]()
+
+
+async def _run_blocking(func, *args):
+    """Run CPU-bound or blocking work off the event loop."""
+    return await asyncio.to_thread(func, *args)
+
+
+# Tokens, interchangeable with the ones Flask-JWT-Extended issues
+def _create_access_token(user):
+    """Encode an access token with the same claims as create_access_token."""
+    config = current_app.config
+    now = datetime.now(timezone.utc)
+    claims = {
+        "fresh": False,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "type": "access",
+        config["JWT_IDENTITY_CLAIM"]: str(user.id),
+        "nbf": now,
+        "exp": now + timedelta(hours=24),
+        **(_identity_claims(user, config) or {}),
+    }
+    return jwt.encode(
+        claims, config["JWT_SECRET_KEY"], algorithm=config["JWT_ALGORITHM"]
+    )
+
+
+async def _load_user_identity(claims):
+    """Resolve the token's user from its claims, the cache or the database."""
+    config = current_app.config
+    user_id = int(claims[config["JWT_IDENTITY_CLAIM"]])
+    if config["JWT_IDENTITY_CLAIMS"] and "email" in claims:
+        return _UserIdentity(user_id, claims["email"], claims.get("created_at"))
+
+    cache = current_app.extensions["identity_cache"]
+    identity = cache.get(user_id)
+    if identity is None:
+        async with _session() as session:
+            user = await session.get(User, user_id)
+        if user is None:
+            return None
+        identity = _UserIdentity.from_user(user)
+        cache.set(user_id, identity)
+    return identity
+
+
+def _jwt_required(view):
+    """Require a valid access token and put its user id in g.current_user_id."""
+
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        config = current_app.config
+        header = request.headers.get("Authorization")
+        if not header:
+            return jsonify({"msg": "Missing Authorization Header"}), 401
+        scheme, _, token = header.partition(" ")
+        if scheme != "Bearer" or not token:
+            return (
+                jsonify(
+                    {
+                        "msg": "Missing 'Bearer' type in 'Authorization' header. "
+                        "Expected 'Authorization: Bearer <JWT>'"
+                    }
+                ),
+                401,
+            )
+        try:
+            claims = jwt.decode(
+                token,
+                config["JWT_SECRET_KEY"],
+                algorithms=[config["JWT_ALGORITHM"]],
+                options={"require": ["exp", config["JWT_IDENTITY_CLAIM"]]},
+            )
+        except jwt.ExpiredSignatureError:
+            return jsonify({"msg": "Token has expired"}), 401
+        except jwt.InvalidTokenError as error:
+            return jsonify({"msg": str(error)}), 422
+        if claims.get("type") != "access":
+            return jsonify({"msg": "Only non-refresh tokens are allowed"}), 422
+
+        # The user itself is only loaded by the views that need it
+        g.jwt_claims = claims
+        g.current_user_id = int(claims[config["JWT_IDENTITY_CLAIM"]])
+        return await view(*args, **kwargs)
+
+    return wrapper
+
+
+async def _apply_rollup_deltas(session, user_id, deltas):
+    """Apply rollup changes in the session's transaction, merged per day."""
+    rows = _merge_rollup_deltas(user_id, deltas)
+    if not rows:
+        return
+    await session.execute(_rollup_upsert(session.bind.dialect.name), rows)
+    _mark_statistics_dirty(
+        session.sync_session,
+        current_app.extensions.get("series_cache"),
+        user_id,
+        [row["date"] for row in rows],
+    )
+    cleanup = _rollup_cleanup(user_id, rows)
+    if cleanup is not None:
+        await session.execute(cleanup)
+
+
+async def _claim_entry_version(session, work_entry):
+    """Check If-Match against an entry and claim its current version."""
+    if not request.if_match:
+        return True
+    if not _etag_matches(
+        request.if_match, _entry_etag(work_entry.id, work_entry.updated_at)
+    ):
+        return False
+
+    claimed_at = datetime.utcnow()
+    result = await session.execute(_claim_statement(work_entry, claimed_at))
+    if not result.rowcount:
+        return False
+    work_entry.updated_at = claimed_at
+    return True
+
+
+async def _get_user_entry(session, entry_id):
+    """The current user's work entry with this id, or None."""
+    return await session.scalar(
+        select(WorkEntry).filter_by(id=entry_id, user_id=g.current_user_id)
+    )
+
+
+async def _bump_user_data_version(user_id):
+    """Invalidate the user's cached responses, which the Flask app may serve."""
+    cache = current_app.extensions.get("response_cache")
+    if cache is not None:
+        await _run_blocking(cache.bump_version, user_id)
+
+
+def _create_auth_blueprint():
+    """Create and configure the async auth blueprint."""
+    auth_bp = Blueprint("auth", __name__)
+
+    @auth_bp.route("/register", methods=["POST"])
+    async def register():
+        data = await request.get_json()
+        is_valid, error_msg = _validate_auth_data(data)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 400
+
+        hasher = current_app.extensions["password_hasher"]
+        async with _session() as session:
+            existing = await session.scalar(select(User).filter_by(email=data["email"]))
+            if existing:
+                return jsonify({"error": "User with this email already exists"}), 409
+
+            user = User(email=data["email"])
+            user.password_hash = await _run_blocking(hasher.hash, data["password"])
+            try:
+                session.add(user)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                return jsonify({"error": "Registration failed"}), 500
+
+        return (
+            jsonify(
+                {
+                    "message": "User registered successfully",
+                    "access_token": _create_access_token(user),
+                    "user": user.to_dict(),
+                }
+            ),
+            201,
+        )
+
+    @auth_bp.route("/login", methods=["POST"])
+    async def login():
+        data = await request.get_json()
+        is_valid, error_msg = _validate_auth_data(data)
+        if not is_valid:
+            return jsonify({"error": error_msg}), 400
+
+        hasher = current_app.extensions["password_hasher"]
+        async with _session() as session:
+            user = await session.scalar(select(User).filter_by(email=data["email"]))
+            if not user or not await _run_blocking(
+                hasher.verify, user.password_hash, data["password"]
+            ):
+                return jsonify({"error": "Invalid email or password"}), 401
+
+            if hasher.needs_rehash(user.password_hash):
+                # Upgrade the stored hash to the configured scheme
+                user.password_hash = await _run_blocking(hasher.hash, data["password"])
+                try:
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+
+        return (
+            jsonify(
+                {
+                    "message": "Login successful",
+                    "access_token": _create_access_token(user),
+                    "user": user.to_dict(),
+                }
+            ),
+            200,
+        )
+
+    @auth_bp.route("/profile", methods=["GET"])
+    @_jwt_required
+    async def profile():
+        identity = await _load_user_identity(g.jwt_claims)
+        if identity is None:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify({"user": identity.to_dict()}), 200
+
+    return auth_bp
+
+
+def _create_work_entries_blueprint():
+    """Create and configure the async work entries blueprint."""
+    work_entries_bp = Blueprint("entries", __name__)
+
+    @work_entries_bp.route("/", methods=["GET"])
+    @_jwt_required
+    async def get_work_entries():
+        plan, error = _plan_entries_listing(g.current_user_id, request.args)
+        if error:
+            return jsonify({"error": error}), 400
+
+        async with _session() as session:
+            rows = (await session.execute(plan["rows"])).all()
+            total = (
+                await session.scalar(plan["count"])
+                if plan["count"] is not None
+                else None
+            )
+        return jsonify(_entries_listing_payload(plan, rows, total)), 200
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["GET"])
+    @_jwt_required
+    async def get_work_entry(entry_id):
+        async with _session() as session:
+            work_entry = await _get_user_entry(session, entry_id)
+        if not work_entry:
+            return jsonify({"error": "Work entry not found"}), 404
+        return jsonify({"work_entry": work_entry.to_dict()}), 200
+
+    @work_entries_bp.route("/", methods=["POST"])
+    @_jwt_required
+    async def create_work_entry():
+        work_entry, error = _new_work_entry(g.current_user_id, await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+
+        async with _session() as session:
+            try:
+                session.add(work_entry)
+                await _apply_rollup_deltas(
+                    session,
+                    work_entry.user_id,
+                    [
+                        _rollup_delta(
+                            work_entry.date, work_entry.hours, work_entry.completed
+                        )
+                    ],
+                )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                return jsonify({"error": "Failed to create work entry"}), 500
+        await _bump_user_data_version(work_entry.user_id)
+
+        return (
+            jsonify(
+                {
+                    "message": "Work entry created successfully",
+                    "work_entry": work_entry.to_dict(),
+                }
+            ),
+            201,
+            {"ETag": quote_etag(_entry_etag(work_entry.id, work_entry.updated_at))},
+        )
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["PUT"])
+    @_jwt_required
+    async def update_work_entry(entry_id):
+        data = await request.get_json()
+        async with _session() as session:
+            work_entry = await _get_user_entry(session, entry_id)
+            if not work_entry:
+                return jsonify({"error": "Work entry not found"}), 404
+
+            if not data:
+                return jsonify({"error": "No data provided"}), 400
+
+            old_rollup_key = (work_entry.date, work_entry.hours, work_entry.completed)
+            try:
+                if not await _claim_entry_version(session, work_entry):
+                    await session.rollback()
+                    return jsonify({"error": PRECONDITION_FAILED_ERROR}), 412
+
+                error = _apply_entry_changes(work_entry, data)
+                if error:
+                    await session.rollback()
+                    return jsonify({"error": error}), 400
+
+                new_rollup_key = (
+                    work_entry.date,
+                    work_entry.hours,
+                    work_entry.completed,
+                )
+                if new_rollup_key != old_rollup_key:
+                    # Moves the entry between days and/or completed buckets
+                    await _apply_rollup_deltas(
+                        session,
+                        work_entry.user_id,
+                        [
+                            _rollup_delta(*old_rollup_key, sign=-1),
+                            _rollup_delta(*new_rollup_key),
+                        ],
+                    )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                return jsonify({"error": "Failed to update work entry"}), 500
+        await _bump_user_data_version(work_entry.user_id)
+
+        return (
+            jsonify(
+                {
+                    "message": "Work entry updated successfully",
+                    "work_entry": work_entry.to_dict(),
+                }
+            ),
+            200,
+            {"ETag": quote_etag(_entry_etag(work_entry.id, work_entry.updated_at))},
+        )
+
+    @work_entries_bp.route("/<int:entry_id>", methods=["DELETE"])
+    @_jwt_required
+    async def delete_work_entry(entry_id):
+        async with _session() as session:
+            work_entry = await _get_user_entry(session, entry_id)
+            if not work_entry:
+                return jsonify({"error": "Work entry not found"}), 404
+
+            try:
+                if not await _claim_entry_version(session, work_entry):
+                    await session.rollback()
+                    return jsonify({"error": PRECONDITION_FAILED_ERROR}), 412
+
+                await session.execute(
+                    delete(WorkEntry).where(WorkEntry.id == work_entry.id)
+                )
+                await _apply_rollup_deltas(
+                    session,
+                    work_entry.user_id,
+                    [
+                        _rollup_delta(
+                            work_entry.date,
+                            work_entry.hours,
+                            work_entry.completed,
+                            sign=-1,
+                        )
+                    ],
+                )
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                return jsonify({"error": "Failed to delete work entry"}), 500
+        await _bump_user_data_version(work_entry.user_id)
+
+        return jsonify({"message": "Work entry deleted successfully"}), 200
+
+    @work_entries_bp.route("/statistics", methods=["GET"])
+    @_jwt_required
+    async def get_statistics():
+        today = datetime.now().date()
+        async with _session() as session:
+            rollups = (
+                await session.scalars(_statistics_query(g.current_user_id, today))
+            ).all()
+        return jsonify(_summarize_statistics(rollups, today)), 200
+
+    return work_entries_bp
+
+
+def create_asgi_app(test_config=None):
+    app = Quart(__name__)
+
+    if test_config:
+        app.config.update(test_config)
+    else:
+        app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+            "DATABASE_URL", "sqlite:///instance/app.db"
+        )
+
+    _apply_config_defaults(app.config)
+    app.config.setdefault("JWT_ALGORITHM", "HS256")
+    app.config.setdefault("JWT_IDENTITY_CLAIM", "sub")
+    app.json = _json_provider_class(app.config["JSON_PROVIDER"])(app)
+
+    engine = create_async_engine(
+        _async_database_url(app.config["SQLALCHEMY_DATABASE_URI"], app.instance_path),
+        **app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+    )
+    app.extensions["async_engine"] = engine
+    app.extensions["async_session"] = async_sessionmaker(engine, expire_on_commit=False)
+    app.extensions["password_hasher"] = _PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_concurrency=app.config["PASSWORD_HASH_MAX_CONCURRENCY"],
+        queue_timeout=app.config["PASSWORD_HASH_QUEUE_TIMEOUT"],
+    )
+    app.extensions["identity_cache"] = _LRUCache(
+        max_entries=app.config["IDENTITY_CACHE_MAX_ENTRIES"],
+        ttl=app.config["IDENTITY_CACHE_TTL"],
+    )
+    _init_response_cache(app)
+    _init_series_cache(app)
+
+    @app.after_serving
+    async def dispose_engine():
+        await engine.dispose()
+
+    @app.errorhandler(_PasswordHasherBusy)
+    async def password_hasher_busy(error):
+        response = jsonify({"error": "Server is busy, please retry"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
+    app = cors(
+        app,
+        allow_origin=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+        max_age=86400,
+    )
+
+    app.register_blueprint(_create_auth_blueprint(), url_prefix="/api/auth")
+    app.register_blueprint(_create_work_entries_blueprint(), url_prefix="/api/entries")
+
+    @app.route("/livez", methods=["GET"])
+    async def livez():
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/readyz", methods=["GET"])
+    async def readyz():
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            db_ok = True
+        except Exception:
+            db_ok = False
+        return jsonify({"status": "ok" if db_ok else "error"}), 200 if db_ok else 503
+
+    return app
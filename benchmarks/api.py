@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the API endpoints, with JSON results and baseline checks
+Run from the repository root: python -m benchmarks.api --output results.json
+
+Seeds users x entries per user, then drives each endpoint from concurrent
+clients through the app in-process and reports throughput, p50/p95/p99
+latency and SQL statements per request. With --baseline it exits non-zero
+when an endpoint got slower than the threshold allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+import migrations
+from app import _seed_database, _seed_email, create_app, db
+
+EMAIL_PREFIX = "bench-user"
+PASSWORD = "password123"
+
+
+def seed(app, users, entries_per_user, rng_seed=0):
+    """Seed one entry per day for every bench user, unless already seeded."""
+    with app.app_context():
+        try:
+            _seed_database(
+                users,
+                entries_per_user,
+                entries_per_day=1,
+                heavy_share=0,
+                spread=0,
+                weekend_factor=1,
+                seed=rng_seed,
+                email_prefix=EMAIL_PREFIX,
+                password=PASSWORD,
+            )
+        except ValueError:
+            return False
+    return True
+
+
+def _email(index):
+    return _seed_email(EMAIL_PREFIX, index)
+
+
+def _scenarios(entries_per_user):
+    """Endpoint name -> function(client, headers, state) that sends one request."""
+    today = date.today()
+    last_page = max(entries_per_user // 10, 1)
+
+    def login(client, headers, state):
+        return client.post(
+            "/api/auth/login", json={"email": state["email"], "password": PASSWORD}
+        )
+
+    def entries_first_page(client, headers, state):
+        return client.get("/api/entries/?per_page=10", headers=headers)
+
+    def entries_last_page(client, headers, state):
+        return client.get(
+            f"/api/entries/?page={last_page}&per_page=10", headers=headers
+        )
+
+    def entries_cursor(client, headers, state):
+        response = client.get(
+            f"/api/entries/?per_page=50&cursor={state.get('cursor', '')}",
+            headers=headers,
+        )
+        state["cursor"] = response.json["pagination"]["next_cursor"] or ""
+        return response
+
+    def entries_date_filter(client, headers, state):
+        start = today - timedelta(days=30)
+        return client.get(
+            f"/api/entries/?start_date={start}&end_date={today}&per_page=50",
+            headers=headers,
+        )
+
+    def statistics(client, headers, state):
+        return client.get("/api/entries/statistics", headers=headers)
+
+    def create_entry(client, headers, state):
+        response = client.post(
+            "/api/entries/",
+            json={
+                "date": str(today),
+                "hours": 1.5,
+                "description": "Benchmark write",
+                "completed": True,
+            },
+            headers=headers,
+        )
+        state.setdefault("created", []).append(response.json["work_entry"]["id"])
+        return response
+
+    def update_entry(client, headers, state):
+        created = state["created"]
+        entry_id = created[state.setdefault("updated", 0) % len(created)]
+        state["updated"] += 1
+        return client.put(
+            f"/api/entries/{entry_id}", json={"hours": 2.5}, headers=headers
+        )
+
+    def delete_entry(client, headers, state):
+        return client.delete(f"/api/entries/{state['created'].pop()}", headers=headers)
+
+    # Writes run last and in this order: updates and deletes use created ids
+    return {
+        "login": login,
+        "entries_first_page": entries_first_page,
+        "entries_last_page": entries_last_page,
+        "entries_cursor": entries_cursor,
+        "entries_date_filter": entries_date_filter,
+        "statistics": statistics,
+        "create_entry": create_entry,
+        "update_entry": update_entry,
+        "delete_entry": delete_entry,
+    }
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(app, send, clients, requests_per_client, sessions):
+    """Send requests from every client thread at once and collect timings."""
+    latencies = []
+    errors = []
+    statements = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients)
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def worker(session):
+        client = app.test_client()
+        start_barrier.wait()
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            response = send(client, session["headers"], session)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        pool = [
+            threading.Thread(target=worker, args=(sessions[index],))
+            for index in range(clients)
+        ]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        wall = time.perf_counter() - started
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "throughput_rps": round(total / wall, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(len(statements) / total, 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    """List endpoints whose p95 or throughput regressed beyond the threshold."""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms"
+            )
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> "
+                f"{current['throughput_rps']} req/s"
+            )
+        if current["queries_per_request"] > previous["queries_per_request"]:
+            regressions.append(
+                f"{name}: queries/request {previous['queries_per_request']} -> "
+                f"{current['queries_per_request']}"
+            )
+    return regressions
+
+
+def _parse_config(pairs):
+    """KEY=VALUE overrides for the app config; values are parsed as JSON if possible."""
+    config = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database-url",
+        help="Database to seed and use (default: a temporary SQLite file)",
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--entries-per-user", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument(
+        "--requests", type=int, default=25, help="Requests per client per endpoint"
+    )
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        dest="endpoints",
+        help="Only run these endpoints (repeatable)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for data")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:600000")
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="App config override, e.g. RESPONSE_CACHE_ENABLED=true",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous results file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed p95/throughput regression against the baseline (0.2 = 20%%)",
+    )
+    args = parser.parse_args()
+    if args.clients > args.users:
+        parser.error("--clients cannot exceed --users (one user per client)")
+    if args.endpoints and "create_entry" not in args.endpoints:
+        if {"update_entry", "delete_entry"} & set(args.endpoints):
+            parser.error("update_entry and delete_entry need create_entry")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'b.db')}"
+        engine = create_engine(database_url)
+        migrations.upgrade(engine, log=lambda message: None)
+        engine.dispose()
+
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": database_url,
+                "PASSWORD_HASH_METHOD": args.hash_method,
+                **_parse_config(args.config),
+            }
+        )
+        started = time.perf_counter()
+        if seed(app, args.users, args.entries_per_user, args.seed):
+            print(
+                f"Seeded {args.users} users x {args.entries_per_user} entries "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        else:
+            print("Reusing previously seeded benchmark data")
+
+        sessions = []
+        client = app.test_client()
+        for index in range(args.clients):
+            credentials = {"email": _email(index), "password": PASSWORD}
+            response = client.post("/api/auth/login", json=credentials)
+            token = response.json["access_token"]
+            sessions.append(
+                {
+                    "email": _email(index),
+                    "headers": {"Authorization": f"Bearer {token}"},
+                }
+            )
+
+        scenarios = _scenarios(args.entries_per_user)
+        results = {
+            "meta": {
+                "database": make_url(database_url).get_backend_name(),
+                "users": args.users,
+                "entries_per_user": args.entries_per_user,
+                "clients": args.clients,
+                "requests_per_client": args.requests,
+                "config": _parse_config(args.config),
+                "python": platform.python_version(),
+                "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            },
+            "endpoints": {},
+        }
+        print(
+            f"{'endpoint':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8} {'errors':>6}"
+        )
+        for name, send in scenarios.items():
+            if args.endpoints and name not in args.endpoints:
+                continue
+            result = run_scenario(app, send, args.clients, args.requests, sessions)
+            results["endpoints"][name] = result
+            print(
+                f"{name:<22} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+                f"{result['p95_ms']:>8} {result['p99_ms']:>8} "
+                f"{result['queries_per_request']:>8} {result['errors']:>6}"
+            )
+
+        with app.app_context():
+            db.engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
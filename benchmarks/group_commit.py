@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Write throughput micro-benchmark for group commit settings
+Run from the repository root: python -m benchmarks.group_commit
+
+Creates and updates work entries from concurrent clients, first with a
+commit per request and then with GROUP_COMMIT_ENABLED at each window, on a
+temporary SQLite file or on the database passed with --database-url.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+import migrations
+from app import create_app, db
+
+
+def run_setting(database_url, window_ms, max_batch, threads, writes_per_thread):
+    """Drive creates and updates from several threads and count commits."""
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": database_url,
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+        "GROUP_COMMIT_ENABLED": window_ms is not None,
+        "GROUP_COMMIT_WINDOW_MS": window_ms or 0,
+        "GROUP_COMMIT_MAX_BATCH": max_batch,
+    }
+    app = create_app(config)
+    commits = []
+    with app.app_context():
+        event.listen(db.engine, "commit", lambda conn: commits.append(1))
+    email = f"bench-{time.time_ns()}@example.com"
+    credentials = {"email": email, "password": "password123"}
+    client = app.test_client()
+    client.post("/api/auth/register", json=credentials)
+    token = client.post("/api/auth/login", json=credentials).json["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        entry_id = None
+        for number in range(writes_per_thread):
+            started = time.perf_counter()
+            # Alternate creates with updates of the entry created last
+            if entry_id is None or number % 2 == 0:
+                response = client.post(
+                    "/api/entries/",
+                    json={
+                        "date": f"2024-03-{index % 28 + 1:02d}",
+                        "hours": 1.0,
+                        "description": f"Bench {index}-{number}",
+                    },
+                    headers=headers,
+                )
+                ok = response.status_code == 201
+                if ok:
+                    entry_id = response.json["work_entry"]["id"]
+            else:
+                response = client.put(
+                    f"/api/entries/{entry_id}",
+                    json={"hours": 2.0, "completed": True},
+                    headers=headers,
+                )
+                ok = response.status_code == 200
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    failures.append(response.status_code)
+
+    commits.clear()
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    with app.app_context():
+        db.engine.dispose()
+
+    latencies.sort()
+    return {
+        "window_ms": window_ms,
+        "writes_per_second": len(latencies) / wall,
+        "writes_per_commit": len(latencies) / max(len(commits), 1),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database-url", help="Database to write to (default: a temporary SQLite)"
+    )
+    parser.add_argument(
+        "--windows",
+        default="off,0,2,5",
+        help="Comma-separated GROUP_COMMIT_WINDOW_MS values; off = commit per request",
+    )
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=50, help="Writes per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'b.db')}"
+        engine = create_engine(database_url)
+        migrations.upgrade(engine, log=lambda message: None)
+        engine.dispose()
+
+        print(f"database: {make_url(database_url).get_backend_name()}")
+        print(
+            f"{'window ms':>9} {'writes/s':>9} {'per commit':>10} "
+            f"{'p50 ms':>8} {'p95 ms':>8}"
+        )
+        for window in args.windows.split(","):
+            window_ms = None if window == "off" else float(window)
+            result = run_setting(
+                database_url, window_ms, args.max_batch, args.threads, args.writes
+            )
+            print(
+                f"{window:>9} {result['writes_per_second']:>9.1f} "
+                f"{result['writes_per_commit']:>10.1f} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f}"
+                + (f"  ({result['failures']} failed)" if result["failures"] else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
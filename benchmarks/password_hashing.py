@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Login throughput micro-benchmark for password hashing settings
+Run from the repository root: python -m benchmarks.password_hashing
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from app import create_app, db
+
+DEFAULT_METHODS = ["pbkdf2:sha256:600000", "pbkdf2:sha256:100000", "scrypt:32768:8:1"]
+
+
+def run_setting(method, workers, threads, logins_per_thread):
+    """Drive /api/auth/login from several threads and time each request."""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'b.db')}",
+                "PASSWORD_HASH_METHOD": method,
+                "PASSWORD_HASH_WORKERS": workers,
+                "PASSWORD_HASH_QUEUE_TIMEOUT": 600,
+            }
+        )
+        with app.app_context():
+            db.create_all()
+        credentials = {"email": "bench@example.com", "password": "password123"}
+        app.test_client().post("/api/auth/register", json=credentials)
+
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+
+        def worker():
+            client = app.test_client()
+            for _ in range(logins_per_thread):
+                started = time.perf_counter()
+                response = client.post("/api/auth/login", json=credentials)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        with app.app_context():
+            db.engine.dispose()
+
+    latencies.sort()
+    return {
+        "method": method,
+        "workers": workers,
+        "logins_per_second": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--method", action="append", dest="methods")
+    parser.add_argument(
+        "--workers",
+        default="0,2,4",
+        help="Comma-separated PASSWORD_HASH_WORKERS values (0 = in-thread)",
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=5, help="Logins per thread")
+    args = parser.parse_args()
+
+    print(f"{'method':<24} {'workers':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for method in args.methods or DEFAULT_METHODS:
+        for workers in (int(w) for w in args.workers.split(",")):
+            result = run_setting(method, workers, args.threads, args.logins)
+            print(
+                f"{result['method']:<24} {result['workers']:>7} "
+                f"{result['logins_per_second']:>9.1f} {result['p50_ms']:>8.0f} "
+                f"{result['p95_ms']:>8.0f}"
+                + (f"  ({result['failures']} failed)" if result["failures"] else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
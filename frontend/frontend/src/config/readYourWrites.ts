@@ -0,0 +1,22 @@
+import axios from 'axios';
+import type { AxiosInstance } from 'axios';
+
+// The API answers writes with this header when it reads from replicas.
+// Sending it back keeps this client's reads on the primary database until
+// it expires, so the refetch right after a write sees that write.
+export const READ_PRIMARY_HEADER = 'X-Read-Primary-Until';
+
+let readPrimaryUntil: string | null = null;
+
+export function installReadYourWrites(instance: AxiosInstance = axios) {
+  instance.interceptors.request.use((config) => {
+    // The API ignores the header once it has expired
+    if (readPrimaryUntil) config.headers.set(READ_PRIMARY_HEADER, readPrimaryUntil);
+    return config;
+  });
+  instance.interceptors.response.use((response) => {
+    const until = response.headers[READ_PRIMARY_HEADER.toLowerCase()];
+    if (typeof until === 'string') readPrimaryUntil = until;
+    return response;
+  });
+}
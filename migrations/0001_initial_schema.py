@@ -0,0 +1,76 @@
+"""Create users, work_entries and daily_rollups if they do not exist yet."""
+
+from migrations import run_statements
+
+STATEMENTS = {
+    "sqlite": [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL PRIMARY KEY,
+            email VARCHAR(120) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            created_at DATETIME
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS work_entries (
+            id INTEGER NOT NULL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            hours FLOAT NOT NULL,
+            description TEXT NOT NULL,
+            completed BOOLEAN NOT NULL,
+            created_at DATETIME,
+            updated_at DATETIME
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            completed_hours FLOAT NOT NULL,
+            completed_count INTEGER NOT NULL,
+            total_hours FLOAT NOT NULL,
+            total_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, date)
+        )
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(120) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS work_entries (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            hours DOUBLE PRECISION NOT NULL,
+            description TEXT NOT NULL,
+            completed BOOLEAN NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            completed_hours DOUBLE PRECISION NOT NULL,
+            completed_count INTEGER NOT NULL,
+            total_hours DOUBLE PRECISION NOT NULL,
+            total_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, date)
+        )
+        """,
+    ],
+}
+
+
+def upgrade(conn, dialect):
+    run_statements(conn, dialect, STATEMENTS)
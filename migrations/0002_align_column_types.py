@@ -0,0 +1,25 @@
+"""Bring databases made by the old hand-written DDL in line with the models.
+
+The old setup script created hours as DECIMAL(4,2), allowed NULL
+descriptions and completed flags, and added an unused users.updated_at.
+SQLite databases were only ever created from the models, so this is a
+no-op there.
+"""
+
+from migrations import run_statements
+
+STATEMENTS = {
+    "sqlite": [],
+    "postgresql": [
+        "ALTER TABLE work_entries ALTER COLUMN hours TYPE DOUBLE PRECISION",
+        "UPDATE work_entries SET description = '' WHERE description IS NULL",
+        "ALTER TABLE work_entries ALTER COLUMN description SET NOT NULL",
+        "UPDATE work_entries SET completed = FALSE WHERE completed IS NULL",
+        "ALTER TABLE work_entries ALTER COLUMN completed SET NOT NULL",
+        "ALTER TABLE users DROP COLUMN IF EXISTS updated_at",
+    ],
+}
+
+
+def upgrade(conn, dialect):
+    run_statements(conn, dialect, STATEMENTS)
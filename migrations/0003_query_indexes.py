@@ -0,0 +1,33 @@
+"""Replace single-column indexes with ones shaped like the real queries.
+
+(user_id, date DESC, id DESC) serves the listing's filter, ORDER BY and
+keyset cursor from one index range. The partial (user_id, date) index
+covers completed-only date range scans. The old single-column indexes are
+prefixes of these or duplicate the users.email unique constraint.
+"""
+
+from migrations import run_statements
+
+# The partial index predicates match what SQLAlchemy renders for
+# WorkEntry.completed.is_(True), so the planners can prove they apply
+STATEMENTS = {
+    "sqlite": [
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_user_date_id "
+        "ON work_entries (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_user_date_completed "
+        "ON work_entries (user_id, date) WHERE completed IS 1",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_user_date_id "
+        "ON work_entries (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_user_date_completed "
+        "ON work_entries (user_id, date) WHERE completed IS true",
+        "DROP INDEX IF EXISTS idx_work_entries_user_id",
+        "DROP INDEX IF EXISTS idx_work_entries_date",
+        "DROP INDEX IF EXISTS idx_users_email",
+    ],
+}
+
+
+def upgrade(conn, dialect):
+    run_statements(conn, dialect, STATEMENTS)
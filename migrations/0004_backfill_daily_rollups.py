@@ -0,0 +1,27 @@
+"""Recompute daily_rollups from work_entries for pre-existing data."""
+
+from migrations import run_statements
+
+REBUILD = [
+    "DELETE FROM daily_rollups",
+    """
+    INSERT INTO daily_rollups (
+        user_id, date, completed_hours, completed_count, total_hours, total_count
+    )
+    SELECT
+        user_id,
+        date,
+        SUM(CASE WHEN completed THEN hours ELSE 0 END),
+        SUM(CASE WHEN completed THEN 1 ELSE 0 END),
+        SUM(hours),
+        COUNT(*)
+    FROM work_entries
+    GROUP BY user_id, date
+    """,
+]
+
+STATEMENTS = {"sqlite": REBUILD, "postgresql": REBUILD}
+
+
+def upgrade(conn, dialect):
+    run_statements(conn, dialect, STATEMENTS)
@@ -0,0 +1,41 @@
+"""Full-text index over work entry descriptions for /api/entries/search.
+
+SQLite gets an external-content FTS5 table kept in sync by triggers and
+filled from the existing rows. PostgreSQL gets a GIN index on the same
+to_tsvector('simple', description) expression the search query uses.
+"""
+
+from migrations import run_statements
+
+STATEMENTS = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS work_entries_fts USING fts5("
+        "description, user_id, content='work_entries', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_insert "
+        "AFTER INSERT ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts (rowid, description, user_id) "
+        "VALUES (new.id, new.description, new.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_delete "
+        "AFTER DELETE ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts "
+        "(work_entries_fts, rowid, description, user_id) "
+        "VALUES ('delete', old.id, old.description, old.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS work_entries_fts_update "
+        "AFTER UPDATE OF description ON work_entries BEGIN "
+        "INSERT INTO work_entries_fts "
+        "(work_entries_fts, rowid, description, user_id) "
+        "VALUES ('delete', old.id, old.description, old.user_id); "
+        "INSERT INTO work_entries_fts (rowid, description, user_id) "
+        "VALUES (new.id, new.description, new.user_id); END",
+        "INSERT INTO work_entries_fts (work_entries_fts) VALUES ('rebuild')",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_work_entries_description_search "
+        "ON work_entries USING GIN (to_tsvector('simple', description))",
+    ],
+}
+
+
+def upgrade(conn, dialect):
+    run_statements(conn, dialect, STATEMENTS)
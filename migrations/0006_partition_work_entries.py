@@ -0,0 +1,83 @@
+"""Range-partition work_entries by date on PostgreSQL.
+
+The table is rebuilt as a partitioned table with one partition per month
+(or year, with WORK_ENTRIES_PARTITION_INTERVAL=year) of existing data and
+a few ahead of today, plus a default partition. PostgreSQL requires the
+partition key in the primary key, so it becomes (id, date); ids still come
+from the same sequence. The rebuild locks the table while rows are copied.
+SQLite keeps its single table.
+"""
+
+from sqlalchemy import text
+
+from migrations import partitions
+
+COLUMNS = "id, user_id, date, hours, description, completed, created_at, updated_at"
+
+CREATE_TABLE = """
+CREATE TABLE work_entries (
+    id INTEGER NOT NULL DEFAULT nextval('{sequence}'::regclass),
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    hours DOUBLE PRECISION NOT NULL,
+    description TEXT NOT NULL,
+    completed BOOLEAN NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    updated_at TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date)
+"""
+
+# Indexes of 0003 and 0005, created on the parent so every partition gets them
+INDEXES = [
+    "CREATE INDEX ix_work_entries_user_date_id "
+    "ON work_entries (user_id, date DESC, id DESC)",
+    "CREATE INDEX ix_work_entries_user_date_completed "
+    "ON work_entries (user_id, date) WHERE completed IS true",
+    "CREATE INDEX ix_work_entries_description_search "
+    "ON work_entries USING GIN (to_tsvector('simple', description))",
+]
+
+
+def upgrade(conn, dialect):
+    if dialect != "postgresql" or partitions.is_partitioned(conn):
+        return
+    interval = partitions.configured_interval()
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence('work_entries', 'id')")
+    ).scalar()
+    if sequence is None:
+        sequence = "work_entries_id_seq"
+        conn.exec_driver_sql(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+    # Dropping the old table must not drop the sequence with it
+    conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    conn.exec_driver_sql(
+        "ALTER TABLE work_entries RENAME TO work_entries_unpartitioned"
+    )
+    conn.exec_driver_sql(
+        "ALTER INDEX work_entries_pkey RENAME TO work_entries_unpartitioned_pkey"
+    )
+
+    conn.exec_driver_sql(CREATE_TABLE.format(sequence=sequence))
+    conn.exec_driver_sql(
+        f"CREATE TABLE {partitions.DEFAULT_PARTITION} "
+        "PARTITION OF work_entries DEFAULT"
+    )
+    for start in sorted(
+        partitions.starts_with_rows(conn, "work_entries_unpartitioned", interval)
+    ):
+        partitions.create_partition(conn, start, interval)
+    partitions.ensure_partitions(conn, interval)
+
+    conn.exec_driver_sql(
+        f"INSERT INTO work_entries ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM work_entries_unpartitioned"
+    )
+    conn.exec_driver_sql("DROP TABLE work_entries_unpartitioned")
+    conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} OWNED BY work_entries.id")
+    conn.exec_driver_sql(
+        f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) "
+        "FROM work_entries"
+    )
+    for statement in INDEXES:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,91 @@
+"""
+Versioned schema migrations for SQLite and PostgreSQL
+
+Each module named NNNN_description.py in this package is one migration with
+an upgrade(conn, dialect) function. Applied versions are recorded in the
+schema_migrations table, and each migration runs in its own transaction.
+"""
+
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+# Serializes concurrent deploys on PostgreSQL
+ADVISORY_LOCK_ID = 7243917
+
+
+def discover():
+    """Return (version, name, module) for every migration, oldest first."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = re.match(r"^(\d{4})_(\w+)$", module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            migrations.append((int(match.group(1)), match.group(2), module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def _ensure_version_table(conn):
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "name VARCHAR(255) NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL)"
+        )
+    )
+
+
+def applied_versions(conn):
+    """Versions already applied to the database behind conn."""
+    _ensure_version_table(conn)
+    return {
+        row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))
+    }
+
+
+def upgrade(engine, target=None, log=print):
+    """Apply pending migrations up to target (default: all). Returns the count."""
+    if engine.dialect.name not in SUPPORTED_DIALECTS:
+        raise RuntimeError(f"Unsupported database dialect: {engine.dialect.name}")
+
+    applied = 0
+    for version, name, module in discover():
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(
+                    text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID}
+                )
+            if version in applied_versions(conn):
+                continue
+            module.upgrade(conn, conn.dialect.name)
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, name, applied_at) "
+                    "VALUES (:version, :name, :applied_at)"
+                ),
+                {"version": version, "name": name, "applied_at": datetime.utcnow()},
+            )
+        log(f"Applied {version:04d}_{name}")
+        applied += 1
+    return applied
+
+
+def status(engine):
+    """Return (version, name, applied) for every known migration."""
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [(version, name, version in applied) for version, name, _ in discover()]
+
+
+def run_statements(conn, dialect, statements):
+    """Run the list of SQL statements for this dialect."""
+    for statement in statements[dialect]:
+        conn.exec_driver_sql(statement)
@@ -0,0 +1,158 @@
+"""
+Monthly or yearly date range partitions of work_entries on PostgreSQL
+
+Partitions are named work_entries_YYYY_MM or work_entries_YYYY. Dates with
+no partition yet land in work_entries_default, so writes never fail; the
+next maintenance run moves them into a partition of their own. SQLite
+tables are never partitioned and everything here is a no-op for them.
+"""
+
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from migrations import ADVISORY_LOCK_ID
+
+PARTITION_INTERVALS = ("month", "year")
+DEFAULT_PARTITION = "work_entries_default"
+PARTITION_NAME = re.compile(r"^work_entries_(\d{4})(_\d{2})?$")
+
+
+def configured_interval():
+    """Partition size for a table being partitioned, from the environment."""
+    interval = os.getenv("WORK_ENTRIES_PARTITION_INTERVAL", "month")
+    if interval not in PARTITION_INTERVALS:
+        raise RuntimeError(f"Unsupported partition interval: {interval}")
+    return interval
+
+
+def configured_ahead():
+    """How many partitions after the current one to keep created."""
+    return int(os.getenv("WORK_ENTRIES_PARTITIONS_AHEAD", "3"))
+
+
+def partition_start(day, interval):
+    """First day of the partition containing ``day``."""
+    if interval == "year":
+        return day.replace(month=1, day=1)
+    return day.replace(day=1)
+
+
+def next_partition_start(start, interval):
+    if interval == "year":
+        return start.replace(year=start.year + 1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start, interval):
+    if interval == "year":
+        return f"work_entries_{start:%Y}"
+    return f"work_entries_{start:%Y_%m}"
+
+
+def interval_of(names):
+    """Interval of existing partitions by their names, or None if there are none."""
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            return "month" if match.group(2) else "year"
+    return None
+
+
+def is_partitioned(conn):
+    return (
+        conn.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass('work_entries')")
+        ).scalar()
+        == "p"
+    )
+
+
+def partition_names(conn):
+    """Names of the partitions attached to work_entries, default included."""
+    return list(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'work_entries'::regclass ORDER BY c.relname"
+            )
+        ).scalars()
+    )
+
+
+def create_partition(conn, start, interval):
+    """Create and attach one partition, moving its rows out of the default."""
+    name = partition_name(start, interval)
+    bounds = {"start": start, "end": next_partition_start(start, interval)}
+    conn.exec_driver_sql(
+        f"CREATE TABLE {name} "
+        "(LIKE work_entries INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    # Attaching checks that the default holds no rows of the new range
+    conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE date >= :start AND date < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    # DDL takes no bind parameters; the bounds are dates, safe to inline
+    conn.exec_driver_sql(
+        f"ALTER TABLE work_entries ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    )
+    return name
+
+
+def starts_with_rows(conn, table, interval):
+    """Starts of the partitions that rows of ``table`` belong in."""
+    rows = conn.execute(
+        text(f"SELECT DISTINCT date_trunc('{interval}', date)::date FROM {table}")
+    )
+    return {start for (start,) in rows}
+
+
+def ensure_partitions(conn, interval=None, ahead=None, today=None):
+    """Create missing partitions up to ``ahead`` past today's; return their names.
+
+    Partitions are also created for any dates that fell into the default
+    partition since the last run.
+    """
+    existing = set(partition_names(conn))
+    interval = interval or interval_of(existing) or configured_interval()
+    ahead = configured_ahead() if ahead is None else ahead
+    starts = set()
+    if DEFAULT_PARTITION in existing:
+        starts = starts_with_rows(conn, DEFAULT_PARTITION, interval)
+    start = partition_start(today or date.today(), interval)
+    for _ in range(ahead + 1):
+        starts.add(start)
+        start = next_partition_start(start, interval)
+    return [
+        create_partition(conn, start, interval)
+        for start in sorted(starts)
+        if partition_name(start, interval) not in existing
+    ]
+
+
+def maintain(engine, ahead=None, log=print):
+    """Create upcoming partitions; return their names, or None if unpartitioned."""
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.begin() as conn:
+        # Maintenance runs wait for each other and for migrations
+        conn.execute(
+            text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID}
+        )
+        if not is_partitioned(conn):
+            return None
+        created = ensure_partitions(conn, ahead=ahead)
+    for name in created:
+        log(f"Created partition {name}")
+    return created
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 """
 Database setup script for Neon PostgreSQL
-Run this script to initialize your production database
+Run this script to initialize or upgrade your production database
 """
 
 import os
 
-import psycopg2
 from dotenv import load_dotenv
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import create_engine
+
+import migrations
+import migrations.partitions
 
 load_dotenv()  # Loads .env if present
 
@@ -18,54 +20,12 @@ if not DATABASE_URL:
 
 
 def setup_database():
-    """Initialize the database with required tables"""
+    """Apply every pending schema migration and create upcoming partitions"""
     try:
-        # Connect to the database
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        cursor = conn.cursor()
-
-        # Create users table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(120) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """
-        )
-
-        # Create work_entries table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS work_entries (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                date DATE NOT NULL,
-                hours DECIMAL(4,2) NOT NULL,
-                description TEXT,
-                completed BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """
-        )
-
-        # Create indexes for better performance
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_work_entries_user_id "
-            "ON work_entries(user_id);"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_work_entries_date " "ON work_entries(date);"
-        )
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email " "ON users(email);")
-
-        cursor.close()
-        conn.close()
+        engine = create_engine(DATABASE_URL)
+        migrations.upgrade(engine)
+        migrations.partitions.maintain(engine)
+        engine.dispose()
 
     except Exception:
         return False
@@ -1,17 +1,75 @@
+import asyncio
+import gzip
 import json
+import marshal
+import multiprocessing
+import os
+import threading
+import time
+from datetime import date
 
 import pytest
+from werkzeug.wrappers import Response
 
 from app import create_app, db
 
+# APP_MODE=asgi runs the client tests against asgi.py instead of the Flask app
+APP_MODE = os.getenv("APP_MODE", "wsgi")
+wsgi_only = pytest.mark.skipif(
+    APP_MODE == "asgi", reason="Only served by the Flask app"
+)
+
+
+class _AsgiClient:
+    """Drive the ASGI app through the Flask test client's synchronous API."""
+
+    def __init__(self, database_uri, **config):
+        pytest.importorskip("quart")
+        pytest.importorskip("aiosqlite")
+        from asgi import create_asgi_app
+
+        self.app = create_asgi_app(
+            {"TESTING": True, "SQLALCHEMY_DATABASE_URI": database_uri, **config}
+        )
+        self._client = self.app.test_client()
+        self._loop = asyncio.new_event_loop()
+
+    def open(self, path, method="GET", **kwargs):
+        async def send():
+            response = await self._client.open(path, method=method, **kwargs)
+            data = await response.get_data()
+            return Response(data, response.status_code, response.headers)
+
+        return self._loop.run_until_complete(send())
+
+    def get(self, path, **kwargs):
+        return self.open(path, "GET", **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, "POST", **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, "PUT", **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, "DELETE", **kwargs)
+
+    def close(self):
+        engine = self.app.extensions["async_engine"]
+        self._loop.run_until_complete(engine.dispose())
+        self._loop.close()
+
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     """Create and configure a new app instance for each test."""
     test_config = {
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
     }
+    if APP_MODE == "asgi":
+        # The ASGI app has its own engine, so both share a database file
+        test_config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
     app = create_app(test_config)
     with app.app_context():
         db.drop_all()
@@ -23,8 +81,13 @@ def app():
 
 @pytest.fixture
 def client(app):
-    """A test client for the app."""
-    return app.test_client()
+    """A test client for the app, or for the ASGI app in APP_MODE=asgi."""
+    if APP_MODE != "asgi":
+        yield app.test_client()
+        return
+    client = _AsgiClient(app.config["SQLALCHEMY_DATABASE_URI"])
+    yield client
+    client.close()
 
 
 @pytest.fixture
@@ -463,3 +526,1777 @@ def test_invalid_work_entry_data(client):
     )
     assert response.status_code == 400
     assert b"Description is required" in response.data
+
+
+def _auth_headers(client, email):
+    """Register a user and return the Authorization headers for them."""
+    client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "password123"},
+    )
+    login_response = client.post(
+        "/api/auth/login",
+        json={"email": email, "password": "password123"},
+    )
+    token = login_response.json["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_get_work_entries_with_cursor(client):
+    """Test keyset pagination walks every entry exactly once."""
+    headers = _auth_headers(client, "cursor@example.com")
+
+    # Several entries share a date so the id tiebreak matters
+    for i in range(7):
+        client.post(
+            "/api/entries/",
+            json={
+                "date": f"2023-01-{i // 3 + 1:02d}",
+                "hours": 1.0,
+                "description": f"Work entry {i+1}",
+            },
+            headers=headers,
+        )
+
+    seen = []
+    cursor = ""
+    while True:
+        response = client.get(
+            f"/api/entries/?per_page=3&cursor={cursor}", headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json
+        assert data["pagination"]["total"] == 7
+        seen.extend(entry["id"] for entry in data["work_entries"])
+        if not data["pagination"]["has_next"]:
+            assert data["pagination"]["next_cursor"] is None
+            break
+        cursor = data["pagination"]["next_cursor"]
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+    response = client.get("/api/entries/?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+    assert b"Invalid cursor" in response.data
+
+
+def test_listing_rejects_out_of_range_pages(client):
+    """Test per_page outside 1..100 and page below 1 answer 400, not 500."""
+    headers = _auth_headers(client, "page-range@example.com")
+    _create_entry(client, headers)
+    for query in (
+        "cursor=&per_page=0",
+        "cursor=&per_page=-1",
+        "cursor=&per_page=101",
+        "per_page=0",
+        "per_page=-1&include_total=false",
+        "per_page=x",
+        "page=0",
+        "page=-2",
+    ):
+        response = client.get(f"/api/entries/?{query}", headers=headers)
+        assert response.status_code == 400, query
+        assert "error" in response.json
+
+    response = client.get("/api/entries/?cursor=&per_page=100", headers=headers)
+    assert response.status_code == 200
+
+
+def test_get_work_entries_without_total(client):
+    """Test that include_total=false skips the count but keeps has_next."""
+    headers = _auth_headers(client, "nototal@example.com")
+    for i in range(3):
+        client.post(
+            "/api/entries/",
+            json={
+                "date": f"2023-01-{i+1:02d}",
+                "hours": 1.0,
+                "description": f"Work entry {i+1}",
+            },
+            headers=headers,
+        )
+
+    response = client.get(
+        "/api/entries/?per_page=2&include_total=false", headers=headers
+    )
+    data = response.json
+    assert len(data["work_entries"]) == 2
+    assert data["pagination"]["total"] is None
+    assert data["pagination"]["has_next"] is True
+
+    response = client.get(
+        "/api/entries/?per_page=2&page=2&include_total=false", headers=headers
+    )
+    data = response.json
+    assert len(data["work_entries"]) == 1
+    assert data["pagination"]["has_next"] is False
+
+
+def test_statistics_follow_entry_changes(client):
+    """Test statistics stay correct as entries move between days and states."""
+    from datetime import date, timedelta
+
+    headers = _auth_headers(client, "rollups@example.com")
+    today = date.today()
+    last_month = today - timedelta(days=30)
+
+    create_response = client.post(
+        "/api/entries/",
+        json={
+            "date": today.isoformat(),
+            "hours": 3.5,
+            "description": "Today",
+            "completed": True,
+        },
+        headers=headers,
+    )
+    entry_id = create_response.json["work_entry"]["id"]
+    client.post(
+        "/api/entries/",
+        json={"date": today.isoformat(), "hours": 2, "description": "Open"},
+        headers=headers,
+    )
+
+    stats = client.get("/api/entries/statistics", headers=headers).json
+    assert stats == {"today_hours": 3.5, "last_week_hours": 3.5, "last_week_tasks": 1}
+
+    # Moving the completed entry out of the window removes it from both totals
+    client.put(
+        f"/api/entries/{entry_id}",
+        json={"date": last_month.isoformat()},
+        headers=headers,
+    )
+    stats = client.get("/api/entries/statistics", headers=headers).json
+    assert stats == {"today_hours": 0, "last_week_hours": 0, "last_week_tasks": 0}
+
+    client.put(
+        f"/api/entries/{entry_id}",
+        json={"date": today.isoformat(), "hours": 4},
+        headers=headers,
+    )
+    stats = client.get("/api/entries/statistics", headers=headers).json
+    assert stats == {"today_hours": 4, "last_week_hours": 4, "last_week_tasks": 1}
+
+    client.delete(f"/api/entries/{entry_id}", headers=headers)
+    stats = client.get("/api/entries/statistics", headers=headers).json
+    assert stats == {"today_hours": 0, "last_week_hours": 0, "last_week_tasks": 0}
+
+
+def test_rollups_verify_and_rebuild(client, runner):
+    """Test the rollups CLI detects drift and rebuilds from work_entries."""
+    from app import DailyRollup
+
+    headers = _auth_headers(client, "rebuild@example.com")
+    for day in ("2023-01-01", "2023-01-01", "2023-01-02"):
+        client.post(
+            "/api/entries/",
+            json={"date": day, "hours": 2, "description": "Entry"},
+            headers=headers,
+        )
+
+    result = runner.invoke(args=["rollups", "verify"])
+    assert result.exit_code == 0
+    assert "match" in result.output
+
+    DailyRollup.query.delete()
+    db.session.commit()
+    result = runner.invoke(args=["rollups", "verify"])
+    assert result.exit_code != 0
+    assert "2 daily rollup rows drifted" in result.output
+
+    result = runner.invoke(args=["rollups", "rebuild"])
+    assert result.exit_code == 0
+    assert DailyRollup.query.count() == 2
+    assert runner.invoke(args=["rollups", "verify"]).exit_code == 0
+
+
+def _create_app(**config):
+    """Create an app with extra config and an empty in-memory database."""
+    app = create_app(
+        {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", **config}
+    )
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _create_entry(client, headers, day="2023-01-01", **fields):
+    """Create a work entry and return its JSON."""
+    response = client.post(
+        "/api/entries/",
+        json={"date": day, "hours": 1.0, "description": "Entry", **fields},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json["work_entry"]
+
+
+def test_response_cache_hits_and_invalidation(tmp_path):
+    """Test cached GETs are reused until the user writes again."""
+    app = _create_app(
+        RESPONSE_CACHE_ENABLED=True,
+        RESPONSE_CACHE_PATH=str(tmp_path / "cache.sqlite3"),
+    )
+    client = app.test_client()
+    cache = app.extensions["response_cache"]
+    with app.app_context():
+        headers = _auth_headers(client, "cache@example.com")
+        _create_entry(client, headers)
+
+        first = client.get("/api/entries/", headers=headers)
+        second = client.get("/api/entries/", headers=headers)
+        assert first.json == second.json
+        assert cache.stats()["hits"] == 1
+
+        # Different query args are cached separately
+        client.get("/api/entries/?per_page=5", headers=headers)
+        assert cache.stats()["hits"] == 1
+
+        _create_entry(client, headers, day="2023-01-02")
+        response = client.get("/api/entries/", headers=headers)
+        assert len(response.json["work_entries"]) == 2
+        assert cache.stats()["hits"] == 1
+
+
+def test_response_cache_shared_store_reaches_other_workers(tmp_path):
+    """Test a write in one app instance invalidates another's cache."""
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "RESPONSE_CACHE_ENABLED": True,
+        "RESPONSE_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+    }
+    worker_a, worker_b = create_app(config), create_app(config)
+    with worker_a.app_context():
+        db.create_all()
+    client_a, client_b = worker_a.test_client(), worker_b.test_client()
+    headers = _auth_headers(client_a, "shared@example.com")
+
+    _create_entry(client_a, headers)
+    assert len(client_b.get("/api/entries/", headers=headers).json["work_entries"]) == 1
+    # Worker A picks the response up from the shared store
+    client_a.get("/api/entries/", headers=headers)
+    assert worker_a.extensions["response_cache"].stats()["shared_hits"] == 1
+
+    _create_entry(client_a, headers, day="2023-01-02")
+    assert len(client_b.get("/api/entries/", headers=headers).json["work_entries"]) == 2
+
+
+@wsgi_only
+def test_conditional_get_returns_not_modified(client):
+    """Test If-None-Match gets a 304 until the user's data changes."""
+    from datetime import date
+
+    headers = _auth_headers(client, "etag@example.com")
+    entry = _create_entry(client, headers, day=date.today().isoformat())
+
+    for url in (
+        "/api/entries/",
+        f"/api/entries/{entry['id']}",
+        "/api/entries/statistics",
+    ):
+        response = client.get(url, headers=headers)
+        etag = response.headers["ETag"]
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+        client.put(
+            f"/api/entries/{entry['id']}",
+            json={"description": f"Changed for {url}"},
+            headers=headers,
+        )
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    # Filters are part of the listing ETag
+    all_etag = client.get("/api/entries/", headers=headers).headers["ETag"]
+    response = client.get(
+        "/api/entries/?start_date=2024-01-01",
+        headers={**headers, "If-None-Match": all_etag},
+    )
+    assert response.status_code == 200
+
+
+@wsgi_only
+def test_listing_etag_covers_page_and_total(client, tmp_path):
+    """Test listing ETags follow the page's rows and total, or the data version."""
+    headers = _auth_headers(client, "page-etag@example.com")
+    _create_entry(client, headers, day="2023-01-10")
+    _create_entry(client, headers, day="2023-01-09")
+    page_url = "/api/entries/?per_page=1&include_total=false"
+
+    def etag(url):
+        return client.get(url, headers=headers).headers["ETag"]
+
+    page_etag, total_etag = etag(page_url), etag("/api/entries/?per_page=1")
+    # An older entry only changes listings that report the total
+    _create_entry(client, headers, day="2023-01-01")
+    assert etag(page_url) == page_etag
+    assert etag("/api/entries/?per_page=1") != total_etag
+    _create_entry(client, headers, day="2023-01-11")
+    assert etag(page_url) != page_etag
+
+    app = _create_app(
+        RESPONSE_CACHE_ENABLED=True,
+        RESPONSE_CACHE_PATH=str(tmp_path / "cache.sqlite3"),
+    )
+    cached_client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(cached_client, "version-etag@example.com")
+        _create_entry(cached_client, headers)
+        response = cached_client.get(page_url, headers=headers)
+        response = cached_client.get(
+            page_url, headers={**headers, "If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == 304
+        _create_entry(cached_client, headers, day="2022-01-01")
+        response = cached_client.get(
+            page_url, headers={**headers, "If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == 200
+
+
+def test_if_match_rejects_stale_writes(client):
+    """Test PUT and DELETE with an outdated If-Match fail with 412."""
+    headers = _auth_headers(client, "ifmatch@example.com")
+    create_response = client.post(
+        "/api/entries/",
+        json={"date": "2023-01-01", "hours": 1, "description": "Entry"},
+        headers=headers,
+    )
+    entry_id = create_response.json["work_entry"]["id"]
+    etag = create_response.headers["ETag"]
+
+    response = client.put(
+        f"/api/entries/{entry_id}",
+        json={"hours": 2},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+
+    # The first ETag is now stale for both updates and deletes
+    response = client.put(
+        f"/api/entries/{entry_id}",
+        json={"hours": 3},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        f"/api/entries/{entry_id}", headers={**headers, "If-Match": etag}
+    )
+    assert response.status_code == 412
+    assert (
+        client.get(f"/api/entries/{entry_id}", headers=headers).json["work_entry"][
+            "hours"
+        ]
+        == 2
+    )
+
+    response = client.delete(
+        f"/api/entries/{entry_id}", headers={**headers, "If-Match": new_etag}
+    )
+    assert response.status_code == 200
+
+
+@wsgi_only
+def test_bulk_operations(client, runner):
+    """Test a mixed batch is applied in one go and reported per item."""
+    headers = _auth_headers(client, "bulk@example.com")
+    keep = _create_entry(client, headers, day="2023-01-01")
+    drop = _create_entry(client, headers, day="2023-01-02")
+
+    response = client.post(
+        "/api/entries/bulk",
+        json={
+            "operations": [
+                {
+                    "op": "create",
+                    "data": {"date": "2023-01-03", "hours": 2, "description": "A"},
+                },
+                {
+                    "op": "create",
+                    "data": {"date": "2023-01-04", "hours": 3, "description": "B"},
+                },
+                {"op": "update", "id": keep["id"], "data": {"completed": True}},
+                {"op": "delete", "id": drop["id"]},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json
+    assert data["applied"] == 4
+    assert [r["status"] for r in data["results"]] == [
+        "created",
+        "created",
+        "updated",
+        "deleted",
+    ]
+
+    entries = client.get("/api/entries/", headers=headers).json["work_entries"]
+    by_id = {entry["id"]: entry for entry in entries}
+    assert set(by_id) == {
+        keep["id"],
+        data["results"][0]["id"],
+        data["results"][1]["id"],
+    }
+    assert by_id[data["results"][1]["id"]]["description"] == "B"
+    assert by_id[keep["id"]]["completed"] is True
+    assert runner.invoke(args=["rollups", "verify"]).exit_code == 0
+
+
+@wsgi_only
+def test_bulk_operations_validate_up_front(client):
+    """Test an invalid item rejects an atomic batch and nothing is applied."""
+    headers = _auth_headers(client, "bulkinvalid@example.com")
+    other_headers = _auth_headers(client, "bulkother@example.com")
+    foreign = _create_entry(client, other_headers)
+
+    operations = [
+        {
+            "op": "create",
+            "data": {"date": "2023-01-03", "hours": 2, "description": "A"},
+        },
+        {"op": "create", "data": {"date": "bad", "hours": 2, "description": "B"}},
+        {"op": "delete", "id": foreign["id"]},
+    ]
+    response = client.post(
+        "/api/entries/bulk", json={"operations": operations}, headers=headers
+    )
+    assert response.status_code == 400
+    results = response.json["results"]
+    assert results[0]["status"] == "skipped"
+    assert results[1]["error"] == "Invalid date format. Use YYYY-MM-DD"
+    assert results[2]["error"] == "Work entry not found"
+    assert client.get("/api/entries/", headers=headers).json["work_entries"] == []
+
+    # Non-atomic batches apply whatever is valid
+    response = client.post(
+        "/api/entries/bulk",
+        json={"operations": operations, "atomic": False},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json["applied"] == 1
+    assert response.json["results"][0]["status"] == "created"
+
+
+@wsgi_only
+def test_bulk_operations_reject_entries_changed_since_validation(
+    client, runner, monkeypatch
+):
+    """Test a batch rolls back when a validated entry changes before it runs."""
+    import app as app_module
+
+    headers = _auth_headers(client, "bulkrace@example.com")
+    moved = _create_entry(client, headers, day="2023-01-01")
+    validate = app_module._validate_bulk_operations
+
+    def validate_then_move(user_id, operations):
+        # Another request moves the entry between validation and the update
+        result = validate(user_id, operations)
+        db.session.execute(
+            db.text("UPDATE work_entries SET date = '2023-02-01' WHERE id = :id"),
+            {"id": moved["id"]},
+        )
+        return result
+
+    monkeypatch.setattr(app_module, "_validate_bulk_operations", validate_then_move)
+    response = client.post(
+        "/api/entries/bulk",
+        json={
+            "operations": [
+                {"op": "update", "id": moved["id"], "data": {"hours": 5}},
+                {
+                    "op": "create",
+                    "data": {"date": "2023-01-03", "hours": 2, "description": "A"},
+                },
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 409
+    entries = client.get("/api/entries/", headers=headers).json["work_entries"]
+    assert [(entry["id"], entry["hours"]) for entry in entries] == [(moved["id"], 1.0)]
+    assert runner.invoke(args=["rollups", "verify"]).exit_code == 0
+
+    monkeypatch.undo()
+    response = client.post(
+        "/api/entries/bulk",
+        json={"operations": [{"op": "delete", "id": moved["id"]}], "atomic": "no"},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert response.json["error"] == "Atomic must be a boolean"
+
+
+def test_bulk_operations_limit():
+    """Test the batch size limit is configurable."""
+    app = _create_app(BULK_MAX_OPERATIONS=2)
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "bulklimit@example.com")
+        response = client.post(
+            "/api/entries/bulk",
+            json={"operations": [{"op": "delete", "id": 1}] * 3},
+            headers=headers,
+        )
+        assert response.status_code == 413
+
+
+@wsgi_only
+def test_export_work_entries(client):
+    """Test CSV and NDJSON exports stream every matching entry."""
+    import csv
+    import io
+
+    headers = _auth_headers(client, "export@example.com")
+    _create_entry(client, headers, day="2023-01-01", description='Quote "and", comma')
+    _create_entry(client, headers, day="2023-02-01", completed=True)
+
+    response = client.get("/api/entries/export?format=csv", headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["date"] for row in rows] == ["2023-02-01", "2023-01-01"]
+    assert rows[1]["description"] == 'Quote "and", comma'
+
+    response = client.get(
+        "/api/entries/export?format=ndjson&start_date=2023-01-15", headers=headers
+    )
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["completed"] is True
+
+    response = client.get("/api/entries/export?format=xml", headers=headers)
+    assert response.status_code == 400
+
+
+@wsgi_only
+def test_import_work_entries(app, client, runner):
+    """Test uploads are validated per line and inserted in chunks."""
+    import io
+
+    app.config["IMPORT_CHUNK_ROWS"] = 2
+    headers = _auth_headers(client, "import@example.com")
+    upload = (
+        "date,hours,description,completed\n"
+        "2023-01-01,8,First,true\n"
+        '2023-01-02,4,"Multi\nline",false\n'
+        "2023-13-01,4,Bad date,false\n"
+        "2023-01-03,0,No hours,false\n"
+        "2023-01-04,2,Last,1\n"
+    )
+    response = client.post(
+        "/api/entries/import",
+        data={"file": (io.BytesIO(upload.encode()), "entries.csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    report = response.json
+    assert report["imported"] == 3
+    assert report["rejected"] == [
+        {"line": 5, "error": "Invalid date format. Use YYYY-MM-DD"},
+        {"line": 6, "error": "Hours must be greater than 0"},
+    ]
+    assert "rows_per_second" in report
+
+    response = client.post(
+        "/api/entries/import?format=ndjson",
+        data=(
+            '{"date": "2023-02-01", "hours": 1, "description": "Raw"}\n'
+            "not json\n5\n[]\n"
+        ),
+        headers=headers,
+    )
+    assert response.json["imported"] == 1
+    assert response.json["rejected"] == [
+        {"line": 2, "error": "Invalid JSON"},
+        {"line": 3, "error": "Each line must be a JSON object"},
+        {"line": 4, "error": "Each line must be a JSON object"},
+    ]
+
+    entries = client.get("/api/entries/?per_page=10", headers=headers).json
+    assert entries["pagination"]["total"] == 4
+    assert runner.invoke(args=["rollups", "verify"]).exit_code == 0
+
+
+def test_import_reads_streams_without_readable():
+    """Test uploads are decoded from streams that only implement read()."""
+    import io
+
+    from app import _open_upload
+
+    class ReadOnly:
+        # Like SpooledTemporaryFile before Python 3.11
+        def __init__(self, data):
+            self.read = io.BytesIO(data).read
+
+    upload = 'date,description\n2023-01-01,"Caf\u00e9\nline"\n'.encode()
+    records = list(_open_upload(ReadOnly(upload), "csv"))
+    assert records[0][1]["description"] == "Caf\u00e9\nline"
+
+
+def test_import_entries_command(client, runner, tmp_path):
+    """Test the import-entries CLI command reports its progress."""
+    _auth_headers(client, "cliimport@example.com")
+    path = tmp_path / "entries.ndjson"
+    path.write_text(
+        "\n".join(
+            json.dumps({"date": f"2023-03-{day:02d}", "hours": 1, "description": "X"})
+            for day in range(1, 11)
+        )
+    )
+
+    result = runner.invoke(
+        args=["import-entries", str(path), "--email", "cliimport@example.com"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Imported 10 rows" in result.output
+
+    result = runner.invoke(
+        args=["import-entries", str(path), "--email", "nobody@example.com"]
+    )
+    assert result.exit_code != 0
+
+
+def _password_app(**config):
+    """An app with cheap, configurable password hashing."""
+    return _create_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000", **config)
+
+
+def test_login_rehashes_outdated_password_hash():
+    """Test a successful login upgrades hashes made with old parameters."""
+    from app import User, _PasswordHasher
+
+    app = _password_app()
+    client = app.test_client()
+    with app.app_context():
+        _auth_headers(client, "rehash@example.com")
+        user = User.query.filter_by(email="rehash@example.com").first()
+        assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+
+        app.extensions["password_hasher"] = _PasswordHasher("scrypt:1024:8:1")
+        response = client.post(
+            "/api/auth/login",
+            json={"email": "rehash@example.com", "password": "password123"},
+        )
+        assert response.status_code == 200
+        db.session.refresh(user)
+        assert user.password_hash.startswith("scrypt:1024:8:1$")
+
+        # The upgraded hash still verifies
+        response = client.post(
+            "/api/auth/login",
+            json={"email": "rehash@example.com", "password": "password123"},
+        )
+        assert response.status_code == 200
+
+
+def test_password_hashing_in_process_pool():
+    """Test hashing through worker processes gives the same results."""
+    app = _password_app(PASSWORD_HASH_WORKERS=1)
+    client = app.test_client()
+    with app.app_context():
+        _auth_headers(client, "pool@example.com")
+        response = client.post(
+            "/api/auth/login",
+            json={"email": "pool@example.com", "password": "wrongpassword"},
+        )
+        assert response.status_code == 401
+
+
+def test_password_hashing_concurrency_cap():
+    """Test requests that cannot get a hashing slot fail fast with 503."""
+    app = _password_app(
+        PASSWORD_HASH_MAX_CONCURRENCY=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.01
+    )
+    client = app.test_client()
+    hasher = app.extensions["password_hasher"]
+    with app.app_context():
+        hasher._slots.acquire()
+        try:
+            response = client.post(
+                "/api/auth/register",
+                json={"email": "busy@example.com", "password": "password123"},
+            )
+        finally:
+            hasher._slots.release()
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+def _count_queries(app, request):
+    """Run request() and return how many SQL statements it executed."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        request()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return len(statements)
+
+
+@wsgi_only
+def test_identity_cache_skips_user_lookups(app, client):
+    """Test the token's user is looked up once and then served from cache."""
+    from app import User
+
+    headers = _auth_headers(client, "identity@example.com")
+    app.extensions["identity_cache"].clear()
+
+    def profile():
+        response = client.get("/api/auth/profile", headers=headers)
+        assert response.json["user"]["email"] == "identity@example.com"
+
+    # Views that only need the token's id never load the user
+    assert client.get("/api/entries/", headers=headers).status_code == 200
+    assert _count_queries(app, profile) == 1
+    assert _count_queries(app, profile) == 0
+
+    # Deleting the user evicts it, so the token stops working at once
+    db.session.delete(User.query.filter_by(email="identity@example.com").first())
+    db.session.commit()
+    response = client.get("/api/auth/profile", headers=headers)
+    assert response.status_code == 404
+
+
+def test_config_keeps_explicit_secret_keys():
+    """Test secret keys passed in are not replaced by the defaults."""
+    app = _create_app(SECRET_KEY="session-secret", JWT_SECRET_KEY="token-secret")
+    assert app.config["SECRET_KEY"] == "session-secret"
+    assert app.config["JWT_SECRET_KEY"] == "token-secret"
+
+
+def test_identity_claims_resolve_user_without_queries():
+    """Test tokens carrying identity claims need no lookup at all."""
+    app = _password_app(JWT_IDENTITY_CLAIMS=True)
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "claims@example.com")
+
+    def profile():
+        response = client.get("/api/auth/profile", headers=headers)
+        assert response.json["user"]["email"] == "claims@example.com"
+
+    assert _count_queries(app, profile) == 0
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    """Test migrations create the same tables, columns and indexes as the models."""
+    from sqlalchemy import create_engine, inspect
+
+    import migrations
+
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    assert migrations.upgrade(migrated, log=lambda message: None) == len(
+        migrations.discover()
+    )
+    # Running again is a no-op
+    assert migrations.upgrade(migrated, log=lambda message: None) == 0
+
+    modeled = create_engine(f"sqlite:///{tmp_path / 'modeled.db'}")
+    db.metadata.create_all(modeled)
+
+    def schema(engine):
+        inspector = inspect(engine)
+        return {
+            table: (
+                {column["name"] for column in inspector.get_columns(table)},
+                {index["name"] for index in inspector.get_indexes(table)},
+            )
+            for table in inspector.get_table_names()
+            if table != "schema_migrations"
+        }
+
+    assert schema(migrated) == schema(modeled)
+
+
+def test_db_commands(tmp_path):
+    """Test the db upgrade, status and explain commands."""
+    app = create_app(
+        {"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'c.db'}"}
+    )
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["db", "upgrade"])
+    assert result.exit_code == 0, result.output
+    assert "Applied 0001_initial_schema" in result.output
+
+    result = runner.invoke(args=["db", "status"])
+    assert "[x] 0003_query_indexes" in result.output
+
+    result = runner.invoke(args=["db", "explain"])
+    assert result.exit_code == 0, result.output
+    assert "-- entries page" in result.output
+    assert "ix_work_entries_user_date_id" in result.output
+
+    # SQLite tables are never partitioned
+    result = runner.invoke(args=["db", "partitions", "--verify"])
+    assert result.exit_code == 0, result.output
+    assert "work_entries is not partitioned" in result.output
+
+
+def test_partition_ranges():
+    """Test partition bounds and names for monthly and yearly partitions."""
+    from migrations import partitions
+
+    day = date(2024, 12, 17)
+    start = partitions.partition_start(day, "month")
+    assert start == date(2024, 12, 1)
+    assert partitions.next_partition_start(start, "month") == date(2025, 1, 1)
+    assert partitions.partition_name(start, "month") == "work_entries_2024_12"
+
+    start = partitions.partition_start(day, "year")
+    assert partitions.next_partition_start(start, "year") == date(2025, 1, 1)
+    assert partitions.partition_name(start, "year") == "work_entries_2024"
+
+    assert partitions.interval_of(["work_entries_default"]) is None
+    assert partitions.interval_of(["work_entries_2024_12"]) == "month"
+    assert partitions.interval_of(["work_entries_2024"]) == "year"
+
+
+@wsgi_only
+def test_health_endpoints(client):
+    """Test liveness, readiness and the legacy health check."""
+    response = client.get("/livez")
+    assert response.status_code == 200
+    assert response.json == {"status": "ok"}
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json["db"]["status"] == "ok"
+    assert response.json["db"]["latency_ms"] >= 0
+    assert "class" in response.json["pool"]
+
+    response = client.get("/health")
+    assert response.json["db"] == "ok"
+
+
+def test_engine_options_follow_pool_settings():
+    """Test pool settings become engine options for server databases."""
+    from sqlalchemy.pool import NullPool
+
+    from app import _engine_options
+
+    config = {
+        "SQLALCHEMY_DATABASE_URI": "postgresql://localhost/app",
+        "DB_POOL_PROFILE": "default",
+        "DB_POOL_SIZE": 20,
+        "DB_MAX_OVERFLOW": 5,
+        "DB_POOL_TIMEOUT": 10,
+        "DB_POOL_RECYCLE": 300,
+        "DB_POOL_PRE_PING": True,
+    }
+    assert _engine_options(config) == {
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    assert _engine_options({**config, "DB_POOL_PROFILE": "pgbouncer"}) == {
+        "poolclass": NullPool
+    }
+    assert _engine_options({**config, "SQLALCHEMY_DATABASE_URI": "sqlite://"}) == {}
+
+
+def test_readyz_reports_queue_pool(tmp_path):
+    """Test pool counters are reported for a QueuePool engine."""
+    from sqlalchemy.pool import QueuePool
+
+    app = _create_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'pool.db'}",
+        SQLALCHEMY_ENGINE_OPTIONS={"poolclass": QueuePool, "pool_size": 3},
+    )
+    pool = app.test_client().get("/readyz").json["pool"]
+    assert pool["class"] == "QueuePool"
+    assert pool["size"] == 3
+    assert pool["checked_out"] == 1
+
+
+@pytest.mark.parametrize("provider", ["stdlib", "orjson"])
+def test_entry_listing_matches_to_dict(provider):
+    """Test the projected listing serializes exactly like WorkEntry.to_dict."""
+    if provider == "orjson":
+        pytest.importorskip("orjson")
+    app = _create_app(JSON_PROVIDER=provider)
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "fields@example.com")
+        entry = _create_entry(client, headers, completed=True)
+
+        listed = client.get("/api/entries/", headers=headers).json["work_entries"]
+        single = client.get(f"/api/entries/{entry['id']}", headers=headers).json
+        assert listed == [single["work_entry"]]
+
+
+def test_entry_listing_sparse_fieldsets(client):
+    """Test ?fields= returns only the requested fields."""
+    headers = _auth_headers(client, "sparse@example.com")
+    for day in ("2023-01-01", "2023-01-02", "2023-01-03"):
+        _create_entry(client, headers, day=day)
+
+    response = client.get(
+        "/api/entries/?fields=hours,date&per_page=2&cursor=", headers=headers
+    )
+    data = response.json
+    assert data["work_entries"] == [
+        {"date": "2023-01-03", "hours": 1.0},
+        {"date": "2023-01-02", "hours": 1.0},
+    ]
+    # The cursor still works without id in the fieldset
+    response = client.get(
+        f"/api/entries/?fields=id&cursor={data['pagination']['next_cursor']}",
+        headers=headers,
+    )
+    assert len(response.json["work_entries"]) == 1
+    assert list(response.json["work_entries"][0]) == ["id"]
+
+    response = client.get("/api/entries/?fields=id,password", headers=headers)
+    assert response.status_code == 400
+    assert b"Unknown field: password" in response.data
+
+
+def test_response_compression_negotiation():
+    """Test gzip is negotiated above the size threshold and keeps ETags usable."""
+    app = _create_app(COMPRESSION_MIN_SIZE=200)
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "gzip@example.com")
+        entry = _create_entry(client, headers, description="x" * 500)
+        gzip_headers = {**headers, "Accept-Encoding": "gzip"}
+
+        response = client.get("/api/entries/", headers=gzip_headers)
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert response.headers["ETag"].endswith('-gzip"')
+        body = json.loads(gzip.decompress(response.data))
+        plain = client.get("/api/entries/", headers=headers)
+        assert "Content-Encoding" not in plain.headers
+        assert body == plain.json
+
+        # The compressed ETag revalidates and satisfies If-Match
+        gzip_etag = response.headers["ETag"]
+        response = client.get(
+            "/api/entries/", headers={**gzip_headers, "If-None-Match": gzip_etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == gzip_etag
+        assert "Accept-Encoding" in response.headers["Vary"]
+        response = client.get(
+            "/api/entries/", headers={**headers, "If-None-Match": plain.headers["ETag"]}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == plain.headers["ETag"]
+        etag = client.get(f"/api/entries/{entry['id']}", headers=gzip_headers)
+        response = client.put(
+            f"/api/entries/{entry['id']}",
+            json={"hours": 3},
+            headers={**headers, "If-Match": etag.headers["ETag"]},
+        )
+        assert response.status_code == 200
+
+        # Small bodies and refused codings stay as they are
+        response = client.get("/api/entries/statistics", headers=gzip_headers)
+        assert "Content-Encoding" not in response.headers
+        response = client.get(
+            "/api/entries/", headers={**headers, "Accept-Encoding": "gzip;q=0"}
+        )
+        assert "Content-Encoding" not in response.headers
+
+
+def test_response_compression_streams_exports():
+    """Test streamed exports are compressed incrementally."""
+    app = _create_app()
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "gzip-export@example.com")
+        for day in range(1, 6):
+            _create_entry(client, headers, day=f"2023-01-0{day}")
+
+        response = client.get(
+            "/api/entries/export?format=ndjson",
+            headers={**headers, "Accept-Encoding": "gzip"},
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        lines = gzip.decompress(response.data).decode().splitlines()
+        assert len(lines) == 5
+
+
+def test_asgi_database_url():
+    """Test the ASGI app maps database URLs onto asyncio drivers."""
+    pytest.importorskip("quart")
+    from asgi import _async_database_url
+
+    assert (
+        _async_database_url("postgresql://u:p@host/db", "/srv").drivername
+        == "postgresql+asyncpg"
+    )
+    url = _async_database_url("sqlite:///app.db", "/srv/instance")
+    assert url.drivername == "sqlite+aiosqlite"
+    assert url.database == "/srv/instance/app.db"
+    with pytest.raises(RuntimeError):
+        _async_database_url("mysql://u:p@host/db", "/srv")
+
+
+def test_asgi_routes_match_the_flask_app():
+    """Test every Flask route is served in ASGI mode or listed as Flask-only."""
+    pytest.importorskip("quart")
+    from asgi import FLASK_ONLY_ENDPOINTS, create_asgi_app
+
+    def routes(app):
+        return {
+            (rule.endpoint, rule.rule, frozenset(rule.methods - {"HEAD", "OPTIONS"}))
+            for rule in app.url_map.iter_rules()
+            if rule.endpoint != "static"
+        }
+
+    flask_routes = routes(_create_app())
+    asgi_routes = routes(
+        create_asgi_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://"})
+    )
+    assert asgi_routes <= flask_routes
+    missing = {endpoint for endpoint, _, _ in flask_routes - asgi_routes}
+    assert missing == FLASK_ONLY_ENDPOINTS
+
+
+def test_asgi_writes_invalidate_the_response_cache(tmp_path):
+    """Test a write served in ASGI mode invalidates the Flask app's cache."""
+    database = f"sqlite:///{tmp_path / 'app.db'}"
+    cache = {
+        "RESPONSE_CACHE_ENABLED": True,
+        "RESPONSE_CACHE_PATH": str(tmp_path / "cache.sqlite3"),
+    }
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": database, **cache})
+    with app.app_context():
+        db.create_all()
+    flask_client = app.test_client()
+    asgi_client = _AsgiClient(database, **cache)
+    try:
+        headers = _auth_headers(flask_client, "mixed@example.com")
+        listing = flask_client.get("/api/entries/", headers=headers)
+        assert listing.json["work_entries"] == []
+
+        _create_entry(asgi_client, headers)
+        listing = flask_client.get("/api/entries/", headers=headers)
+        assert len(listing.json["work_entries"]) == 1
+    finally:
+        asgi_client.close()
+
+
+def test_seed_command_is_deterministic(tmp_path):
+    """Test flask seed builds the same data from the same seed, rollups included."""
+    from app import WorkEntry
+
+    def seeded_rows(name):
+        app = create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / name}",
+                "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+            }
+        )
+        with app.app_context():
+            db.create_all()
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            args=["seed", "--users", "20", "--days", "60", "--end-date", "2024-06-30"]
+        )
+        assert result.exit_code == 0, result.output
+        assert "Seeded 20 users" in result.output
+        assert runner.invoke(args=["rollups", "verify"]).exit_code == 0
+        # A second run would duplicate the users
+        assert runner.invoke(args=["seed", "--users", "1"]).exit_code != 0
+
+        client = app.test_client()
+        response = client.post(
+            "/api/auth/login",
+            json={"email": "seed-user-3@example.com", "password": "password123"},
+        )
+        assert response.status_code == 200
+        with app.app_context():
+            return db.session.query(
+                WorkEntry.user_id,
+                WorkEntry.date,
+                WorkEntry.hours,
+                WorkEntry.completed,
+                WorkEntry.description,
+            ).all()
+
+    rows = seeded_rows("a.db")
+    assert len(rows) > 20 * 30
+    assert rows == seeded_rows("b.db")
+
+
+def test_request_instrumentation(caplog):
+    """Test Server-Timing, the slow-query log and N+1 warnings."""
+    app = _create_app(
+        INSTRUMENTATION_ENABLED=True, SLOW_QUERY_MS=0, N_PLUS_ONE_THRESHOLD=0
+    )
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "timing@example.com")
+        _create_entry(client, headers)
+
+        with caplog.at_level("WARNING", logger=app.logger.name):
+            response = client.get("/api/entries/", headers=headers)
+        timing = response.headers["Server-Timing"]
+        for metric in ("db;dur=", "serialize;dur=", "auth;dur=", "total;dur="):
+            assert metric in timing
+        assert 'desc="2 queries"' in timing
+        assert "Slow query" in caplog.text
+        assert "GET /api/entries/" in caplog.text
+        assert "Possible N+1 on GET /api/entries/: 1 runs" in caplog.text
+        assert "parameters" not in caplog.text
+
+        # A failing statement leaves no timing behind on its connection
+        with pytest.raises(Exception):
+            db.session.execute(db.text("SELECT * FROM missing_table"))
+        assert db.session.connection().info["query_started"] == []
+        db.session.rollback()
+
+    # Off by default
+    plain = _create_app().test_client()
+    assert "Server-Timing" not in plain.get("/livez").headers
+
+
+def test_metrics_endpoint():
+    """Test request, password hashing and pool metrics on /metrics."""
+    app = _create_app(METRICS_ENABLED=True)
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "metrics@example.com")
+        client.get("/api/entries/", headers=headers)
+        client.get("/api/entries/", headers=headers)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        text = response.get_data(as_text=True)
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert (
+            'http_requests_total{endpoint="entries.get_work_entries",'
+            'method="GET",status="200"} 2.0' in text
+        )
+        assert (
+            'http_request_duration_seconds_bucket{endpoint="auth.login",'
+            'method="POST",le="+Inf"} 1.0' in text
+        )
+        assert 'http_request_duration_seconds_count{endpoint="auth.login"' in text
+        # Only the scrape itself is in flight
+        assert 'http_requests_in_progress{endpoint="metrics",method="GET"} 1.0' in text
+        assert 'http_requests_in_progress{endpoint="auth.login",method="POST"} 0.0' in (
+            text
+        )
+        assert 'password_hash_duration_seconds_count{operation="hash"} 1.0' in text
+        assert 'password_hash_duration_seconds_count{operation="verify"} 1.0' in text
+        assert 'db_pool_connections{state="checked_out"}' in text
+
+    # Off by default
+    assert _create_app().test_client().get("/metrics").status_code == 404
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    """Test that metrics written by forked workers are summed on scrape."""
+    app = _create_app(METRICS_ENABLED=True, METRICS_MULTIPROC_DIR=str(tmp_path))
+    client = app.test_client()
+    client.get("/livez")
+
+    def worker():
+        app.test_client().get("/livez")
+        # As if the worker was killed while serving a request
+        labels = (("endpoint", "stuck"), ("method", "GET"))
+        app.extensions["metrics"].inc("http_requests_in_progress", labels)
+
+    process = multiprocessing.get_context("fork").Process(target=worker)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert len(list(tmp_path.glob("metrics_*.db"))) == 2
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'http_requests_total{endpoint="livez",method="GET",status="200"} 2.0' in (
+        text
+    )
+    # The exited worker's gauges are dropped, its counters are kept
+    assert 'http_requests_in_progress{endpoint="stuck"' not in text
+    assert 'http_requests_in_progress{endpoint="metrics",method="GET"} 1.0' in text
+
+
+def test_metrics_file_of_a_reused_pid_starts_without_gauges(tmp_path):
+    """Test a process reusing an exited worker's PID does not inherit its gauges."""
+    from app import _Metrics, _MetricsStore
+
+    labels = (("endpoint", "stuck"), ("method", "GET"))
+    exited = _Metrics(_MetricsStore(str(tmp_path)))
+    exited.inc("http_requests_in_progress", labels)
+    exited.inc("http_requests_total", labels)
+
+    # Same PID, so the new store opens the same file
+    reused = _Metrics(_MetricsStore(str(tmp_path)))
+    reused.inc("http_requests_total", labels)
+    text = reused.render()
+    assert 'http_requests_total{endpoint="stuck",method="GET"} 2.0' in text
+    assert 'http_requests_in_progress{endpoint="stuck",method="GET"} 0.0' in text
+
+
+def test_request_profiling():
+    """Test ?__profile= artifacts and the sampled per-endpoint profiles."""
+    app = _create_app(
+        PROFILING_ENABLED=True, PROFILING_SECRET="s3cret", PROFILE_SAMPLE_RATE=1
+    )
+    client = app.test_client()
+    secret = {"X-Profile-Secret": "s3cret"}
+    with app.app_context():
+        headers = _auth_headers(client, "profile@example.com")
+        _create_entry(client, headers)
+
+        response = client.get("/api/entries/?__profile=1", headers=headers)
+        assert response.status_code == 403
+        response = client.get(
+            "/api/entries/?__profile=1", headers={**headers, **secret}
+        )
+        assert response.status_code == 200
+        assert response.headers["X-Profiled-Status"] == "200"
+        assert "_work_entries_etag" in response.get_data(as_text=True)
+
+        response = client.get(
+            "/api/entries/?__profile=pstats", headers={**headers, **secret}
+        )
+        stats = marshal.loads(response.data)
+        assert any(name == "get_work_entries" for _, _, name in stats)
+
+        response = client.get(
+            "/api/entries/?__profile=collapsed", headers={**headers, **secret}
+        )
+        for line in response.get_data(as_text=True).splitlines():
+            assert int(line.rsplit(" ", 1)[1]) > 0
+
+        assert client.get("/admin/profiles/").status_code == 403
+        profiles = client.get("/admin/profiles/", headers=secret).json["profiles"]
+        assert profiles["auth.login"]["requests"] == 1
+        assert profiles["entries.create_work_entry"]["requests"] == 1
+        response = client.get("/admin/profiles/auth.login", headers=secret)
+        assert response.status_code == 200
+        assert client.delete("/admin/profiles/", headers=secret).status_code == 204
+        assert client.get("/admin/profiles/", headers=secret).json["profiles"] == {}
+
+    # Off by default: no hooks, no admin routes
+    plain = _create_app().test_client()
+    assert plain.get("/livez?__profile=1").headers.get("X-Profiled-Status") is None
+    assert plain.get("/admin/profiles/").status_code == 404
+
+
+def test_admission_rate_limits_and_shedding():
+    """Test 429s past the auth rate limit and 503s once a class is full."""
+    app = _create_app(
+        ADMISSION_ENABLED=True,
+        ADMISSION_RATE_LIMITS="auth=3/60",
+        ADMISSION_CONCURRENCY="read=8,write=8,auth=1",
+        ADMISSION_QUEUE_BUDGET_MS="read=1000,write=1000,auth=10",
+    )
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "admission@example.com")
+        credentials = {"email": "admission@example.com", "password": "password123"}
+        assert client.post("/api/auth/login", json=credentials).status_code == 200
+        response = client.post("/api/auth/login", json=credentials)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 19
+        # Reads are in another class and keyed by user, not address
+        assert client.get("/api/entries/", headers=headers).status_code == 200
+
+        controller = app.extensions["admission"]
+        assert controller.acquire("auth") is None
+        response = app.test_client().post(
+            "/api/auth/register",
+            json=credentials,
+            environ_base={"REMOTE_ADDR": "10.0.0.2"},
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        controller.release("auth", 0.1)
+
+
+def test_admission_controller_priority():
+    """Test that waiting reads are admitted before expensive auth work."""
+    from app import _AdmissionController
+
+    controller = _AdmissionController(
+        {"read": 1, "write": 1, "auth": 1},
+        {"read": 5, "write": 5, "auth": 5},
+        capacity=1,
+    )
+    assert controller.acquire("write") is None
+    admitted = []
+
+    def wait_for(admission_class):
+        if controller.acquire(admission_class) is None:
+            admitted.append(admission_class)
+            controller.release(admission_class, 0.01)
+
+    # Auth starts waiting first, but the read behind it gets the slot
+    threads = []
+    for admission_class in ("auth", "read"):
+        thread = threading.Thread(target=wait_for, args=(admission_class,))
+        thread.start()
+        threads.append(thread)
+        while not controller._waiting[admission_class]:
+            time.sleep(0.001)
+    controller.release("write", 0.01)
+    for thread in threads:
+        thread.join()
+    assert admitted == ["read", "auth"]
+
+
+def test_sqlite_token_buckets_are_shared(tmp_path):
+    """Test that token buckets in the SQLite store are shared by instances."""
+    from app import _SQLiteTokenBuckets
+
+    path = str(tmp_path / "buckets.sqlite3")
+    first = _SQLiteTokenBuckets(path)
+    second = _SQLiteTokenBuckets(path)
+    assert first.take("auth:ip:1", 2, 60) == 0
+    assert second.take("auth:ip:1", 2, 60) == 0
+    assert first.take("auth:ip:1", 2, 60) > 0
+    assert second.take("auth:ip:2", 2, 60) == 0
+
+
+@wsgi_only
+def test_statistics_series(client):
+    """Test day/week/month buckets and argument validation."""
+    headers = _auth_headers(client, "series@example.com")
+    _create_entry(client, headers, day="2024-01-01", hours=2.0, completed=True)
+    _create_entry(client, headers, day="2024-01-07", hours=1.5)
+    _create_entry(client, headers, day="2024-01-08", hours=3.0, completed=True)
+    _create_entry(client, headers, day="2024-02-10", hours=4.0, completed=True)
+
+    response = client.get(
+        "/api/entries/statistics/series?start=2024-01-03&end=2024-01-10&bucket=week",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json
+    # Widened to whole ISO weeks
+    assert (data["start"], data["end"]) == ("2024-01-01", "2024-01-14")
+    assert [bucket["start"] for bucket in data["series"]] == [
+        "2024-01-01",
+        "2024-01-08",
+    ]
+    assert data["series"][0] == {
+        "start": "2024-01-01",
+        "end": "2024-01-07",
+        "hours": 3.5,
+        "completed_hours": 2.0,
+        "tasks": 2,
+        "completed_tasks": 1,
+    }
+
+    response = client.get(
+        "/api/entries/statistics/series?start=2024-01-01&end=2024-03-01&bucket=month",
+        headers=headers,
+    )
+    series = response.json["series"]
+    assert [(bucket["start"], bucket["tasks"]) for bucket in series] == [
+        ("2024-01-01", 3),
+        ("2024-02-01", 1),
+        ("2024-03-01", 0),
+    ]
+    assert series[1]["end"] == "2024-02-29"
+
+    response = client.get(
+        "/api/entries/statistics/series?start=2024-01-07&end=2024-01-08",
+        headers=headers,
+    )
+    assert [bucket["hours"] for bucket in response.json["series"]] == [1.5, 3.0]
+
+    response = client.get(
+        "/api/entries/statistics/series?tz=Pacific/Kiritimati", headers=headers
+    )
+    assert len(response.json["series"]) == 30
+    for query in (
+        "bucket=year",
+        "tz=Not/AZone",
+        "start=2024-02-01&end=2024-01-01",
+        "start=2020-01-01&end=2024-01-01",
+        "start=01-01-2024",
+    ):
+        response = client.get(
+            f"/api/entries/statistics/series?{query}", headers=headers
+        )
+        assert response.status_code == 400
+
+
+def test_statistics_series_caches_past_buckets():
+    """Test that past buckets are cached until an entry inside them changes."""
+    from app import DailyRollup
+
+    app = _create_app(STATISTICS_CACHE_BACKEND="memory")
+    client = app.test_client()
+    with app.app_context():
+        headers = _auth_headers(client, "series-cache@example.com")
+        entry = _create_entry(client, headers, day="2024-01-10", hours=2.0)
+        url = "/api/entries/statistics/series?start=2024-01-01&bucket=month"
+
+        def january_hours():
+            return client.get(url, headers=headers).json["series"][0]["hours"]
+
+        assert january_hours() == 2.0
+        # Served from the cache: a change behind the app's back is not seen
+        db.session.execute(db.update(DailyRollup).values(total_hours=99.0))
+        db.session.commit()
+        assert january_hours() == 2.0
+
+        # A write to an entry in another month leaves January cached
+        _create_entry(client, headers, day="2024-03-05", hours=1.0)
+        assert january_hours() == 2.0
+
+        # A write to an entry inside January drops it
+        response = client.put(
+            f"/api/entries/{entry['id']}", json={"hours": 5.0}, headers=headers
+        )
+        assert response.status_code == 200
+        assert january_hours() == 5.0
+
+
+@wsgi_only
+def test_search_entries(client):
+    """Test ranked prefix search, filters, pagination and index sync."""
+    headers = _auth_headers(client, "search@example.com")
+    other = _auth_headers(client, "search-other@example.com")
+    march = _create_entry(
+        client, headers, day="2024-03-12", description="Login ticket, ticket 42"
+    )
+    _create_entry(
+        client, headers, day="2024-01-05", description="Ticket triage meeting"
+    )
+    _create_entry(client, headers, day="2024-03-20", description="Café rewrite")
+    _create_entry(client, other, day="2024-03-12", description="Someone's ticket")
+
+    response = client.get("/api/entries/search?q=tick", headers=headers)
+    assert response.status_code == 200
+    entries = response.json["work_entries"]
+    # More mentions rank higher; the other user's entry is not returned
+    assert [entry["id"] for entry in entries][0] == march["id"]
+    assert len(entries) == 2
+    assert entries[0]["score"] > entries[1]["score"]
+
+    response = client.get(
+        "/api/entries/search?q=ticket&start_date=2024-03-01&end_date=2024-03-31",
+        headers=headers,
+    )
+    assert [entry["id"] for entry in response.json["work_entries"]] == [march["id"]]
+    # Diacritics are folded
+    response = client.get("/api/entries/search?q=cafe", headers=headers)
+    assert len(response.json["work_entries"]) == 1
+
+    # Cursor pagination by rank and by date
+    for sort in ("rank", "date"):
+        seen = []
+        cursor = ""
+        while True:
+            response = client.get(
+                f"/api/entries/search?q=ticket&per_page=1&sort={sort}&cursor={cursor}",
+                headers=headers,
+            )
+            seen += [entry["id"] for entry in response.json["work_entries"]]
+            cursor = response.json["pagination"]["next_cursor"]
+            if cursor is None:
+                break
+        assert len(seen) == 2 and len(set(seen)) == 2
+
+    # The index follows updates and deletes
+    client.put(
+        f"/api/entries/{march['id']}",
+        json={"description": "Login refactor"},
+        headers=headers,
+    )
+    response = client.get("/api/entries/search?q=refac", headers=headers)
+    assert [entry["id"] for entry in response.json["work_entries"]] == [march["id"]]
+    response = client.get("/api/entries/search?q=ticket", headers=headers)
+    assert len(response.json["work_entries"]) == 1
+    client.delete(f"/api/entries/{march['id']}", headers=headers)
+    response = client.get("/api/entries/search?q=login", headers=headers)
+    assert response.json["work_entries"] == []
+
+    for query in (
+        "q=",
+        "q=%22%2A",
+        "q=x&sort=size",
+        "q=x&cursor=bad",
+        "q=x&per_page=0",
+        "q=x&per_page=-1&sort=date",
+        "q=x&per_page=101",
+    ):
+        response = client.get(f"/api/entries/search?{query}", headers=headers)
+        assert response.status_code == 400
+
+
+@wsgi_only
+def test_replica_reads_and_read_your_writes(tmp_path):
+    """Test GETs read from a replica unless the client wrote recently."""
+    import sqlite3
+
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary}",
+        SQLALCHEMY_REPLICA_URIS=f"sqlite:///{replica}",
+    )
+    client = app.test_client()
+    with app.app_context():
+        db.metadata.create_all(app.extensions["db_replicas"][0])
+        headers = _auth_headers(client, "replica@example.com")
+
+    def replicate():
+        with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+            source.backup(target)
+
+    # The replica has not caught up with the registration yet
+    assert client.get("/api/auth/profile", headers=headers).status_code == 404
+    replicate()
+    assert client.get("/api/auth/profile", headers=headers).status_code == 200
+
+    response = client.post(
+        "/api/entries/",
+        json={"date": "2024-05-01", "hours": 2.0, "description": "Fresh"},
+        headers=headers,
+    )
+    pin = response.headers["X-Read-Primary-Until"]
+    assert client.get("/api/entries/", headers=headers).json["work_entries"] == []
+    pinned = {**headers, "X-Read-Primary-Until": pin}
+    entries = client.get("/api/entries/", headers=pinned).json["work_entries"]
+    assert [entry["description"] for entry in entries] == ["Fresh"]
+
+    # Expired pins, and pins further out than the window, are ignored
+    for until in (time.time() - 1, time.time() + 3600, "soon"):
+        stale = {**headers, "X-Read-Primary-Until": str(until)}
+        assert client.get("/api/entries/", headers=stale).json["work_entries"] == []
+    assert "X-Read-Primary-Until" not in client.get("/health").headers
+
+
+@wsgi_only
+def test_replica_reads_are_not_cached(tmp_path):
+    """Test responses read from a lagging replica never fill the caches."""
+    import sqlite3
+
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{primary}",
+        SQLALCHEMY_REPLICA_URIS=f"sqlite:///{replica}",
+        RESPONSE_CACHE_ENABLED=True,
+        RESPONSE_CACHE_PATH=str(tmp_path / "cache.sqlite3"),
+        STATISTICS_CACHE_BACKEND="memory",
+    )
+    client = app.test_client()
+
+    def replicate():
+        with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+            source.backup(target)
+
+    with app.app_context():
+        headers = _auth_headers(client, "replica-cache@example.com")
+        replicate()
+
+    response = client.post(
+        "/api/entries/",
+        json={"date": "2024-05-01", "hours": 2.0, "description": "Fresh"},
+        headers=headers,
+    )
+    pinned = {
+        **headers,
+        "X-Read-Primary-Until": response.headers["X-Read-Primary-Until"],
+    }
+    series_url = "/api/entries/statistics/series?start=2024-05-01&bucket=month"
+
+    def may_hours():
+        return client.get(series_url, headers=headers).json["series"][0]["hours"]
+
+    # The lagging replica answers, but its answers are not kept
+    listing = client.get("/api/entries/", headers=headers)
+    assert listing.json["work_entries"] == []
+    assert may_hours() == 0.0
+    response = client.get("/api/entries/", headers=pinned)
+    assert len(response.json["work_entries"]) == 1
+
+    replicate()
+    response = client.get(
+        "/api/entries/", headers={**headers, "If-None-Match": listing.headers["ETag"]}
+    )
+    assert response.status_code == 200
+    assert len(response.json["work_entries"]) == 1
+    assert may_hours() == 2.0
+
+
+@wsgi_only
+def test_group_commit_batches_concurrent_writes(tmp_path):
+    """Test concurrent writes share commits but keep their own results."""
+    from sqlalchemy import event
+
+    from app import DailyRollup
+
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'group.db'}",
+        GROUP_COMMIT_ENABLED=True,
+        GROUP_COMMIT_WINDOW_MS=200,
+        GROUP_COMMIT_MAX_BATCH=6,
+    )
+    with app.app_context():
+        db.create_all()
+        headers = _auth_headers(app.test_client(), "group@example.com")
+        commits = []
+        event.listen(db.engine, "commit", lambda conn: commits.append(1))
+
+    payloads = [
+        {"date": "2024-02-01", "hours": 1.5, "description": f"Entry {i}"}
+        for i in range(5)
+    ] + [{"date": "2024-02-31", "hours": 1.0, "description": "Bad date"}]
+    responses = [None] * len(payloads)
+
+    def post(index):
+        client = app.test_client()
+        responses[index] = client.post(
+            "/api/entries/", json=payloads[index], headers=headers
+        )
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(payloads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [201] * 5 + [400]
+    assert len(commits) < 5
+    ids = {response.json["work_entry"]["id"] for response in responses[:5]}
+    assert len(ids) == 5
+
+    client = app.test_client()
+    entry_id = responses[0].json["work_entry"]["id"]
+    response = client.put(
+        f"/api/entries/{entry_id}",
+        json={"hours": 3.0},
+        headers={**headers, "If-Match": responses[0].headers["ETag"]},
+    )
+    assert response.status_code == 200
+    assert response.json["work_entry"]["hours"] == 3.0
+    response = client.put(
+        f"/api/entries/{entry_id}",
+        json={"hours": 4.0},
+        headers={**headers, "If-Match": responses[0].headers["ETag"]},
+    )
+    assert response.status_code == 412
+
+    # The rollups saw every committed write once, and the failed ones not at all
+    with app.app_context():
+        rollup = db.session.get(DailyRollup, (1, date(2024, 2, 1)))
+        assert (rollup.total_count, rollup.total_hours) == (5, 9.0)
+
+
+@wsgi_only
+def test_group_commit_gives_up_on_a_stalled_committer(tmp_path):
+    """Test a write times out, and is withdrawn, when no batch picks it up."""
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'stalled.db'}",
+        GROUP_COMMIT_ENABLED=True,
+        GROUP_COMMIT_TIMEOUT=0.2,
+    )
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        headers = _auth_headers(client, "stalled@example.com")
+    committer = app.extensions["group_commit"]
+    # A live thread that never takes writes off the queue
+    stalled = threading.Event()
+    committer._thread = threading.Thread(target=stalled.wait, daemon=True)
+    committer._thread.start()
+
+    payload = {"date": "2024-02-01", "hours": 1.0, "description": "Stalled"}
+    response = client.post("/api/entries/", json=payload, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    stalled.set()
+    committer._thread.join()
+    _create_entry(client, headers, description="Committed")
+    entries = client.get("/api/entries/", headers=headers).json["work_entries"]
+    assert [entry["description"] for entry in entries] == ["Committed"]
+
+
+@wsgi_only
+def test_group_commit_reports_an_unknown_outcome_and_still_invalidates(tmp_path):
+    """Test a write whose commit outlasts the timeout gets 504, then shows up."""
+    from sqlalchemy import event
+
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'slow.db'}",
+        GROUP_COMMIT_ENABLED=True,
+        GROUP_COMMIT_TIMEOUT=0.1,
+        RESPONSE_CACHE_ENABLED=True,
+        RESPONSE_CACHE_PATH=str(tmp_path / "cache.sqlite3"),
+    )
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        headers = _auth_headers(client, "slow@example.com")
+        # Commits hang until the test lets them through
+        released = threading.Event()
+        event.listen(db.engine, "commit", lambda conn: released.wait())
+    assert client.get("/api/entries/", headers=headers).json["work_entries"] == []
+
+    payload = {"date": "2024-02-01", "hours": 1.0, "description": "Slow"}
+    response = client.post("/api/entries/", json=payload, headers=headers)
+    assert response.status_code == 504
+    assert "may still be applied" in response.json["error"]
+
+    released.set()
+    # The committer bumps the user's version, so the cached listing goes stale
+    deadline = time.monotonic() + 5
+    entries = []
+    while not entries and time.monotonic() < deadline:
+        entries = client.get("/api/entries/", headers=headers).json["work_entries"]
+        time.sleep(0.05)
+    assert [entry["description"] for entry in entries] == ["Slow"]
+
+
+def test_group_commit_retries_every_write_of_a_failed_batch(tmp_path):
+    """Test one write failing on its own retry does not fail the writes after it."""
+    from concurrent.futures import Future
+
+    app = _password_app(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'retry.db'}",
+        GROUP_COMMIT_ENABLED=True,
+    )
+
+    def write():
+        return {}, 200, {}
+
+    def broken_hook():
+        raise RuntimeError("Cache store is down")
+
+    with app.app_context():
+        committer = app.extensions["group_commit"]
+        failed, committed = Future(), Future()
+        for future in (failed, committed):
+            future.set_running_or_notify_cancel()
+        committer._retry_one_by_one(
+            [(write, failed, broken_hook), (write, committed, None)]
+        )
+    assert isinstance(failed.exception(), RuntimeError)
+    assert committed.result() == ({}, 200, {})